@@ -49,6 +49,7 @@ def train(epoch, model, train_loader, device, optimizer, args, writer):
                 if args.latents < 3:
                     old_method = model.sampling_method
                     model.sampling_method = Expect("z")
+                    model.sampling_method.capture_grads = True
                     optimizer.zero_grad()
                     recon_batch, _, z = model(data)
                     storch.add_cost(loss_function(recon_batch, data), "reconstruction")
@@ -59,25 +60,20 @@ def train(epoch, model, train_loader, device, optimizer, args, writer):
 
                     optimizer.zero_grad()
                     model.sampling_method = old_method
-                grads = {n: [] for n in z.grad}
 
-                for i in range(args.variance_samples):
-                    optimizer.zero_grad()
-                    recon_batch, _, z = model(data)
-                    storch.add_cost(loss_function(recon_batch, data), "reconstruction")
-                    backward()
+                def model_fn(x):
+                    recon_batch, _, _ = model(x)
+                    storch.add_cost(loss_function(recon_batch, x), "reconstruction")
 
-                    for param_name, grad in z.grad.items():
-                        # Make sure to reduce the data dimension and detach, for memory reasons.
-                        grads[param_name].append(
-                            storch.reduce_plates(grad).detach_tensor()
-                        )
+                # Compute all gradient samples in a single pass by repeating the data on the variance plate
+                optimizer.zero_grad()
+                grads = storch.gradient_samples(
+                    model_fn, model.sampling_method, args.variance_samples, data
+                )
 
                 variances = {}
-                for param_name, gradz in grads.items():
-                    # Create a new independent dimension for the different gradient samples
-                    grad_samples = storch.gather_samples(gradz, "variance")
-                    # Compute the variance over this independent dimension
+                for param_name, grad_samples in grads.items():
+                    # Compute the variance over the independent dimension of the gradient samples
                     variances[param_name] = storch.variance(
                         grad_samples, "variance"
                     )._tensor
@@ -114,7 +110,7 @@ def train(epoch, model, train_loader, device, optimizer, args, writer):
 def test(epoch, model, test_loader, device):
     model.eval()
     test_loss = 0
-    with torch.no_grad():
+    with storch.inference_mode():
         for i, (data, _) in enumerate(test_loader):
             data = data.to(device)
             data = storch.denote_independent(data.view(-1, 784), 0, "data")
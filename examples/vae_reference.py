@@ -85,7 +85,10 @@ def evaluate(method: storch.method.Method, model: DiscreteVAE, data, optimizer):
     # Compute expected gradient
     optimizer.zero_grad()
 
-    z = generative_story(storch.method.Expect("z"), model, data)
+    expect = storch.method.Expect("z")
+    expect.capture_grads = True
+    method.capture_grads = True
+    z = generative_story(expect, model, data)
     storch.backward()
     expected_gradient = z.param_grads["probs"]
 
@@ -111,6 +114,7 @@ def evaluate(method: storch.method.Method, model: DiscreteVAE, data, optimizer):
         + " Gradient bias "
         + str(bias_gradient._tensor.item())
     )
+    method.capture_grads = False
 
 
 #
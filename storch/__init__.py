@@ -5,16 +5,36 @@ from .wrappers import (
     _exception_wrapper,
     _unpack_wrapper,
     ignore_wrapping,
+    inference_mode,
+)
+from .tensor import (
+    Tensor,
+    CostTensor,
+    StochasticTensor,
+    IndexedOneHotTensor,
+    Plate,
+    is_tensor,
+    set_validate_plates,
 )
-from .tensor import Tensor, CostTensor, StochasticTensor, Plate, is_tensor
 
 import storch.sampling
 import storch.method
 import storch.typing
-from .inference import backward, add_cost, reset, denote_independent, gather_samples
+from .inference import (
+    backward,
+    add_cost,
+    reset,
+    denote_independent,
+    gather_samples,
+    gradient_samples,
+    estimate_gradient_variance,
+    per_plate_grad,
+)
 from .util import print_graph
 from .storch import *
-from .unique import unique, undo_unique
+from .unique import unique, undo_unique, memoize_cost, MemoizedCost
+from .trace import trace, TracedPlan
+from .seq import blackbox_cost
 from .exceptions import IllegalStorchExposeError
 
 import storch.nn
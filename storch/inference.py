@@ -1,11 +1,18 @@
-from typing import Optional, List, Union
+import inspect
+from typing import Optional, List, Union, Callable, Any, Dict, Iterator
 
-from storch.tensor import Tensor, StochasticTensor, CostTensor, IndependentTensor
+from storch.tensor import (
+    Tensor,
+    StochasticTensor,
+    CostTensor,
+    IndependentTensor,
+    IndexedOneHotTensor,
+)
 import torch
 from storch.util import print_graph
+from storch.trace import _identity, _stack
 import storch
 
-
 _cost_tensors: [CostTensor] = []
 _sampling_methods: [storch.method.Method] = []
 
@@ -38,13 +45,21 @@ def denote_independent(
         tensor_name = (
             tensor.name + "_indep_" + plate_name if tensor.name else plate_name
         )
-        return IndependentTensor(
+        indep_tensor = IndependentTensor(
             t_tensor, [tensor], tensor.plates, tensor_name, plate_name, weight
         )
+        tracer = storch.wrappers._tracer
+        if tracer is not None:
+            steps = [("transpose", dim, 0)] if dim != 0 else []
+            tracer.record(_identity, [tracer.ref(tensor, steps)], {}, indep_tensor)
+        return indep_tensor
     else:
         if dim != 0:
             tensor = tensor.transpose(dim, 0)
-        return IndependentTensor(tensor, [], [], plate_name, plate_name, weight)
+        indep_tensor = IndependentTensor(tensor, [], [], plate_name, plate_name, weight)
+        if storch.wrappers._tracer is not None:
+            storch.wrappers._tracer.record(_identity, [tensor], {}, indep_tensor)
+        return indep_tensor
 
 
 def gather_samples(
@@ -71,7 +86,7 @@ def gather_samples(
         tensor_name = (
             samples[0].name + "_indep_" + plate_name if samples[0].name else plate_name
         )
-        return IndependentTensor(
+        indep_tensor = IndependentTensor(
             cat_tensors,
             samples,
             samples[0].plates.copy(),
@@ -79,9 +94,13 @@ def gather_samples(
             plate_name,
             weight,
         )
-    return IndependentTensor(
-        cat_tensors, [], [], "_indep_" + plate_name, plate_name, weight
-    )
+    else:
+        indep_tensor = IndependentTensor(
+            cat_tensors, [], [], "_indep_" + plate_name, plate_name, weight
+        )
+    if storch.wrappers._tracer is not None:
+        storch.wrappers._tracer.record(_stack, samples, {}, indep_tensor)
+    return indep_tensor
 
 
 def add_cost(cost: Tensor, name: str):
@@ -94,14 +113,102 @@ def add_cost(cost: Tensor, name: str):
         raise ValueError(
             "No name provided to register cost node. Make sure to register an unique name with the cost."
         )
-    cost = CostTensor(cost._tensor, [cost], cost.plates, name)
+    cost_tensor = CostTensor(cost._tensor, [cost], cost.plates, name)
+    if storch.wrappers._tracer is not None:
+        storch.wrappers._tracer.alias(cost_tensor, cost)
     if torch.is_grad_enabled():
-        storch.inference._cost_tensors.append(cost)
-    return cost
+        storch.inference._cost_tensors.append(cost_tensor)
+    return cost_tensor
+
+
+def _estimator_terms(
+    c: CostTensor, stochastic_nodes: set, record_pairs: bool = True
+) -> Iterator[storch.Tensor]:
+    """
+    Yields the surrogate losses of the gradient estimators of the stochastic nodes that are parents of the cost node.
+    The found stochastic nodes are added to `stochastic_nodes`.
+    """
+    for parent in c.walk_parents(depth_first=False):
+        # Instance check here instead of parent.stochastic, as backward methods are only used on these.
+        if isinstance(parent, StochasticTensor):
+            stochastic_nodes.add(parent)
+        else:
+            continue
+        if (
+            not parent.requires_grad
+            or not parent.method
+            or not parent.method.adds_loss(parent, c)
+        ):
+            continue
+
+        # Transpose the parent stochastic tensor, so that its shape is the same as the cost but the event shape, and
+        # possibly extra dimensions...?
+        # Transpose the indices of compressed one-hot samples instead, so that they stay compressed
+        compressed = isinstance(parent, IndexedOneHotTensor) and parent.is_compressed
+        parent_tensor = parent._indices if compressed else parent._tensor
+        reduced_cost = c
+        parent_plates = parent.multi_dim_plates()
+        # Reduce all plates that are in the cost node but not in the parent node
+        for plate in storch.order_plates(c.multi_dim_plates(), reverse=True):
+            if plate not in parent_plates:
+                reduced_cost = plate.reduce(reduced_cost, detach_weights=True)
+        # Align the parent tensor so that the plate dimensions are in the same order as the cost tensor
+        for index_c, plate in enumerate(reduced_cost.multi_dim_plates()):
+            index_p = parent_plates.index(plate)
+            if index_c != index_p:
+                parent_tensor = parent_tensor.transpose(index_p, index_c)
+                parent_plates[index_p], parent_plates[index_c] = (
+                    parent_plates[index_c],
+                    parent_plates[index_p],
+                )
+        # Add empty (k=1) plates to new parent
+        for plate in parent.plates:
+            if plate not in parent_plates:
+                parent_plates.append(plate)
+
+        # Create new storch Tensors with different order of plates for the cost and parent
+        if compressed:
+            new_parent = IndexedOneHotTensor(
+                parent_tensor,
+                [],
+                parent_plates,
+                parent.name,
+                parent.n,
+                parent.distribution,
+                parent._requires_grad,
+                parent.domain_size,
+                parent.dtype,
+                parent.method,
+            )
+        else:
+            new_parent = storch.tensor.StochasticTensor(
+                parent_tensor,
+                [],
+                parent_plates,
+                parent.name,
+                parent.n,
+                parent.distribution,
+                parent._requires_grad,
+                parent.method,
+            )
+        # Fake the new parent to be the old parent within the graph by mimicing its place in the graph
+        new_parent._parents = parent._parents
+        for p, has_link in new_parent._parents:
+            p._children.append((new_parent, has_link))
+        new_parent._children = parent._children
+        if record_pairs:
+            cost_per_sample = parent.method._estimator(new_parent, reduced_cost)
+        else:
+            cost_per_sample = parent.method.estimator(new_parent, reduced_cost)
+        if cost_per_sample is not None:
+            yield cost_per_sample
 
 
 def backward(
-    retain_graph: bool = False, debug: bool = False, print_costs: bool = False
+    retain_graph: bool = False,
+    debug: bool = False,
+    print_costs: bool = False,
+    retain_samples: bool = False,
 ) -> torch.Tensor:
     """
     Computes the gradients of the cost nodes with respect to the parameter nodes. It uses the storch
@@ -109,7 +216,14 @@ def backward(
 
     Args:
         retain_graph (bool): If set to False, it will deregister the added cost nodes. Should usually be set to False.
+            If True, the cost nodes stay registered, so they are included again in the next backward call.
         debug: Prints debug information on the backwards call.
+        print_costs: Prints the reduced value of each cost node.
+        retain_samples (bool): If True, only the cost nodes are deregistered. The sampled tensors, their plates and
+            the PyTorch graph that computed them are kept, and the sampling methods are not reset. This allows adding
+            new cost nodes on the same samples and calling backward again, for example to evaluate multiple objectives
+            without sampling and decoding again. Call :func:`reset` when done with the samples. Ignored if
+            `retain_graph` is True.
         accum_grads: Saves gradient information in stochastic nodes. Note that this is an expensive option as it
         requires doing O(n) backward calls for each stochastic node sampled multiple times. Especially if this is a
         hierarchy of multiple samples.
@@ -128,6 +242,10 @@ def backward(
     # Sum of losses that can be backpropagated through in keepgrads without difficult iterations
     accum_loss = 0.0
 
+    if retain_samples:
+        # Remember the children of the nodes in the graph, to remove the nodes created during this call afterwards
+        n_children = [(node, len(node._children)) for node in _walk_cost_parents(costs)]
+
     stochastic_nodes = set()
     # Loop over different cost nodes
     for c in costs:
@@ -141,86 +259,73 @@ def backward(
         # Compute gradients for the cost nodes themselves, if they require one.
         if reduced_cost.requires_grad:
             accum_loss += reduced_cost
-        for parent in c.walk_parents(depth_first=False):
-            # Instance check here instead of parent.stochastic, as backward methods are only used on these.
-            if isinstance(parent, StochasticTensor):
-                stochastic_nodes.add(parent)
-            else:
-                continue
-            if (
-                not parent.requires_grad
-                or not parent.method
-                or not parent.method.adds_loss(parent, c)
-            ):
-                continue
-
-            # Transpose the parent stochastic tensor, so that its shape is the same as the cost but the event shape, and
-            # possibly extra dimensions...?
-            parent_tensor = parent._tensor
-            reduced_cost = c
-            parent_plates = parent.multi_dim_plates()
-            # Reduce all plates that are in the cost node but not in the parent node
-            for plate in storch.order_plates(c.multi_dim_plates(), reverse=True):
-                if plate not in parent_plates:
-                    reduced_cost = plate.reduce(reduced_cost, detach_weights=True)
-            # Align the parent tensor so that the plate dimensions are in the same order as the cost tensor
-            for index_c, plate in enumerate(reduced_cost.multi_dim_plates()):
-                index_p = parent_plates.index(plate)
-                if index_c != index_p:
-                    parent_tensor = parent_tensor.transpose(index_p, index_c)
-                    parent_plates[index_p], parent_plates[index_c] = (
-                        parent_plates[index_c],
-                        parent_plates[index_p],
-                    )
-            # Add empty (k=1) plates to new parent
-            for plate in parent.plates:
-                if plate not in parent_plates:
-                    parent_plates.append(plate)
-
-            # Create new storch Tensors with different order of plates for the cost and parent
-            new_parent = storch.tensor.StochasticTensor(
-                parent_tensor,
-                [],
-                parent_plates,
-                parent.name,
-                parent.n,
-                parent.distribution,
-                parent._requires_grad,
-                parent.method,
+        for cost_per_sample in _estimator_terms(c, stochastic_nodes):
+            # The backwards call for reparameterization happens in the
+            # backwards call for the costs themselves.
+            # Now mean_cost has the same shape as parent.batch_shape
+            final_reduced_cost = storch.reduce_plates(
+                cost_per_sample, detach_weights=True
             )
-            # Fake the new parent to be the old parent within the graph by mimicing its place in the graph
-            new_parent._parents = parent._parents
-            for p, has_link in new_parent._parents:
-                p._children.append((new_parent, has_link))
-            new_parent._children = parent._children
-            cost_per_sample = parent.method._estimator(new_parent, reduced_cost)
-
-            if cost_per_sample is not None:
-                # The backwards call for reparameterization happens in the
-                # backwards call for the costs themselves.
-                # Now mean_cost has the same shape as parent.batch_shape
-                final_reduced_cost = storch.reduce_plates(
-                    cost_per_sample, detach_weights=True
-                )
-                if final_reduced_cost.ndim == 1:
-                    final_reduced_cost = final_reduced_cost.squeeze(0)
-                accum_loss += final_reduced_cost
+            if final_reduced_cost.ndim == 1:
+                final_reduced_cost = final_reduced_cost.squeeze(0)
+            accum_loss += final_reduced_cost
 
     if isinstance(accum_loss, storch.Tensor) and accum_loss._tensor.requires_grad:
-        accum_loss._tensor.backward(retain_graph=retain_graph)
+        accum_loss._tensor.backward(retain_graph=retain_graph or retain_samples)
 
+    # Update each method once, even if it sampled several stochastic nodes
+    methods = {}
     for s_node in stochastic_nodes:
         if s_node.method:
-            s_node.method._update_parameters()
+            typed_methods = methods.setdefault(type(s_node.method), {})
+            typed_methods[id(s_node.method)] = s_node.method
+    for method_type, typed_methods in methods.items():
+        method_type._update_all(list(typed_methods.values()))
 
-    if not retain_graph:
-        accum_loss._clean()
+    if retain_samples and not retain_graph:
+        _release_costs(n_children)
+    elif not retain_graph:
+        if isinstance(accum_loss, storch.Tensor):
+            accum_loss._clean()
         reset()
 
     # TODO: How much does accum_loss really say? Should we really keep it? We want to minimize total_cost, anyways.
     return total_cost._tensor  # , accum_loss._tensor
 
 
+def _walk_cost_parents(costs: List[CostTensor]) -> Iterator[storch.Tensor]:
+    """
+    Yields all nodes that are ancestors of the cost nodes once.
+    """
+    visited = set()
+    for c in costs:
+        for node in c.walk_parents():
+            if id(node) not in visited:
+                visited.add(id(node))
+                yield node
+
+
+def _release_costs(n_children: List[tuple]):
+    """
+    Deregisters the cost nodes, keeping the rest of the stochastic computation graph intact.
+
+    Args:
+        n_children: The nodes in the graph with the amount of children they had before the backward call.
+    """
+    cost_ids = set(id(c) for c in storch.inference._cost_tensors)
+    for node, n in n_children:
+        # Remove the nodes that were added during the backward call. This is done in place, as the temporary
+        # parents created in _estimator_terms share the children list.
+        del node._children[n:]
+        node._children[:] = [
+            (child, link) for child, link in node._children if id(child) not in cost_ids
+        ]
+    for c in storch.inference._cost_tensors:
+        c._parents = []
+        c._children = []
+    storch.inference._cost_tensors = []
+
+
 def reset():
     # Free the SC graph links. This often improves garbage collection for larger graphs.
     # Unfortunately Python's GC seems to have imperfect cycle detection
@@ -231,3 +336,272 @@ def reset():
     for method in storch.inference._sampling_methods:
         method.reset()
     storch.inference._sampling_methods = []
+
+
+def _repeat_independent(
+    tensor: Union[storch.Tensor, torch.Tensor], n: int, plate_name: str
+) -> IndependentTensor:
+    # Repeats the tensor n times on a new independent plate without copying the data
+    if isinstance(tensor, storch.Tensor):
+        repeated = tensor._tensor.unsqueeze(0).expand((n,) + tensor.shape)
+        tensor_name = (
+            tensor.name + "_indep_" + plate_name if tensor.name else plate_name
+        )
+        return IndependentTensor(
+            repeated, [tensor], tensor.plates.copy(), tensor_name, plate_name, None
+        )
+    repeated = tensor.unsqueeze(0).expand((n,) + tensor.shape)
+    return IndependentTensor(repeated, [], [], plate_name, plate_name, None)
+
+
+def gradient_samples(
+    model_fn: Callable[..., Any],
+    method: storch.method.Method,
+    n_repeats: int,
+    *inputs,
+    plate_name: str = "variance",
+) -> Dict[str, storch.Tensor]:
+    """
+    Computes `n_repeats` independent gradient estimates with respect to the parameters of the distribution sampled
+    using `method` in a single forward and backward pass. The tensor inputs are repeated along a new independent
+    plate, so that every repeat samples and estimates independently.
+
+    `model_fn` is called with the repeated inputs and should register its costs using :func:`add_cost`.
+    Note that this calls :func:`backward`, which also accumulates the (averaged) gradients of the model parameters.
+
+    Args:
+        model_fn: The model to estimate gradients of.
+        method: The method whose samples to compute the gradients for. Should be used exactly once in `model_fn`.
+        n_repeats: The amount of gradient estimates.
+        inputs: Inputs of `model_fn`. Tensors are repeated `n_repeats` times.
+        plate_name: The name of the plate of the repeats.
+
+    Returns:
+        Dict[str, storch.Tensor]: For each parameter name, the gradient estimates with the plate `plate_name`. All
+        other plates are reduced.
+    """
+    repeated_inputs = [
+        _repeat_independent(x, n_repeats, plate_name) if storch.is_tensor(x) else x
+        for x in inputs
+    ]
+    capture_grads = method.capture_grads
+    method.capture_grads = True
+    try:
+        model_fn(*repeated_inputs)
+        param_grads = []
+        for c in storch.inference._cost_tensors:
+            for node in c.walk_parents():
+                if (
+                    isinstance(node, StochasticTensor)
+                    and node.method is method
+                    and not any(node.param_grads is g for g in param_grads)
+                ):
+                    param_grads.append(node.param_grads)
+        if len(param_grads) != 1:
+            raise ValueError(
+                "Expected the method to sample exactly once, but it sampled "
+                + str(len(param_grads))
+                + " times."
+            )
+        backward()
+    finally:
+        method.capture_grads = capture_grads
+
+    samples = {}
+    for name, grad in param_grads[0].items():
+        if plate_name not in [plate.name for plate in grad.plates]:
+            raise ValueError(
+                "The parameter "
+                + name
+                + " does not depend on the inputs, so the gradient estimates cannot be separated."
+            )
+        # The costs are averaged over the repeats, so rescale to get the gradient estimate of each repeat
+        grad = grad * n_repeats
+        other_plates = [plate for plate in grad.plates if plate.name != plate_name]
+        if other_plates:
+            grad = storch.reduce_plates(grad, other_plates)
+        samples[name] = storch.Tensor(
+            grad._tensor.detach(), [], grad.plates, name + "_grad"
+        )
+    return samples
+
+
+def estimate_gradient_variance(
+    model_fn: Callable[..., Any],
+    method: storch.method.Method,
+    n_repeats: int,
+    *inputs,
+    plate_name: str = "variance",
+) -> Dict[str, torch.Tensor]:
+    """
+    Estimates the variance of the gradient estimates with respect to the parameters of the distribution sampled
+    using `method` from `n_repeats` estimates, computed in a single forward and backward pass.
+    See :func:`gradient_samples` for the arguments.
+
+    Returns:
+        Dict[str, torch.Tensor]: For each parameter name, the variance of the gradient estimates, summed over the
+        event dimensions.
+    """
+    samples = gradient_samples(
+        model_fn, method, n_repeats, *inputs, plate_name=plate_name
+    )
+    return {
+        name: storch.variance(grad, plate_name)._tensor
+        for name, grad in samples.items()
+    }
+
+
+def _reduce_except(
+    tensor: storch.Tensor, plate: storch.Plate, detach_weights: bool
+) -> torch.Tensor:
+    """
+    Reduces all plates of the tensor except `plate`. Returns a torch.Tensor of shape `(plate.n,)`.
+    """
+    other_plates = [p for p in tensor.plates if p.name != plate.name]
+    if other_plates:
+        tensor = storch.reduce_plates(tensor, other_plates, detach_weights)
+    if plate.name not in [p.name for p in tensor.multi_dim_plates()]:
+        # The tensor does not depend on the plate, so its gradient contributes equally to each element
+        return tensor._tensor.expand(plate.n)
+    return tensor._tensor
+
+
+_batched_grads_available = (
+    "is_grads_batched" in inspect.signature(torch.autograd.grad).parameters
+)
+
+
+def _is_batching_error(error: RuntimeError) -> bool:
+    # Raised by the vectorized backward pass for operations that have no batching rule
+    return "Batching rule not implemented" in str(error)
+
+
+def per_plate_grad(
+    plate_name: str, inputs: Optional[List[torch.Tensor]] = None
+) -> Union[Dict[str, Dict[str, torch.Tensor]], tuple]:
+    """
+    Computes the gradients of the registered cost nodes with respect to the distribution parameters for each element
+    of the plate `plate_name` without looping over the elements. The surrogate losses of the gradient estimators are
+    included. The gradients of all elements are computed in one vectorized backward pass.
+
+    The full gradient estimate is the weighted sum of the per-element gradients using the plate weights, ie
+    :math:`\\sum_i w_i g_i`. The plate weights are treated as constants. Gradients with respect to the parameters of
+    :class:`~torch.distributions.Categorical` and :class:`~torch.distributions.OneHotCategorical` distributions
+    are taken with respect to their normalized parameter.
+
+    This does not call the backward pass, does not update the parameters of the methods and keeps the graph intact,
+    so :func:`backward` can be called afterwards. Methods that call backward themselves in their estimator, such as
+    :class:`storch.method.LAX` and :class:`storch.method.RELAX`, are not supported.
+
+    Args:
+        plate_name: The name of the plate to compute the gradients for.
+        inputs: Optional tensors to compute the gradients with respect to, instead of the distribution parameters.
+
+    Returns:
+        If `inputs` is None, a dictionary containing for each stochastic node a dictionary from parameter name to
+        its gradients. Otherwise, a tuple with the gradients for each input. The gradients have shape
+        `(n, *param.shape)`, where n is the size of the plate.
+    """
+    costs: [CostTensor] = storch.inference._cost_tensors
+    if not costs:
+        raise RuntimeError("No cost nodes registered for per_plate_grad call.")
+    plate = None
+    for c in costs:
+        for p in c.multi_dim_plates():
+            if p.name == plate_name:
+                plate = p
+                break
+        if plate:
+            break
+    if not plate:
+        raise ValueError("No cost node has the plate " + plate_name + ".")
+
+    stochastic_nodes = set()
+    # The contribution to the loss of each element of the plate
+    per_element_loss = 0.0
+    for c in costs:
+        per_element_loss = per_element_loss + _reduce_except(c, plate, False)
+        for cost_per_sample in _estimator_terms(c, stochastic_nodes, False):
+            per_element_loss = per_element_loss + _reduce_except(
+                cost_per_sample, plate, True
+            )
+
+    if inputs is None:
+        keys = []
+        flat_inputs = []
+        for s_node in stochastic_nodes:
+            distr = s_node.distribution
+            params = storch.util.get_distr_parameters(distr)
+            if isinstance(
+                distr,
+                (
+                    torch.distributions.Categorical,
+                    torch.distributions.OneHotCategorical,
+                ),
+            ):
+                params = {
+                    name: param
+                    for name, param in params.items()
+                    if param is distr._param
+                }
+            for name, param in params.items():
+                keys.append((s_node.name, name))
+                flat_inputs.append(param)
+    else:
+        flat_inputs = list(inputs)
+    flat_inputs = [
+        x._tensor if isinstance(x, storch.Tensor) else x for x in flat_inputs
+    ]
+
+    grads = [None] * len(flat_inputs)
+    if isinstance(per_element_loss, torch.Tensor) and per_element_loss.requires_grad:
+        batched = False
+        if _batched_grads_available:
+            try:
+                grad_outputs = torch.eye(
+                    plate.n,
+                    dtype=per_element_loss.dtype,
+                    device=per_element_loss.device,
+                )
+                grads = torch.autograd.grad(
+                    [per_element_loss],
+                    flat_inputs,
+                    grad_outputs=[grad_outputs],
+                    retain_graph=True,
+                    allow_unused=True,
+                    is_grads_batched=True,
+                )
+                batched = True
+            except RuntimeError as e:
+                if not _is_batching_error(e):
+                    raise
+        if not batched:
+            # Batched gradients are unavailable or some backward function does not support vectorization.
+            per_element_grads = [
+                torch.autograd.grad(
+                    [per_element_loss[i]],
+                    flat_inputs,
+                    retain_graph=True,
+                    allow_unused=True,
+                )
+                for i in range(plate.n)
+            ]
+            grads = [
+                None if grad_i[0] is None else torch.stack(list(grad_i))
+                for grad_i in zip(*per_element_grads)
+            ]
+    grads = tuple(
+        (
+            torch.zeros((plate.n,) + x.shape, dtype=x.dtype, device=x.device)
+            if grad is None
+            else grad
+        )
+        for x, grad in zip(flat_inputs, grads)
+    )
+
+    if inputs is not None:
+        return grads
+    result = {}
+    for (node_name, param_name), grad in zip(keys, grads):
+        result.setdefault(node_name, {})[param_name] = grad
+    return result
@@ -4,9 +4,12 @@ from storch.method.method import (
     Infer,
     Method,
     Expect,
+    LocalExpectation,
     Reparameterization,
 )
 from storch.method.relax import RELAX, REBAR, LAX
 from storch.method.baseline import Baseline, MovingAverageBaseline
 from storch.method.multi_sample_reinforce import ScoreFunctionWOR
 from storch.method.unordered import UnorderedSetEstimator
+from storch.method.arm import ARM, DisARM
+from storch.method.adaptive import Adaptive
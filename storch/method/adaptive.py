@@ -0,0 +1,159 @@
+from time import perf_counter
+from typing import Optional, List, Callable, Any
+
+import torch
+
+import storch
+from storch import CostTensor, StochasticTensor
+from storch.method.method import Method
+
+
+class Adaptive(Method):
+    """
+    Method that periodically benchmarks a list of candidate gradient estimators on the live model, and uses the one
+    that is most efficient in between benchmarks. The efficiency of an estimator is measured as the variance of its
+    gradient estimates times the wall-clock time per estimate, ie the variance it reaches for a fixed time budget.
+
+    A benchmark (:meth:`benchmark`) computes `n_repeats` independent gradient estimates of every candidate on the same
+    fixed batch of inputs and parameters using :func:`storch.gradient_samples`, so that the measured variance is the
+    variance of the estimator only, and not that of the data or of the change of the parameters during training.
+    The estimates of a candidate are computed in a single vectorized forward and backward pass, which is timed.
+    The overhead is amortized by benchmarking only once every `interval` training iterations, see
+    :attr:`benchmark_due`.
+
+    Example::
+
+        method = storch.method.Adaptive(
+            "z",
+            [
+                storch.method.ScoreFunction("z", n_samples=4, baseline_factory="batch_average"),
+                storch.method.ScoreFunctionWOR("z", k=4),
+                storch.method.UnorderedSetEstimator("z", k=4),
+                storch.method.RELAX("z", in_dim=10),
+            ],
+        )
+
+        for x in data:
+            if method.benchmark_due:
+                method.benchmark(model, x)
+            optimizer.zero_grad()
+            model(x)
+            storch.backward()
+            optimizer.step()
+
+    Args:
+        plate_name (str): The name of the :class:`.Plate` that samples of this method will use.
+        candidates (List[Method]): The gradient estimation methods to choose from. Their plate names should be
+            `plate_name`.
+        n_repeats (int): The amount of gradient estimates to compute the variance of each candidate from. At least 2.
+        interval (int): The amount of training iterations between two benchmarks.
+
+    Attributes:
+        method (Method): The candidate that is currently used.
+        variances (torch.Tensor): The variance of the gradient estimates of each candidate in the last benchmark,
+            summed over all parameters of the sampled distribution. NaN if not measured yet.
+        seconds (torch.Tensor): The wall-clock time per gradient estimate of each candidate in the last benchmark.
+        efficiencies (torch.Tensor): The variance times seconds per estimate of each candidate in the last
+            benchmark. Lower is better. NaN if not measured yet.
+    """
+
+    def __init__(
+        self,
+        plate_name: str,
+        candidates: List[Method],
+        n_repeats: int = 10,
+        interval: int = 1000,
+    ):
+        if not candidates:
+            raise ValueError("Adaptive requires at least one candidate method.")
+        if n_repeats < 2:
+            raise ValueError(
+                "At least 2 gradient estimates are required to measure the variance."
+            )
+        for candidate in candidates:
+            if candidate.plate_name != plate_name:
+                raise ValueError(
+                    "The plate name of the candidates and the adaptive method should match."
+                )
+        super().__init__(plate_name, candidates[0].sampling_method)
+        self.candidates = torch.nn.ModuleList(candidates)
+        self.n_repeats = n_repeats
+        self.interval = interval
+        self.register_buffer("variances", torch.full((len(candidates),), float("nan")))
+        self.register_buffer("seconds", torch.full((len(candidates),), float("nan")))
+        self._active = 0
+        # None if no benchmark was run yet
+        self._since_benchmark: Optional[int] = None
+
+    @property
+    def method(self) -> Method:
+        return self.candidates[self._active]
+
+    @property
+    def efficiencies(self) -> torch.Tensor:
+        return self.variances * self.seconds
+
+    @property
+    def benchmark_due(self) -> bool:
+        """
+        True if no benchmark was run yet, or if `interval` training iterations have passed since the last benchmark.
+        """
+        return self._since_benchmark is None or self._since_benchmark >= self.interval
+
+    def _use(self, index: int):
+        self._active = index
+        self.sampling_method = self.method.sampling_method
+
+    def _clock(self) -> float:
+        # Wait for the queued kernels, so that the time of the asynchronous computations is included
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            torch.cuda.synchronize()
+        return perf_counter()
+
+    def benchmark(self, model_fn: Callable[..., Any], *inputs) -> Method:
+        """
+        Measures the efficiency of every candidate on the fixed inputs, and switches to the most efficient one.
+        `model_fn` and `inputs` are as in :func:`storch.gradient_samples`: `model_fn` should sample using this method
+        exactly once and register its costs. The parameters of the sampled distribution should depend on the tensor
+        inputs. Note that this calls :func:`storch.backward` for every candidate, which accumulates the gradients of
+        the model parameters, so the gradients should be zeroed before the next training iteration.
+
+        Returns:
+            Method: The selected candidate.
+        """
+        for i in range(len(self.candidates)):
+            self._use(i)
+            start = self._clock()
+            samples = storch.gradient_samples(
+                model_fn, self, self.n_repeats, *inputs, plate_name="adaptive"
+            )
+            self.seconds[i] = (self._clock() - start) / self.n_repeats
+            self.variances[i] = sum(
+                storch.variance(grad, "adaptive")._tensor.sum()
+                for grad in samples.values()
+            )
+        self._use(int(self.efficiencies.nan_to_num(float("inf")).argmin()))
+        self._since_benchmark = 0
+        return self.method
+
+    def post_sample(self, tensor: StochasticTensor) -> Optional[storch.Tensor]:
+        return self.method.post_sample(tensor)
+
+    def estimator(
+        self, tensor: StochasticTensor, cost_node: CostTensor
+    ) -> Optional[storch.Tensor]:
+        return self.method._estimator(tensor, cost_node)
+
+    def adds_loss(self, tensor: StochasticTensor, cost_node: CostTensor) -> bool:
+        return self.method.adds_loss(tensor, cost_node)
+
+    def update_parameters(
+        self, result_triples: [(StochasticTensor, CostTensor)]
+    ) -> None:
+        type(self.method)._update_all([self.method])
+        if self._since_benchmark is not None:
+            self._since_benchmark += 1
+
+    def reset(self):
+        for candidate in self.candidates:
+            candidate.reset()
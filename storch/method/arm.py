@@ -0,0 +1,191 @@
+from typing import Optional
+
+import torch
+from torch.distributions import (
+    Bernoulli,
+    Categorical,
+    Distribution,
+    Independent,
+    OneHotCategorical,
+)
+
+import storch
+from storch import Plate, CostTensor, StochasticTensor, deterministic
+from storch.method.method import Method
+from storch.sampling import MonteCarlo
+from storch.util import split
+
+
+def _base_distribution(distr: Distribution) -> Distribution:
+    while isinstance(distr, Independent):
+        distr = distr.base_dist
+    if not isinstance(distr, (Bernoulli, Categorical, OneHotCategorical)):
+        raise ValueError(
+            "Coupled sampling is only implemented for Bernoulli, Categorical and OneHotCategorical distributions."
+        )
+    return distr
+
+
+def _stick_breaking_logits(logits: torch.Tensor) -> torch.Tensor:
+    """
+    Computes the logits of the |D| - 1 Bernoulli variables of the stick-breaking construction of a categorical
+    distribution. The k-th variable decides whether to choose category k, given that no earlier category is chosen.
+    """
+    # The log of the total mass of the categories after category k
+    log_rest = logits.flip(-1).logcumsumexp(-1).flip(-1)[..., 1:]
+    return logits[..., :-1] - log_rest
+
+
+def _logits(distr: Distribution):
+    if isinstance(distr, Bernoulli):
+        return distr.logits
+    return deterministic(_stick_breaking_logits)(distr.logits)
+
+
+class ARMSampling(MonteCarlo):
+    """
+    Samples `n_samples` antithetic pairs of discrete samples, giving a plate of size `2 * n_samples`. The first half
+    of the plate contains the samples, the second half the paired samples. A pair reuses a single uniform draw u per
+    Bernoulli variable: b = 1[u < sigmoid(logits)] and b' = 1[1 - u < sigmoid(logits)].
+    Categorical samples are constructed from |D| - 1 Bernoulli variables through stick-breaking.
+    Every sample is marginally distributed according to the distribution, so the samples are weighted equally.
+    """
+
+    def mc_sample(
+        self,
+        distr: Distribution,
+        parents: [storch.Tensor],
+        plates: [Plate],
+        amt_samples: int,
+    ) -> torch.Tensor:
+        base = _base_distribution(distr)
+        logits = _logits(base)
+        probs = logits.sigmoid()
+        u = torch.rand(
+            (amt_samples,) + logits.shape, device=logits.device, dtype=logits.dtype
+        )
+        bits = torch.cat([u < probs, 1 - u < probs])
+        if isinstance(base, Bernoulli):
+            return bits.to(probs.dtype)
+        # The category is the first Bernoulli variable that is 1, or the last category if there is none.
+        bits = torch.cat([bits, torch.ones_like(bits[..., :1])], -1)
+        index = bits.to(probs.dtype).argmax(-1)
+        if isinstance(base, OneHotCategorical):
+            return torch.nn.functional.one_hot(index, base.probs.shape[-1]).to(
+                probs.dtype
+            )
+        return index
+
+
+@deterministic
+def _coupled_weight(
+    sample: torch.Tensor,
+    sample_tilde: torch.Tensor,
+    logits: torch.Tensor,
+    distr: Distribution,
+    rao_blackwellize: bool,
+) -> torch.Tensor:
+    """
+    Computes the coefficient of f(b) - f(b') in the ARM or DisARM estimate of the derivative with respect to the
+    (stick-breaking) logits.
+    """
+    if isinstance(distr, Bernoulli):
+        known = known_tilde = torch.ones_like(logits, dtype=torch.bool)
+        bit = sample > 0.5
+        bit_tilde = sample_tilde > 0.5
+    else:
+        if isinstance(distr, OneHotCategorical):
+            sample = sample.argmax(-1)
+            sample_tilde = sample_tilde.argmax(-1)
+        k = torch.arange(logits.shape[-1], device=logits.device)
+        # Bernoulli variables after the chosen category are not observed
+        known = k <= sample.unsqueeze(-1)
+        bit = k == sample.unsqueeze(-1)
+        known_tilde = k <= sample_tilde.unsqueeze(-1)
+        bit_tilde = k == sample_tilde.unsqueeze(-1)
+    logits, known, bit, known_tilde, bit_tilde = torch.broadcast_tensors(
+        logits, known, bit, known_tilde, bit_tilde
+    )
+    probs = logits.sigmoid()
+    probs_tilde = (-logits).sigmoid()
+
+    # Find the interval of u that is consistent with the observed Bernoulli variables
+    zero = torch.zeros_like(probs)
+    one = torch.ones_like(probs)
+    lower = torch.where(known & ~bit, probs, zero)
+    lower = torch.max(lower, torch.where(known_tilde & bit_tilde, probs_tilde, zero))
+    upper = torch.where(known & bit, probs, one)
+    upper = torch.min(upper, torch.where(known_tilde & ~bit_tilde, probs_tilde, one))
+    length = (upper - lower).clamp(min=torch.finfo(probs.dtype).tiny)
+
+    if rao_blackwellize:
+        # Expectation of (-1)^b' 1[b != b'] over u in the interval. b = 1, b' = 0 if u < m and b = 0, b' = 1 if
+        # u > 1 - m. Unobserved variables are marginalized, which is possible as the costs do not depend on them.
+        m = (-logits.abs()).sigmoid()
+        p_differ = (torch.min(upper, m) - lower).clamp(min=0.0)
+        p_differ_tilde = (upper - torch.max(lower, 1 - m)).clamp(min=0.0)
+        return 0.5 * (p_differ - p_differ_tilde) / length * logits.abs().sigmoid()
+    # Resample u given the observed variables
+    u = lower + (upper - lower) * torch.rand_like(lower)
+    return 0.5 - u
+
+
+class ARM(Method):
+    """
+    Implements the Augment-REINFORCE-Merge (ARM) estimator for Bernoulli variables, https://arxiv.org/abs/1807.11143,
+    using pairs of antithetic samples from :class:`ARMSampling`. Categorical variables are supported by applying the
+    estimator to the Bernoulli variables of the stick-breaking construction, see https://arxiv.org/abs/2106.08056
+
+    As only the discrete samples are stored, the uniform noise is resampled given the sampled pairs when computing the
+    estimate. Prefer :class:`DisARM`, which marginalizes this noise analytically and has lower variance.
+
+    Args:
+        plate_name (str): The name of the :class:`.Plate` that samples of this method will use.
+        n_samples (int): The amount of pairs of samples. The plate has size `2 * n_samples`.
+    """
+
+    rao_blackwellize = False
+
+    def __init__(self, plate_name: str, n_samples: int = 1):
+        super().__init__(plate_name, ARMSampling(plate_name, n_samples))
+
+    def estimator(
+        self, tensor: StochasticTensor, cost_node: CostTensor
+    ) -> Optional[storch.Tensor]:
+        distr = _base_distribution(tensor.distribution)
+        plate = tensor.get_plate(tensor.name)
+        sample, sample_tilde = split(tensor, plate, amt_slices=2)
+        cost, cost_tilde = split(cost_node, plate, amt_slices=2)
+
+        logits = _logits(distr)
+        weight = _coupled_weight(
+            sample, sample_tilde, logits, distr, self.rao_blackwellize
+        )
+        # Estimate of the derivative with respect to the logits for each pair
+        d_logits = (weight * (cost - cost_tilde)).detach()
+        surrogate = d_logits * logits
+        if isinstance(surrogate, storch.Tensor):
+            event_dims = list(surrogate.event_dim_indices())
+        else:
+            event_dims = list(range(surrogate.dim()))
+        if event_dims:
+            surrogate = surrogate.sum(dim=event_dims)
+        return surrogate
+
+    def adds_loss(self, tensor: StochasticTensor, cost_node: CostTensor) -> bool:
+        return True
+
+
+class DisARM(ARM):
+    """
+    Implements the DisARM estimator, https://arxiv.org/abs/2006.10680, which marginalizes the uniform noise of
+    :class:`ARM` given the sampled pairs. Categorical variables are supported through stick-breaking, see
+    https://arxiv.org/abs/2106.08056. The Bernoulli variables that are unobserved because an earlier category was
+    chosen are marginalized as well.
+
+    Args:
+        plate_name (str): The name of the :class:`.Plate` that samples of this method will use.
+        n_samples (int): The amount of pairs of samples. The plate has size `2 * n_samples`.
+    """
+
+    rao_blackwellize = True
@@ -15,6 +15,7 @@ from storch.sampling import (
     SamplingMethod,
     MonteCarlo,
     Enumerate,
+    LocalEnumerate,
 )
 
 
@@ -29,10 +30,16 @@ class Method(ABC, torch.nn.Module):
     Args:
         plate_name (str): The name of the :class:`.Plate` that samples of this method will use.
         sampling_method (storch.sampling.SamplingMethod): The method to sample tensors with given an input distribution.
+
+    Attributes:
+        capture_grads (bool): If True, the gradients with respect to the parameters of the sampled distributions are
+            stored in :attr:`storch.StochasticTensor.param_grads` during the backward pass. This is disabled by default
+            as it requires registering a hook on every parameter.
     """
 
     def __init__(self, plate_name: str, sampling_method: SamplingMethod):
         super().__init__()
+        self.capture_grads = False
         self._estimation_pairs = []
         self.register_buffer("iterations", torch.tensor(0, dtype=torch.long))
         self.plate_name = plate_name
@@ -63,13 +70,13 @@ class Method(ABC, torch.nn.Module):
             if isinstance(grad, tuple):
                 grad = grad[0]
 
-            # print(grad)
             if name in accum_grads:
+                # Accumulate in place into the buffer created by the first call
+                accum_grads[name]._tensor.add_(grad)
+            else:
                 accum_grads[name] = storch.Tensor(
-                    accum_grads[name]._tensor + grad, [], plates, name + "_grad"
+                    grad.detach().clone(), [], plates, name + "_grad"
                 )
-            else:
-                accum_grads[name] = storch.Tensor(grad, [], plates, name + "_grad")
 
         return hook
 
@@ -118,7 +125,11 @@ class Method(ABC, torch.nn.Module):
             # if isinstance(batch_weighting, storch.Tensor):
             #     batch_weighting.plates[0] = plate
 
-        for name, param in params.items():
+        # Only hook the parameters if gradients are captured. They are not computed in inference mode.
+        hook_params = {}
+        if self.capture_grads and not storch.wrappers._inference_mode:
+            hook_params = params
+        for name, param in hook_params.items():
             # TODO: Possibly could find the wrong gradients here if multiple distributions use the same parameter?
             # This maybe requires copying the tensor hm...
             if param.requires_grad:
@@ -163,6 +174,8 @@ class Method(ABC, torch.nn.Module):
                 False,
             )
             new_s_tensor.param_grads = s_tensor.param_grads
+            if storch.wrappers._tracer is not None:
+                storch.wrappers._tracer.alias(new_s_tensor, edited_sample)
             return new_s_tensor
         return s_tensor
 
@@ -183,6 +196,15 @@ class Method(ABC, torch.nn.Module):
         self.update_parameters(self._estimation_pairs)
         self._estimation_pairs = []
 
+    @classmethod
+    def _update_all(cls, methods: List["Method"]):
+        """
+        Updates the parameters of the given methods of this type after the backward pass. Subclasses can override this
+        to batch the updates of several methods.
+        """
+        for method in methods:
+            method._update_parameters()
+
     def estimator(
         self, tensor: StochasticTensor, cost_node: CostTensor
     ) -> Optional[storch.Tensor]:
@@ -261,6 +283,7 @@ class Infer(Method):
     def update_parameters(
         self, result_triples: [(StochasticTensor, CostTensor, torch.Tensor)]
     ):
+        self._method.iterations.copy_(self.iterations)
         self._method.update_parameters(result_triples)
         self._score_method.update_parameters(result_triples)
 
@@ -316,9 +339,21 @@ class Reparameterization(Method):
 
 class GumbelSoftmax(Method):
     """
-    Method that implements the Gumbel Softmax relaxation with temperature annealing.
+    Method that implements the Gumbel Softmax relaxation with optional temperature annealing.
     Can only be used to find the derivative when all paths to the cost nodes are differentiable.
     Introduced in https://arxiv.org/abs/1611.01144 and https://arxiv.org/abs/1611.00712
+
+    If an annealing schedule is given, the temperature is annealed after every :func:`storch.backward` call. The
+    annealing is computed on the device of the temperature, and the temperatures of all methods in the graph are
+    annealed together.
+
+    Args:
+        annealing: The annealing schedule. Options are None (default) for a constant temperature, "exponential",
+            which multiplies the temperature with exp(-annealing_rate * annealing_interval), and "linear", which
+            subtracts annealing_rate * annealing_interval. It can also be a function that maps the iteration (a long
+            tensor) to the temperature. There is no built-in schedule that targets the variance of the gradients.
+        annealing_interval (int): The amount of iterations between updates of the temperature. Use 1 to anneal every
+            iteration.
     """
 
     def __init__(
@@ -330,18 +365,45 @@ class GumbelSoftmax(Method):
         initial_temperature=1.0,
         min_temperature=1.0e-4,
         annealing_rate=1.0e-5,
+        annealing: Optional[
+            Union[str, Callable[[torch.Tensor], torch.Tensor]]
+        ] = None,
+        annealing_interval: int = 1,
     ):
         if not sampling_method:
             sampling_method = MonteCarlo(plate_name, n_samples)
         super().__init__(
             plate_name, sampling_method.set_mc_sample(self.sample_gumbel),
         )
+        if annealing == "none" or annealing == "None":
+            annealing = None
+        if not (annealing in [None, "exponential", "linear"] or callable(annealing)):
+            raise ValueError("Invalid annealing schedule", annealing)
 
         self.straight_through = straight_through
+        self.annealing = annealing
+        self.annealing_interval = annealing_interval
         self.register_buffer("temperature", torch.tensor(initial_temperature))
         self.register_buffer("annealing_rate", torch.tensor(annealing_rate))
         self.register_buffer("min_temperature", torch.tensor(min_temperature))
 
+    @classmethod
+    def _update_all(cls, methods: List[Method]):
+        batched = []
+        for method in methods:
+            if type(method).update_parameters is GumbelSoftmax.update_parameters:
+                method.iterations += 1
+                method._estimation_pairs = []
+                batched.append(method)
+            else:
+                method._update_parameters()
+        _anneal_temperatures(batched)
+
+    def update_parameters(
+        self, result_triples: [(StochasticTensor, CostTensor)]
+    ) -> None:
+        _anneal_temperatures([self])
+
     def sample_gumbel(
         self,
         distr: Distribution,
@@ -364,6 +426,44 @@ class GumbelSoftmax(Method):
         )
 
 
+def _anneal_temperatures(methods: List[GumbelSoftmax]):
+    """
+    Anneals the temperatures of the given Gumbel-softmax methods. Methods with the same schedule are annealed in a
+    single batch, without synchronizing with the host.
+    """
+    groups = {}
+    for method in methods:
+        if callable(method.annealing):
+            temperature = torch.as_tensor(
+                method.annealing(method.iterations), device=method.temperature.device
+            )
+            method.temperature.copy_(torch.max(temperature, method.min_temperature))
+        elif method.annealing:
+            key = (
+                method.annealing,
+                method.annealing_interval,
+                method.temperature.device,
+            )
+            groups.setdefault(key, []).append(method)
+
+    for (annealing, interval, _), group in groups.items():
+        temperatures = [method.temperature for method in group]
+        temperature = torch.stack(temperatures)
+        rate = torch.stack([method.annealing_rate for method in group]) * interval
+        if annealing == "exponential":
+            annealed = temperature * torch.exp(-rate)
+        else:
+            annealed = temperature - rate
+        annealed = torch.max(
+            annealed, torch.stack([method.min_temperature for method in group])
+        )
+        iterations = torch.stack([method.iterations for method in group])
+        annealed = torch.where(iterations % interval == 0, annealed, temperature)
+        with torch.no_grad():
+            for temperature, value in zip(temperatures, annealed.unbind()):
+                temperature.copy_(value)
+
+
 BaselineFactory = Callable[[storch.StochasticTensor, storch.CostTensor], Baseline]
 
 
@@ -433,3 +533,29 @@ class ScoreFunction(Method):
 class Expect(Method):
     def __init__(self, plate_name: str, budget=10000):
         super().__init__(plate_name, Enumerate(plate_name, budget))
+
+
+class LocalExpectation(Method):
+    """
+    Local expectation gradients for factorized discrete distributions, see https://arxiv.org/abs/1503.01494
+    For each dimension, the gradient is estimated by enumerating its support while keeping the other dimensions at
+    their sampled values. This has a variance close to :class:`Expect`, but the cost is linear instead of exponential
+    in the amount of dimensions. The variations are sampled by :class:`storch.sampling.LocalEnumerate`.
+
+    Args:
+        plate_name (str): The name of the :class:`.Plate` that samples of this method will use.
+        n_samples (int): The amount of joint samples to compute the local expectations for.
+        budget (int): The maximum size of the plate with all variations.
+    """
+
+    def __init__(self, plate_name: str, n_samples: int = 1, budget=10000):
+        super().__init__(plate_name, LocalEnumerate(plate_name, n_samples, budget))
+
+    def estimator(self, tensor: StochasticTensor, cost: CostTensor) -> storch.Tensor:
+        log_prob, dims = self.sampling_method.local_log_prob(tensor)
+        # The plate weights are p(x_d)/(n * dims) without gradient. This corrects them to the gradient of
+        # sum_d p(x_d) * f(x_d, x_{-d}) / n
+        return dims * (log_prob - log_prob.detach()).exp() * cost.detach()
+
+    def adds_loss(self, tensor: StochasticTensor, cost_node: CostTensor) -> bool:
+        return True
@@ -1,21 +1,20 @@
 from functools import reduce
 from operator import mul
-from typing import Optional, Callable
+from typing import Optional, Callable, Tuple
 
 import torch
 from torch.distributions import Distribution, Bernoulli
-from torch.distributions.utils import clamp_probs
 from torch.nn import Parameter
 
 import storch
 from storch import Plate, CostTensor, StochasticTensor, deterministic
-from storch.sampling import MonteCarlo, SamplingMethod
+from storch.sampling import MonteCarlo, SamplingMethod, gumbel
 from storch.typing import Dims
 from storch.method.method import Reparameterization, GumbelSoftmax
 
 import torch.nn.functional as F
 
-from storch.util import get_distr_parameters, rsample_gumbel, split
+from storch.util import get_distr_parameters, rsample_gumbel
 
 
 class Baseline(torch.nn.Module):
@@ -110,7 +109,7 @@ class LAX(Reparameterization):
             # Compute total derivative with respect to the parameter
             d_param = diff * d_log_prob + d_output_baseline
             # Reduce the plate of this sample in case multiple samples are taken
-            d_param = storch.reduce_plates(d_param, plate_names=[tensor.name])
+            d_param = storch.reduce_plates(d_param, plates=[tensor.name])
             # Compute backwards from the parameters using its total derivative
             if isinstance(param, storch.Tensor):
                 param = param._tensor
@@ -133,10 +132,11 @@ class LAX(Reparameterization):
         return True
 
 
+@deterministic
 def discretize(tensor: torch.Tensor, distr: Distribution) -> torch.Tensor:
     # Adapted from pyro.relaxed_straight_through
     if isinstance(distr, Bernoulli):
-        return tensor.round()
+        return tensor.detach().round()
     argmax = tensor.max(-1)[1]
     hard_sample = torch.zeros_like(tensor)
     if argmax.dim() < hard_sample.dim():
@@ -144,7 +144,6 @@ def discretize(tensor: torch.Tensor, distr: Distribution) -> torch.Tensor:
     return hard_sample.scatter_(-1, argmax, 1)
 
 
-@deterministic
 def conditional_gumbel_rsample(
     hard_sample: torch.Tensor, distr: Distribution, temperature,
 ) -> torch.Tensor:
@@ -152,39 +151,50 @@ def conditional_gumbel_rsample(
     Conditionally re-samples from the distribution given the hard sample.
     This samples z \sim p(z|b), where b is the hard sample and p(z) is a gumbel distribution.
     """
-    # Adapted from torch.distributions.relaxed_bernoulli and torch.distributions.relaxed_categorical
-    shape = hard_sample.shape
-    probs = (
-        distr.probs
-        if not isinstance(hard_sample, storch.Tensor)
-        else distr.probs._tensor
+    return _conditional_gumbel_rsample(
+        hard_sample, distr.logits, temperature, isinstance(distr, Bernoulli)
     )
-    probs = clamp_probs(probs.expand_as(hard_sample))
-    v = clamp_probs(torch.rand(shape, dtype=probs.dtype, device=probs.device))
-    if isinstance(distr, Bernoulli):
-        pos_probs = probs[hard_sample == 1]
-        v_prime = torch.zeros_like(hard_sample)
-        # See https://arxiv.org/abs/1711.00123
-        v_prime[hard_sample == 1] = v[hard_sample == 1] * pos_probs + (1 - pos_probs)
-        v_prime[hard_sample == 0] = v[hard_sample == 0] * (1 - probs[hard_sample == 0])
-        log_sample = (
-            probs.log() + probs.log1p() + v_prime.log() + v_prime.log1p()
-        ) / temperature
-        return log_sample.sigmoid()
-    # b=argmax(hard_sample)
-    b = hard_sample.max(-1).indices
-    # b = F.one_hot(b, hard_sample.shape[-1])
 
+
+@deterministic
+def _conditional_gumbel_rsample(
+    hard_sample: torch.Tensor, logits: torch.Tensor, temperature, is_bernoulli: bool
+) -> torch.Tensor:
     # See https://arxiv.org/abs/1711.00123
-    log_v = v.log()
-    # i != b (indexing could maybe be improved here, but i doubt it'd be more efficient)
-    log_v_b = torch.gather(log_v, -1, b.unsqueeze(-1))
-    cond_gumbels = -(-(log_v / probs) - log_v_b).log()
-    # i = b
-    index_sample = hard_sample.bool()
-    cond_gumbels[index_sample] = -(-log_v[index_sample]).log()
-    scores = cond_gumbels / temperature
-    return (scores - scores.logsumexp(dim=-1, keepdim=True)).exp()
+    if is_bernoulli:
+        cond_logistics = gumbel.logistic_given_sample(logits, hard_sample)
+        return (cond_logistics / temperature).sigmoid()
+    cond_gumbels = gumbel.gumbel_given_argmax(logits, hard_sample.argmax(-1))
+    return (cond_gumbels / temperature).softmax(-1)
+
+
+def batched_c_phi(
+    c_phi: Callable[[storch.Tensor], storch.Tensor], *samples: storch.Tensor
+) -> Tuple[storch.Tensor, ...]:
+    """
+    Evaluates the control variate `c_phi` on all `samples` in a single call. The samples are aligned and stacked in
+    a new plate, so that the network is run on one batch instead of once for every sample.
+
+    Returns:
+        The output of `c_phi` for each of the samples.
+    """
+    args, _, parents, plates = storch.wrappers._prepare_args(
+        samples, {}, expand_plates=True
+    )
+    c_phi_plate = Plate("_c_phi", len(samples), [])
+    stacked = storch.Tensor(
+        torch.stack(args), parents, [c_phi_plate] + plates, "c_phi_input"
+    )
+    output = c_phi(stacked)
+    if not isinstance(output, storch.Tensor):
+        # For example a constant control variate
+        return (output,) * len(samples)
+    index = output.get_plate_dim_index(c_phi_plate.name)
+    out_plates = [p for p in output.plates if p.name != c_phi_plate.name]
+    return tuple(
+        storch.Tensor(output._tensor.select(index, i), [output], out_plates, "c_phi")
+        for i in range(len(samples))
+    )
 
 
 class RELAX(GumbelSoftmax):
@@ -193,6 +203,9 @@ class RELAX(GumbelSoftmax):
     Implements the RELAX estimator from Grathwohl et al, 2018, https://arxiv.org/abs/1711.00123
     and the REBAR estimator from Tucker et al, 2017, https://arxiv.org/abs/1703.07370
     Code inspired by https://github.com/duvenaud/relax/blob/master/pytorch_toy.py
+
+    The parameters of c_phi, the temperature and the scale of the control variate eta receive the gradient of the
+    variance of the estimate. Add the parameters of this method to an optimizer to learn them.
     """
 
     def __init__(
@@ -205,41 +218,36 @@ class RELAX(GumbelSoftmax):
         in_dim: Dims = None,
         rebar=False,
     ):
-        if not sampling_method:
-            sampling_method = MonteCarlo(plate_name, n_samples)
-        super().__init__(plate_name, sampling_method.set_mc_sample(self.mc_sample))
+        super().__init__(plate_name, sampling_method, n_samples, annealing=None)
         if c_phi:
             self.c_phi = c_phi
         else:
             self.c_phi = Baseline(in_dim)
 
-        self.temperature = Parameter(torch.tensor(1.0))
+        # The temperature is optimized to minimize the variance instead of annealed
+        self.temperature = Parameter(self._buffers.pop("temperature"))
         self.rebar = rebar
         if self.rebar:
             self.sampling_method = REBARMC(plate_name, n_samples, self.temperature)
-        # TODO: Automatically learn eta
-        self.eta = 1.0
+        # The scale of the control variate for the logits. Like the temperature, it is optimized to minimize the
+        # variance, see Section 3.2 of https://arxiv.org/abs/1703.07370
+        self.eta = Parameter(self.temperature.new_tensor(1.0))
 
     def post_sample(self, tensor: storch.StochasticTensor) -> Optional[storch.Tensor]:
         if self.rebar:
-            # Make sure the r-sampled gumbels don't backpropagate in the normal backward pass
-            # TODO: This doesn't work. We need to record the gradients with respect to the cost, as they are used in
-            # the estimator. By detaching it, they are no longer recorded. However, not detaching means the normal loss
-            # will capture it... Need to rethink this.
-            return tensor
-        else:
-            # Return H(z) for the function evaluation if using RELAX
-            return self._discretize(tensor, tensor.distribution)
+            # The relaxed samples have weight 0 in the REBARPlate, so they don't backpropagate in the normal backward
+            # pass. Their gradients are only used in the estimator.
+            return None
+        # Return H(z) for the function evaluation if using RELAX
+        return discretize(tensor, tensor.distribution)
 
     def estimator(
         self, tensor: StochasticTensor, cost_node: CostTensor
     ) -> Optional[storch.Tensor]:
-        plate = tensor.get_plate(tensor.name)
         if self.rebar:
-            hard_sample, relaxed_sample, cond_sample = split(
-                tensor, plate, amt_slices=3
-            )
-            hard_cost, relaxed_cost, cond_cost = split(cost_node, plate, amt_slices=3)
+            plate = tensor.get_plate(tensor.name)
+            hard_sample, relaxed_sample, cond_sample = plate.split(tensor)
+            hard_cost, relaxed_cost, cond_cost = plate.split(cost_node)
 
         else:
             hard_sample = discretize(tensor, tensor.distribution)
@@ -253,63 +261,50 @@ class RELAX(GumbelSoftmax):
             cond_cost = 0.0
 
         # Input rsampled values into c_phi
-        c_phi_relaxed = self.c_phi(relaxed_sample) + relaxed_cost
-        c_phi_cond = self.c_phi(cond_sample) + cond_cost
-
-        # Compute log probability of hard sample
-        log_prob = tensor.distribution.log_prob(hard_sample)
-        log_prob = log_prob.sum(
-            dim=list(range(hard_sample.plate_dims, len(log_prob.shape)))
+        c_phi_relaxed, c_phi_cond = batched_c_phi(
+            self.c_phi, relaxed_sample, cond_sample
         )
+        c_phi_relaxed = c_phi_relaxed + relaxed_cost
+        c_phi_cond = c_phi_cond + cond_cost
 
-        # Compute the derivative with respect to the distributional parameters through the baseline.
-        param = tensor.distribution._param
-        # TODO: It should either propagate over the logits or over the probs. Can we know which one is the parameter and
-        # which one is computed dynamically?
-        # param.register_hook(hook)
-        # TODO: Can these be collected in a single torch.autograd.grad call?
-        d_log_prob = storch.grad(
-            [log_prob],
-            [param],
-            create_graph=True,
-            grad_outputs=torch.ones_like(log_prob),
-        )[0]
-        d_c_phi_relaxed = storch.grad(
-            [c_phi_relaxed],
-            [param],
-            create_graph=True,
-            grad_outputs=torch.ones_like(c_phi_relaxed),
-        )[0]
-        d_c_phi_cond = storch.grad(
-            [c_phi_cond],
-            [param],
-            create_graph=True,
-            grad_outputs=torch.ones_like(c_phi_cond),
-        )[0]
-
+        # Compute the derivative with respect to the logits. The score function of the hard sample is computed in
+        # closed form, so that it is available for every sample, and not only summed over the samples.
+        logits = tensor.distribution.logits
+        score = _score(hard_sample, logits, isinstance(tensor.distribution, Bernoulli))
         diff = hard_cost - self.eta * c_phi_cond
-        # Compute total derivative with respect to the parameter
-        d_param = diff * d_log_prob + self.eta * (d_c_phi_relaxed - d_c_phi_cond)
         # Reduce the plate of this sample in case multiple samples are taken
-        d_param = storch.reduce_plates(d_param, plate_names=[tensor.name])
-        # Compute backwards from the parameters using its total derivative
-        if isinstance(param, storch.Tensor):
-            param._tensor.backward(d_param._tensor, retain_graph=True)
-        else:
-            param.backward(d_param._tensor, retain_graph=True)
+        d_reinforce = storch.reduce_plates(diff * score, plates=[tensor.name])
+        # Differentiate the control variates of all samples in a single backward pass
+        c_phi_diff = storch.reduce_plates(
+            c_phi_relaxed - c_phi_cond, plates=[tensor.name]
+        )
+        d_c_phi = storch.grad(
+            [c_phi_diff],
+            [logits],
+            create_graph=True,
+            grad_outputs=torch.ones_like(c_phi_diff),
+        )[0]
+        # Compute total derivative with respect to the logits
+        d_logits = d_reinforce + self.eta * d_c_phi
+        # Compute backwards from the logits using its total derivative
+        if isinstance(logits, storch.Tensor):
+            logits = logits._tensor
+        logits.backward(d_logits._tensor.detach(), retain_graph=True)
         # Compute the gradient variance
-        variance = (d_param ** 2).sum(d_param.event_dim_indices())
+        variance = (d_logits ** 2).sum(d_logits.event_dim_indices())
         var_loss = storch.reduce_plates(variance)
 
-        # Minimize variance over the parameters of c_phi and the temperature (should it also minimize eta?)
-        c_phi_params = [self.temperature]
+        # Minimize variance over the parameters of c_phi, the temperature and eta. All gradients are computed in a
+        # single backward pass through the variance.
+        c_phi_params = [self.temperature, self.eta]
         if isinstance(self.c_phi, torch.nn.Module):
             for c_phi_param in self.c_phi.parameters(recurse=True):
                 if c_phi_param.requires_grad:
                     c_phi_params.append(c_phi_param)
 
+        # Retain the graph, as it can be shared with the backward pass of the costs
         d_variance = torch.autograd.grad(
-            [var_loss._tensor], c_phi_params, create_graph=self.rebar
+            [var_loss._tensor], c_phi_params, retain_graph=True
         )
 
         for i in range(len(c_phi_params)):
@@ -320,10 +315,63 @@ class RELAX(GumbelSoftmax):
         return True
 
 
+@deterministic
+def _score(
+    hard_sample: torch.Tensor, logits: torch.Tensor, is_bernoulli: bool
+) -> torch.Tensor:
+    # Derivative of log p(hard_sample) with respect to the logits
+    if is_bernoulli:
+        return hard_sample - logits.sigmoid()
+    return hard_sample - logits.softmax(-1)
+
+
+class REBARPlate(Plate):
+    """
+    Plate of the samples of :class:`REBAR`. It contains `n_samples` hard samples H(z), followed by `n_samples` relaxed
+    samples z and `n_samples` conditional relaxed samples z|H(z). The cost function is evaluated on all of them in a
+    single batch. Only the hard samples are weighted, so the relaxed samples are only used in the estimator.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        n_samples: int,
+        parents: [Plate],
+        device: Optional[torch.device] = None,
+        dtype: Optional[torch.dtype] = None,
+    ):
+        weight = torch.zeros(3 * n_samples, device=device, dtype=dtype)
+        weight[:n_samples] = 1.0 / n_samples
+        super().__init__(name, 3 * n_samples, parents, weight)
+        self.n_samples = n_samples
+
+    def split(self, tensor: storch.Tensor) -> Tuple[storch.Tensor, ...]:
+        """
+        Returns views of the hard, relaxed and conditional samples in `tensor`, without copying.
+        """
+        index = tensor.get_plate_dim_index(self.name)
+        plate = Plate(self.name, self.n_samples, self.parents)
+        plates = [plate if p.name == self.name else p for p in tensor.plates]
+        views = []
+        for i in range(3):
+            if self.n_samples == 1:
+                view = tensor._tensor.select(index, i)
+            else:
+                view = tensor._tensor.narrow(index, i * self.n_samples, self.n_samples)
+            views.append(storch.Tensor(view, [tensor], plates, tensor.name))
+        return tuple(views)
+
+
 class REBARMC(MonteCarlo):
+    """
+    Samples the hard, relaxed and conditional relaxed samples of REBAR in a :class:`REBARPlate` of size
+    `3 * n_samples`.
+    """
+
     def __init__(self, plate_name: str, n_samples: int, temperature):
         super().__init__(plate_name, n_samples)
         self.temperature = temperature
+        self._sample_options = {}
 
     def mc_sample(
         self,
@@ -335,24 +383,27 @@ class REBARMC(MonteCarlo):
         relaxed_sample = rsample_gumbel(
             distr, amt_samples, self.temperature, straight_through=False
         )
-        # TODO: For rebar, what if sample from a sequence, and amt_samples is 1? Then three are sampled (for each one, also hard_sample and cond_sample.)
-        #    That'd still blow up... But I guess it's required?
         # In REBAR, the objective function is evaluated for the Gumbel sample, the conditional Gumbel sample \tilde{z} and the argmax of the Gumbel sample.
         hard_sample = discretize(relaxed_sample, distr)
         cond_sample = conditional_gumbel_rsample(hard_sample, distr, self.temperature)
 
         # return (H(z), z, z|H(z)
-        return torch.cat([hard_sample, relaxed_sample, cond_sample], 0)
+        sample = torch.cat([hard_sample, relaxed_sample, cond_sample], 0)
+        # The weights of the plate are multiplied with the costs, so create them on the device of the samples
+        self._sample_options = {"device": sample.device, "dtype": sample.dtype}
+        return sample
+
+    def create_plate(self, plate_size: int, plates: [Plate]) -> Plate:
+        return REBARPlate(
+            self.plate_name, plate_size // 3, plates, **self._sample_options
+        )
 
-    def plate_weighting(
-        self, tensor: storch.StochasticTensor, plate: storch.Plate
-    ) -> Optional[storch.Tensor]:
-        # if REBAR: only weight over the true samples, put the relaxed samples to weight 0. This also makes sure
-        # that they will not be backpropagated through in the cost backwards pass
-        n = int(tensor.n / 3)
-        weighting = tensor.new_zeros((tensor.n,))
-        weighting[:n] = tensor.new_tensor(1.0 / n)
-        return weighting
+    def on_plate_already_present(self, plate: Plate):
+        raise ValueError(
+            "REBAR cannot be used for samples that already have a plate named "
+            + plate.name
+            + ", as it requires three samples per sample."
+        )
 
 
 class REBAR(RELAX):
@@ -2,6 +2,12 @@ from storch.sampling.method import (
     SamplingMethod,
     MonteCarlo,
 )
-from storch.sampling.expect import Enumerate
+from storch.sampling.expect import Enumerate, LocalEnumerate
 from storch.sampling.swor import SampleWithoutReplacement
 from storch.sampling.unordered_set import UnorderedSet
+from storch.sampling.stratified import (
+    InverseCDFSampling,
+    Stratified,
+    Antithetic,
+    QuasiMonteCarlo,
+)
@@ -1,7 +1,7 @@
 from typing import Optional
 
 from storch.sampling import SamplingMethod
-from torch.distributions import Distribution
+from torch.distributions import Distribution, Independent
 import storch
 import torch
 from storch import Plate
@@ -85,3 +85,120 @@ class Enumerate(SamplingMethod):
                 dim=list(range(tensor.plate_dims, len(log_probs.shape)))
             )
         return log_probs.exp()
+
+
+class LocalEnumerate(SamplingMethod):
+    """
+    Samples `n_samples` joint samples from a factorized discrete distribution, and then enumerates the support of each
+    dimension while keeping the other dimensions at their sampled values. All variations are put in a single plate of
+    size `n_samples * dims * |D|`, so that the function is evaluated on them in a single batched call.
+    The variations are weighted by the probability of the enumerated value, divided by `n_samples * dims`.
+    This averages the local expectations of all dimensions, which is an unbiased estimate of the expectation.
+
+    The dimensions are the elements of the batch shape of the distribution that are not plate dimensions.
+    For distributions with enumerable support that are wrapped in :class:`torch.distributions.Independent`, the
+    reinterpreted dimensions are also enumerated.
+    """
+
+    def __init__(self, plate_name: str, n_samples: int = 1, budget=10000):
+        super().__init__(plate_name)
+        self.n_samples = n_samples
+        self.budget = budget
+
+    def sample(
+        self,
+        distr: Distribution,
+        parents: [storch.Tensor],
+        plates: [Plate],
+        requires_grad: bool,
+    ) -> (storch.StochasticTensor, Plate):
+        base = _base_distribution(distr)
+        with storch.ignore_wrapping():
+            support = base.enumerate_support(expand=False)
+            sample = distr.sample((self.n_samples,))
+        if isinstance(support, storch.Tensor):
+            support = support._tensor
+        if isinstance(sample, storch.Tensor):
+            sample = sample._tensor
+
+        plate_dims = len([p for p in plates if p.n > 1])
+        plate_shape = base.batch_shape[:plate_dims]
+        latent_shape = base.batch_shape[plate_dims:]
+        event_shape = base.event_shape
+        dims = latent_shape.numel()
+        support_size = support.shape[0]
+        plate_size = self.n_samples * dims * support_size
+        if plate_size > self.budget:
+            raise ValueError(
+                "Computing the local expectations on this distribution would exceed the computation budget."
+            )
+
+        # n x dims x |D| x plates x dims x event
+        empty_plates = (1,) * len(plate_shape)
+        sample = sample.reshape(
+            (self.n_samples, 1, 1) + plate_shape + (dims,) + event_shape
+        )
+        support = support.reshape(
+            (1, 1, support_size) + empty_plates + (1,) + event_shape
+        )
+        mask = torch.eye(dims, dtype=torch.bool, device=sample.device).reshape(
+            (1, dims, 1) + empty_plates + (dims,) + (1,) * len(event_shape)
+        )
+        variations = torch.where(mask, support, sample).reshape(
+            (plate_size,) + plate_shape + latent_shape + event_shape
+        )
+
+        plate = Plate(self.plate_name, plate_size, plates.copy())
+        plates.insert(0, plate)
+
+        s_tensor = storch.StochasticTensor(
+            variations.detach(),
+            parents,
+            plates,
+            self.plate_name,
+            plate_size,
+            distr,
+            requires_grad,
+        )
+        return s_tensor, plate
+
+    def local_log_prob(self, tensor: storch.StochasticTensor) -> (storch.Tensor, int):
+        """
+        Returns the log-probability of the enumerated value of the varied dimension for each variation, and the amount
+        of dimensions.
+        """
+        log_probs = _base_distribution(tensor.distribution).log_prob(tensor)
+        plate_dims = log_probs.plate_dims
+        log_probs = log_probs.reshape(log_probs.shape[:plate_dims] + (-1,))
+        dims = log_probs.shape[-1]
+
+        plate = tensor.get_plate(self.plate_name)
+        support_size = plate.n // (self.n_samples * dims)
+        varied = torch.arange(plate.n, device=log_probs.device) // support_size % dims
+        if plate.n == 1:
+            varied = varied[0]
+        varied = storch.Tensor(varied, [], [plate], "varied_dim")
+        return _select_dim(log_probs, varied), dims
+
+    def plate_weighting(
+        self, tensor: storch.StochasticTensor, plate: Plate
+    ) -> Optional[storch.Tensor]:
+        # The gradient through the probabilities is computed in storch.method.LocalExpectation
+        log_probs, dims = self.local_log_prob(tensor)
+        return (log_probs.exp() / (self.n_samples * dims)).detach()
+
+
+def _base_distribution(distr: Distribution) -> Distribution:
+    while isinstance(distr, Independent):
+        distr = distr.base_dist
+    if not distr.has_enumerate_support:
+        raise ValueError(
+            "Can only calculate the local expectations for distributions with enumerable support."
+        )
+    return distr
+
+
+@storch.deterministic
+def _select_dim(log_probs: torch.Tensor, index: torch.Tensor) -> torch.Tensor:
+    # The deterministic wrapper aligns the index with a singleton dimension for the event dimension of log_probs
+    return torch.take_along_dim(log_probs, index, -1).squeeze(-1)
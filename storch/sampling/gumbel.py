@@ -0,0 +1,189 @@
+"""
+Vectorized (truncated) Gumbel sampling routines shared by the sampling methods and gradient estimators.
+All functions operate on plain :class:`torch.Tensor` objects and batch over all leading dimensions, so they can be used
+within a deterministic wrapper with arbitrary plates. The last dimension is the domain dimension.
+See https://arxiv.org/abs/1903.06059 for the top-down construction of (conditional) Gumbel variables.
+"""
+import functools
+import warnings
+from typing import Callable, Tuple
+
+import torch
+from torch.distributions.utils import clamp_probs
+
+
+def _script_lazily(fn: Callable) -> Callable:
+    """
+    Compiles `fn` with TorchScript on its first call, so that the elementwise operations are fused into few kernels.
+    Falls back to the eager implementation if TorchScript is unavailable.
+    """
+    compiled = None
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        nonlocal compiled
+        if compiled is None:
+            try:
+                with warnings.catch_warnings():
+                    # Newer versions of PyTorch deprecate TorchScript
+                    warnings.simplefilter("ignore", FutureWarning)
+                    compiled = torch.jit.script(fn)
+            except Exception:
+                compiled = fn
+        return compiled(*args)
+
+    return wrapper
+
+
+def sample_gumbel(loc: torch.Tensor) -> torch.Tensor:
+    """
+    Samples Gumbel variables with location `loc` and scale 1.
+    """
+    # -log(E) with E standard exponential is standard Gumbel, which avoids taking the log of zero uniform noise
+    return loc - torch.empty_like(loc).exponential_().log()
+
+
+@_script_lazily
+def _gumbel_softmax(
+    logits: torch.Tensor, temperature: torch.Tensor, straight_through: bool
+) -> torch.Tensor:
+    # -log(E) with E standard exponential is standard Gumbel, which avoids clamping the uniform noise
+    gumbels = logits - torch.empty_like(logits).exponential_().log()
+    soft = torch.softmax(gumbels / temperature, -1)
+    if straight_through:
+        hard = torch.zeros_like(soft).scatter_(-1, soft.argmax(-1, keepdim=True), 1.0)
+        return hard - soft.detach() + soft
+    return soft
+
+
+@_script_lazily
+def _gumbel_sigmoid(
+    logits: torch.Tensor, temperature: torch.Tensor, straight_through: bool
+) -> torch.Tensor:
+    # The difference of two standard Gumbel variables is standard logistic
+    noise = (
+        torch.empty_like(logits).exponential_().log()
+        - torch.empty_like(logits).exponential_().log()
+    )
+    soft = torch.sigmoid((logits + noise) / temperature)
+    if straight_through:
+        hard = (soft > 0.5).to(soft.dtype)
+        return hard - soft.detach() + soft
+    return soft
+
+
+def gumbel_softmax(
+    logits: torch.Tensor, temperature, straight_through: bool = False
+) -> torch.Tensor:
+    """
+    Samples from the Gumbel-softmax (concrete) distribution with unnormalized log probabilities `logits` over the last
+    dimension. Equivalent to the rsample of :class:`torch.distributions.RelaxedOneHotCategorical`, but without
+    constructing a distribution.
+    If `straight_through` is True, the forward value is the one-hot argmax, while the gradients are those of the
+    relaxed sample. See https://arxiv.org/abs/1611.01144
+    """
+    if not isinstance(temperature, torch.Tensor):
+        temperature = logits.new_tensor(temperature)
+    return _gumbel_softmax(logits, temperature, straight_through)
+
+
+def gumbel_sigmoid(
+    logits: torch.Tensor, temperature, straight_through: bool = False
+) -> torch.Tensor:
+    """
+    Samples from the binary concrete distribution with logits `logits`. Equivalent to the rsample of
+    :class:`torch.distributions.RelaxedBernoulli`, but without constructing a distribution.
+    If `straight_through` is True, the forward value is the rounded sample, while the gradients are those of the
+    relaxed sample. See https://arxiv.org/abs/1611.00712
+    """
+    if not isinstance(temperature, torch.Tensor):
+        temperature = logits.new_tensor(temperature)
+    return _gumbel_sigmoid(logits, temperature, straight_through)
+
+
+def truncated_gumbel(loc: torch.Tensor, upper: torch.Tensor) -> torch.Tensor:
+    """
+    Samples Gumbel variables with location `loc` truncated to be at most `upper` through the inverse CDF.
+    """
+    # The CDF of the truncated Gumbel is exp(exp(loc - upper) - exp(loc - g)).
+    # Inverting gives g = loc - log(exp(loc - upper) + E), where E = -log(U) is standard exponential.
+    log_exp_noise = torch.empty_like(loc).exponential_().log()
+    return loc - torch.logaddexp(loc - upper, log_exp_noise)
+
+
+@_script_lazily
+def _cond_gumbel_sample(loc: torch.Tensor, max_value: torch.Tensor) -> torch.Tensor:
+    # Sample ... x |D| Gumbel variables: G = phi - log(E), with E standard exponential
+    G = loc - torch.empty_like(loc).exponential_().log()
+
+    # Condition the Gumbel samples on the maximum being max_value
+    # ... x 1
+    Z = G.amax(dim=-1, keepdim=True)
+    T = max_value
+    # log1mexp of G - Z, which is never positive. Inlined so that TorchScript can fuse the elementwise ops.
+    a = G - Z
+    vi = (
+        T
+        - G
+        + torch.where(a > -0.693, torch.log(-a.expm1()), torch.log1p(-a.exp()))
+    )
+    # ... x |D|. Equal to T - softplus(vi), computed in a numerically stable way.
+    return T - vi.clamp(min=0.0) - torch.log1p(torch.exp(-vi.abs()))
+
+
+def cond_gumbel_sample(loc: torch.Tensor, max_value: torch.Tensor) -> torch.Tensor:
+    """
+    Samples Gumbel variables with location `loc` conditioned on their maximum over the last dimension being equal
+    to `max_value`. `max_value` should be broadcastable to `loc`, usually by having a singleton last dimension.
+    See Appendix B.3 of https://arxiv.org/abs/1903.06059
+    """
+    if not isinstance(max_value, torch.Tensor):
+        max_value = loc.new_tensor(max_value)
+    return _cond_gumbel_sample(loc, max_value)
+
+
+def gumbel_given_argmax(logits: torch.Tensor, index: torch.Tensor) -> torch.Tensor:
+    """
+    Samples Gumbel variables with location `logits` conditioned on the argmax over the last dimension being `index`.
+    This is the conditional sample z ~ p(z|b) used in REBAR and RELAX https://arxiv.org/abs/1711.00123
+
+    Args:
+        logits: ... x |D| unnormalized log probabilities
+        index: ... tensor of indices of the maximum
+    """
+    logits, index = torch.broadcast_tensors(logits, index.unsqueeze(-1))
+    index = index[..., :1]
+    # The maximum is Gumbel distributed with the logsumexp of the logits as location
+    # ... x 1
+    top = sample_gumbel(logits.logsumexp(dim=-1, keepdim=True))
+    # The other Gumbels are truncated at the maximum
+    return truncated_gumbel(logits, top).scatter(-1, index, top)
+
+
+def logistic_given_sample(
+    logits: torch.Tensor, hard_sample: torch.Tensor
+) -> torch.Tensor:
+    """
+    Samples logistic variables with location `logits` conditioned on their sign, given by the Bernoulli `hard_sample`.
+    This is the Bernoulli variant of :func:`gumbel_given_argmax`. See Appendix B of https://arxiv.org/abs/1711.00123
+    """
+    probs, hard_sample = torch.broadcast_tensors(torch.sigmoid(logits), hard_sample)
+    v = torch.rand_like(probs)
+    # If b = 1, v' ~ U(1 - p, 1). Otherwise, v' ~ U(0, 1 - p)
+    v_prime = clamp_probs(
+        torch.where(hard_sample > 0.5, 1 - probs + v * probs, v * (1 - probs))
+    )
+    return logits + v_prime.log() - (-v_prime).log1p()
+
+
+def gumbel_top_k(
+    logits: torch.Tensor, k: int, dim: int = -1
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Samples k elements without replacement using the Gumbel-top-k trick https://arxiv.org/abs/1903.06059
+
+    Returns:
+        The k largest perturbed logits and their indices along `dim`.
+    """
+    k = min(k, logits.shape[dim])
+    return torch.topk(sample_gumbel(logits), k, dim=dim)
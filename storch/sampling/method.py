@@ -2,7 +2,7 @@ from __future__ import annotations
 from typing import Optional, Callable, List
 
 import torch
-from torch.distributions import Distribution
+from torch.distributions import Distribution, OneHotCategorical
 from abc import ABC, abstractmethod
 import storch
 from storch import Plate
@@ -89,11 +89,33 @@ class MonteCarlo(SamplingMethod):
     Monte Carlo sampling methods use simple sampling methods that take n independent samples.
     Unlike complex ancestral sampling methods such as SampleWithoutReplacementMethod, the sampling behaviour is not dependent
     on earlier samples in the stochastic computation graph (but the distributions are!).
+
+    Args:
+        plate_name (str): The name of the plate of the samples.
+        n_samples (int): The amount of samples to take.
+        one_hot_indices (bool): If True, samples from :class:`~torch.distributions.OneHotCategorical` are stored as
+            the indices of the ones in a :class:`storch.IndexedOneHotTensor`. This cannot be used with gradient
+            estimation methods that change how samples are drawn, such as reparameterization.
     """
 
-    def __init__(self, plate_name: str, n_samples: int = 1):
+    def __init__(
+        self, plate_name: str, n_samples: int = 1, one_hot_indices: bool = False
+    ):
         super().__init__(plate_name)
         self.n_samples = n_samples
+        self.one_hot_indices = one_hot_indices
+
+    def set_mc_sample(
+        self,
+        new_sample_func: Callable[
+            [Distribution, [storch.Tensor], [Plate], int], torch.Tensor
+        ],
+    ) -> SamplingMethod:
+        if self.one_hot_indices:
+            raise ValueError(
+                "Cannot store the samples as indices when the sampling function is overridden."
+            )
+        return super().set_mc_sample(new_sample_func)
 
     def sample(
         self,
@@ -108,20 +130,62 @@ class MonteCarlo(SamplingMethod):
                 plate = _plate
                 break
         n_samples = 1 if plate else self.n_samples
+        tracer = storch.wrappers._tracer
+        if tracer is not None:
+            # Record the distribution before sampling, which can cache derived parameters
+            distr_template = tracer.distribution_template(distr, plates)
+            sample_plates = plates.copy()
+        indexed = self.one_hot_indices and isinstance(distr, OneHotCategorical)
         with storch.ignore_wrapping():
-            tensor = self.mc_sample(distr, parents, plates, n_samples)
+            if indexed:
+                tensor = self.sample_indices(distr, parents, plates, n_samples)
+            else:
+                tensor = self.mc_sample(distr, parents, plates, n_samples)
         plate_size = tensor.shape[0]
-        if tensor.shape[0] == 1:
+        squeeze = tensor.shape[0] == 1
+        if squeeze:
             tensor = tensor.squeeze(0)
 
         if not plate:
-            plate = Plate(self.plate_name, plate_size, plates.copy())
+            plate = self.create_plate(plate_size, plates.copy())
             plates.insert(0, plate)
 
         if isinstance(tensor, storch.Tensor):
             tensor = tensor._tensor
 
-        s_tensor = storch.StochasticTensor(
-            tensor, parents, plates, self.plate_name, plate_size, distr, requires_grad,
-        )
+        if indexed:
+            s_tensor = storch.IndexedOneHotTensor(
+                tensor,
+                parents,
+                plates,
+                self.plate_name,
+                plate_size,
+                distr,
+                requires_grad,
+                distr.event_shape[-1],
+                distr.probs.dtype,
+            )
+        else:
+            s_tensor = storch.StochasticTensor(
+                tensor, parents, plates, self.plate_name, plate_size, distr, requires_grad,
+            )
+        if tracer is not None:
+            tracer.record_sample(
+                self, distr_template, sample_plates, n_samples, squeeze, s_tensor
+            )
         return s_tensor, plate
+
+    def sample_indices(
+        self,
+        distr: OneHotCategorical,
+        parents: [storch.Tensor],
+        plates: [Plate],
+        amt_samples: int,
+    ) -> torch.Tensor:
+        """
+        Samples the indices of the ones of one-hot samples, used if `one_hot_indices` is True.
+        """
+        return distr._categorical.sample((amt_samples,))
+
+    def create_plate(self, plate_size: int, plates: [Plate]) -> Plate:
+        return Plate(self.plate_name, plate_size, plates)
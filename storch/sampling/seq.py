@@ -6,6 +6,8 @@ from typing import Union, List, Optional, Tuple
 
 from storch.typing import AnyTensor
 from storch.sampling.method import SamplingMethod
+from storch.unique import UniquePlate
+from storch.util import to_accumulation_dtype
 from torch.distributions import Distribution
 import storch
 import torch
@@ -37,7 +39,8 @@ class AncestralPlate(storch.Plate):
         self._override_equality = False
 
     def __eq__(self, other):
-        if self._override_equality:
+        # The override is checked on both plates, as the order of the operands depends on the caller
+        if self._override_equality or getattr(other, "_override_equality", False):
             return other.name == self.name
         return (
             super().__eq__(other)
@@ -123,8 +126,6 @@ class SequenceDecoding(SamplingMethod):
     Examples: Simple ancestral sampling with replacement, beam search, Stochastic beam search (sampling without replacement)
     """
 
-    EPS = 1e-8
-
     def __init__(self, plate_name: str, k: int, eos: None):
         super().__init__(plate_name)
         self.k = k
@@ -310,10 +311,21 @@ class SequenceDecoding(SamplingMethod):
         return torch.sum(self.finished_samples, -1)
 
     def get_unique_seqs(self):
-        # TODO: Very experimental code
         seq_dim = self.seq[0].plate_dims
         cat_seq = torch.cat(self.seq, dim=seq_dim)
-        return storch.unique(cat_seq, event_dim=0)
+        return storch.unique(cat_seq)
+
+    def get_prefix_trie(self, shared_plates: Optional[List[str]] = None) -> PrefixTrie:
+        """
+        Returns a :class:`PrefixTrie` of the sampled sequences so far.
+
+        Args:
+            shared_plates: Names of the plates over which sequences can share prefixes. Defaults to the plate of this
+                sampling method.
+        """
+        if shared_plates is None:
+            shared_plates = [self.plate_name]
+        return PrefixTrie(self.seq, shared_plates)
 
     def all_finished(self) -> bool:
         t = self.get_amt_finished().eq(self.k)
@@ -323,6 +335,173 @@ class SequenceDecoding(SamplingMethod):
         return t.all().bool()
 
 
+class PrefixTrie:
+    """
+    Prefix trie of sampled sequences. Each node at depth `t` represents a distinct prefix of length `t + 1`. Decoders can
+    be evaluated once for every node instead of once for every sampled sequence, and costs once for every distinct
+    sequence. This saves computation if many sequences share prefixes, as is common in beam search and sampling
+    without replacement.
+
+    The nodes at depth `t` have the :class:`UniquePlate` returned by :meth:`plate`, which replaces all
+    plates of the sequences. Use :func:`storch.undo_unique` to retrieve the results for each sequence.
+    Prefixes are only shared over the plates in `shared_plates`. For the other plates, such as a minibatch plate,
+    each node belongs to a single element of that plate. Use :meth:`select` to retrieve the inputs of the decoder
+    that are indexed by these plates.
+
+    A recurrent decoder can, for example, be evaluated as follows::
+
+        trie = sampling_method.get_prefix_trie()
+        h = trie.select(0, h_0)
+        for t in range(trie.depth):
+            if t > 0:
+                h = trie.gather_parents(t, h)
+            h = cell(trie.tokens(t), h)
+        # Results for each sampled sequence
+        h = storch.undo_unique(h)
+
+    Args:
+        seq: The sampled variables in the sequence, which all have the same plates.
+        shared_plates: Names of the plates over which sequences can share prefixes.
+    """
+
+    def __init__(self, seq: List[storch.Tensor], shared_plates: List[str]):
+        self.seq = seq
+        # Align all variables and flatten their plates. N x ... for each variable
+        unwrapped, _, _, plates = storch.wrappers._prepare_args(
+            seq, {}, flatten_plates=True
+        )
+        self.seq_plates = [plate for plate in plates if plate.n > 1]
+        self.separate_plates = [
+            plate for plate in self.seq_plates if plate.name not in shared_plates
+        ]
+        self.depth = len(seq)
+
+        n_seqs = unwrapped[0].shape[0]
+        # The index of each sequence into the flattened separate plates
+        group_index = torch.zeros(n_seqs, dtype=torch.long)
+        for i, plate in enumerate(self.seq_plates):
+            stride = 1
+            for later_plate in self.seq_plates[i + 1 :]:
+                stride *= later_plate.n
+            if plate.name not in shared_plates:
+                group_index = group_index * plate.n + (
+                    torch.arange(n_seqs) // stride % plate.n
+                )
+        device = unwrapped[0].device
+        group_index = group_index.to(device)
+
+        # For each depth, the node index of each sequence
+        self.node_index: List[torch.Tensor] = []
+        # For each depth, the index of the parent node of each node
+        self.parents: List[torch.Tensor] = []
+        # For each depth, the last token of the prefix of each node
+        self._tokens: List[torch.Tensor] = []
+        # For each depth, the index into the flattened separate plates of each node
+        self._groups: List[torch.Tensor] = []
+        self._plates: List[UniquePlate] = []
+        prev_index = group_index
+        for t, variable in enumerate(unwrapped):
+            flat_variable = variable.reshape(n_seqs, -1)
+            token_values, token_index = torch.unique(
+                flat_variable, return_inverse=True, dim=0
+            )
+            n_tokens = token_values.shape[0]
+            # A node is identified by its parent node and its last token
+            nodes, node_index = torch.unique(
+                prev_index * n_tokens + token_index, return_inverse=True
+            )
+            parents = nodes // n_tokens
+            self.parents.append(parents)
+            self._tokens.append(
+                token_values[nodes % n_tokens].reshape(
+                    (nodes.shape[0],) + variable.shape[1:]
+                )
+            )
+            self._groups.append(parents if t == 0 else self._groups[-1][parents])
+            self.node_index.append(node_index)
+            self._plates.append(
+                UniquePlate(
+                    "prefix_" + str(t), nodes.shape[0], self.seq_plates, node_index
+                )
+            )
+            prev_index = node_index
+
+    def n_nodes(self, t: int) -> int:
+        """
+        Returns the amount of distinct prefixes of length `t + 1`.
+        """
+        return self._plates[t].n
+
+    def plate(self, t: int) -> UniquePlate:
+        """
+        Returns the plate of the nodes at depth `t`.
+        """
+        return self._plates[t]
+
+    def tokens(self, t: int) -> storch.Tensor:
+        """
+        Returns the last token of the prefix of each node at depth `t`, ie the value of the `t`-th variable.
+        """
+        return storch.Tensor(
+            self._tokens[t], [self.seq[t]], [self._plates[t]], "prefix_tokens_" + str(t)
+        )
+
+    def prefixes(self, t: int) -> storch.Tensor:
+        """
+        Returns the prefixes of the nodes at depth `t`, with the variables stacked in the first event dimension.
+        """
+        node = torch.arange(self.n_nodes(t), device=self._tokens[t].device)
+        tokens = []
+        for s in range(t, -1, -1):
+            tokens.append(self._tokens[s][node])
+            node = self.parents[s][node]
+        return storch.Tensor(
+            torch.stack(tokens[::-1], 1),
+            self.seq[: t + 1],
+            [self._plates[t]],
+            "prefixes_" + str(t),
+        )
+
+    def sequences(self) -> storch.Tensor:
+        """
+        Returns the distinct sampled sequences. Costs can be computed on these and mapped back to the sampled
+        sequences using :func:`storch.undo_unique`.
+        """
+        return self.prefixes(self.depth - 1)
+
+    def gather_parents(self, t: int, tensor: storch.Tensor) -> storch.Tensor:
+        """
+        Selects the values of the parent of each node at depth `t` from a tensor with the plate of depth `t - 1`,
+        for example the hidden state of a recurrent decoder.
+        """
+        plate = self._plates[t - 1]
+        plate_idx = tensor.get_plate_dim_index(plate.name)
+        selected = torch.index_select(tensor._tensor, plate_idx, self.parents[t])
+        plates = [self._plates[t] if p.name == plate.name else p for p in tensor.plates]
+        return storch.Tensor(selected, [tensor], plates, tensor.name)
+
+    def select(self, t: int, tensor: storch.Tensor) -> storch.Tensor:
+        """
+        Selects the values of a tensor for each node at depth `t`. The tensor can only have the plates of the
+        sequences over which prefixes are not shared, for example the encoded input of a sequence-to-sequence model.
+        """
+        if not isinstance(tensor, storch.Tensor):
+            tensor = storch.Tensor(tensor, [], [])
+        for plate in tensor.multi_dim_plates():
+            if plate not in self.separate_plates:
+                raise ValueError(
+                    "Cannot select the tensor for the prefixes as it has plate "
+                    + plate.name
+                    + ", over which prefixes are shared or that is not in the sequences."
+                )
+        flat_tensor = storch.wrappers._unsqueeze_and_unwrap(
+            tensor, self.separate_plates, True, False, True, True, 0
+        )
+        return storch.Tensor(
+            flat_tensor[self._groups[t]], [tensor], [self._plates[t]], tensor.name
+        )
+
+
 class MCDecoder(SequenceDecoding):
     def decode(
         self,
@@ -345,7 +524,7 @@ class MCDecoder(SequenceDecoding):
         else:
             sample = self.mc_sample(distribution, parents, orig_distr_plates, self.k)
 
-        s_log_probs = distribution.log_prob(sample)
+        s_log_probs = to_accumulation_dtype(distribution.log_prob(sample))
         if joint_log_probs:
             joint_log_probs += s_log_probs
         else:
@@ -417,7 +596,8 @@ class IterDecoding(SequenceDecoding):
             support_non_expanded: torch.Tensor = distr.enumerate_support(expand=False)
             # Compute the log-probability of the different events
             # |D_yv| x distr_plate[0] x ... k? ... x distr_plate[n-1] x events
-            d_log_probs = distr.log_prob(support_non_expanded)
+            # The joint log probabilities are accumulated in float32 for reduced precision distributions.
+            d_log_probs = to_accumulation_dtype(distr.log_prob(support_non_expanded))
 
             # Note: Use amt_orig_distr_plates here because it might include k? dimension. amt_distr_plates filters this one.
             # distr_plate[0] x ... k? ... x distr_plate[n-1] x |D_yv| x events
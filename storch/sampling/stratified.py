@@ -0,0 +1,232 @@
+"""
+Sampling methods that reduce the variance of Monte Carlo estimates by correlating the uniform noise of the samples.
+The samples are computed from the uniform noise through the inverse CDF of the distribution (or a transform of base
+noise, for multivariate normals). Each sample is still marginally distributed according to the distribution, so the
+samples are weighted equally. Note that the samples are not independent, so estimators that use the other samples,
+such as the batch average baseline, can be biased.
+"""
+
+from abc import abstractmethod
+from typing import Callable
+
+import torch
+from torch.distributions import (
+    Bernoulli,
+    Categorical,
+    Distribution,
+    Independent,
+    MultivariateNormal,
+    OneHotCategorical,
+)
+from torch.distributions.utils import clamp_probs
+
+import storch
+from storch import Plate
+from storch.sampling.method import MonteCarlo
+from storch.util import get_distr_parameters
+
+
+def _is_discrete(distr: Distribution) -> bool:
+    if isinstance(distr, Independent):
+        return _is_discrete(distr.base_dist)
+    return isinstance(distr, (Bernoulli, Categorical, OneHotCategorical))
+
+
+def _noise_shape(distr: Distribution) -> torch.Size:
+    """
+    Returns the shape of the uniform noise required to sample once from the distribution.
+    """
+    if isinstance(distr, (Categorical, OneHotCategorical)):
+        return distr.batch_shape
+    return distr.batch_shape + distr.event_shape
+
+
+def inverse_cdf(distr: Distribution, u: torch.Tensor) -> torch.Tensor:
+    """
+    Transforms uniform noise into samples of the distribution through its inverse CDF. The samples of continuous
+    distributions are differentiable with respect to the parameters of the distribution.
+
+    Args:
+        distr: The distribution to sample from.
+        u: Uniform noise of shape `(n,) + batch_shape (+ event_shape)`. For (one-hot) categorical distributions,
+            the event shape is excluded.
+
+    Returns:
+        torch.Tensor: n samples from the distribution.
+    """
+    if isinstance(distr, Independent):
+        return inverse_cdf(distr.base_dist, u)
+    u = clamp_probs(u)
+    if isinstance(distr, OneHotCategorical):
+        index = inverse_cdf(distr._categorical, u)
+        return torch.nn.functional.one_hot(index, distr.event_shape[0]).to(
+            distr.probs.dtype
+        )
+    if isinstance(distr, Categorical):
+        cdf = distr.probs.cumsum(-1)
+        index = (u.unsqueeze(-1) > cdf).sum(-1)
+        # Guard against numerical errors in the last element of the CDF
+        return index.clamp(max=distr.probs.shape[-1] - 1)
+    if isinstance(distr, Bernoulli):
+        return (u > 1 - distr.probs).to(distr.probs.dtype)
+    if isinstance(distr, MultivariateNormal):
+        eps = torch.special.ndtri(u)
+        return distr.loc + (
+            distr._unbroadcasted_scale_tril @ eps.unsqueeze(-1)
+        ).squeeze(-1)
+    try:
+        return distr.icdf(u)
+    except NotImplementedError:
+        raise ValueError(
+            "Cannot sample from "
+            + type(distr).__name__
+            + " through the inverse CDF, as it is not implemented."
+        )
+
+
+class InverseCDFSampling(MonteCarlo):
+    """
+    Base class for Monte Carlo sampling methods that sample through the inverse CDF of correlated uniform noise.
+    Subclasses implement :meth:`uniform_noise`.
+
+    If used with :class:`storch.method.Reparameterization`, the samples of continuous distributions are
+    reparameterized. Otherwise, the samples are detached. Other methods that override the sampling function, such as
+    :class:`storch.method.GumbelSoftmax`, are not supported.
+    """
+
+    def __init__(self, plate_name: str, n_samples: int = 1):
+        super().__init__(plate_name, n_samples)
+        self.reparameterized = False
+
+    def set_mc_sample(
+        self,
+        new_sample_func: Callable,
+    ):
+        # The samples are always computed through the inverse CDF, which is differentiable for continuous
+        # distributions, so it can replace reparameterized sampling. Other sampling functions change the
+        # distribution of the samples, which cannot be combined with the correlated noise.
+        if (
+            getattr(new_sample_func, "__func__", None)
+            is not storch.method.Reparameterization.reparam_sample
+        ):
+            raise ValueError(
+                "Cannot override the sampling function of "
+                + type(self).__name__
+                + ". Only reparameterization is supported."
+            )
+        self.reparameterized = True
+        return self
+
+    def sample(
+        self,
+        distr: Distribution,
+        parents: [storch.Tensor],
+        plates: [Plate],
+        requires_grad: bool,
+    ) -> (storch.StochasticTensor, Plate):
+        if self.reparameterized and _is_discrete(distr):
+            raise ValueError(
+                "Cannot reparameterize samples from discrete distributions through the inverse CDF."
+            )
+        return super().sample(distr, parents, plates, requires_grad)
+
+    def mc_sample(
+        self,
+        distr: Distribution,
+        parents,
+        plates,
+        amt_samples: int,
+    ) -> torch.Tensor:
+        param = next(iter(get_distr_parameters(distr, False).values()))
+        u = self.uniform_noise(
+            amt_samples, _noise_shape(distr), param.device, param.dtype
+        )
+        sample = inverse_cdf(distr, u)
+        if not self.reparameterized:
+            sample = sample.detach()
+        return sample
+
+    @abstractmethod
+    def uniform_noise(
+        self,
+        amt_samples: int,
+        shape: torch.Size,
+        device: torch.device,
+        dtype: torch.dtype,
+    ) -> torch.Tensor:
+        """
+        Returns uniform noise of shape `(amt_samples,) + shape`. Each element should be marginally uniformly
+        distributed on [0, 1).
+        """
+        pass
+
+
+class Stratified(InverseCDFSampling):
+    """
+    Stratified sampling. The unit interval is divided into `n_samples` strata of equal size, and each sample is drawn
+    uniformly from a different stratum. The strata are randomly permuted for every independent dimension, which makes
+    this Latin hypercube sampling for multiple dimensions. For discrete distributions, stratification guarantees that
+    every event is sampled in proportion to its probability, up to rounding.
+    """
+
+    def uniform_noise(
+        self,
+        amt_samples: int,
+        shape: torch.Size,
+        device: torch.device,
+        dtype: torch.dtype,
+    ) -> torch.Tensor:
+        noise_shape = (amt_samples,) + shape
+        strata = torch.argsort(torch.rand(noise_shape, device=device), dim=0)
+        return (
+            strata.to(dtype) + torch.rand(noise_shape, device=device, dtype=dtype)
+        ) / amt_samples
+
+
+class Antithetic(InverseCDFSampling):
+    """
+    Antithetic sampling. The second half of the samples uses the noise `1 - u` of the first half. This reduces
+    variance for functions that are monotonic in the samples. `n_samples` should be even.
+    """
+
+    def __init__(self, plate_name: str, n_samples: int = 2):
+        if n_samples % 2 != 0:
+            raise ValueError("Antithetic sampling requires an even amount of samples.")
+        super().__init__(plate_name, n_samples)
+
+    def uniform_noise(
+        self,
+        amt_samples: int,
+        shape: torch.Size,
+        device: torch.device,
+        dtype: torch.dtype,
+    ) -> torch.Tensor:
+        if amt_samples == 1:
+            return torch.rand((1,) + shape, device=device, dtype=dtype)
+        u = torch.rand((amt_samples // 2,) + shape, device=device, dtype=dtype)
+        return torch.cat([u, 1 - u])
+
+
+class QuasiMonteCarlo(InverseCDFSampling):
+    """
+    Randomized quasi-Monte Carlo sampling using scrambled Sobol sequences. The Sobol points cover the space more evenly
+    than independent samples, while scrambling keeps the estimates unbiased. Works best with a power of two as
+    `n_samples`. The amount of independent dimensions of the distribution should be at most 21201.
+    """
+
+    def uniform_noise(
+        self,
+        amt_samples: int,
+        shape: torch.Size,
+        device: torch.device,
+        dtype: torch.dtype,
+    ) -> torch.Tensor:
+        dimension = shape.numel()
+        if dimension > torch.quasirandom.SobolEngine.MAXDIM:
+            raise ValueError(
+                "The distribution has too many dimensions for quasi-Monte Carlo sampling."
+            )
+        seed = int(torch.randint(2**31, ()))
+        engine = torch.quasirandom.SobolEngine(dimension, scramble=True, seed=seed)
+        u = engine.draw(amt_samples, dtype=dtype)
+        return u.reshape((amt_samples,) + shape).to(device)
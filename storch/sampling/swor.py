@@ -3,10 +3,13 @@ from typing import Optional, Union, List, Callable, Tuple
 
 import storch
 import torch
-from torch.distributions import Distribution, Gumbel
+from torch.distributions import Distribution
 import itertools
+import math
+from storch.sampling import gumbel
 from storch.sampling.method import SamplingMethod
 from storch.sampling.seq import IterDecoding, AncestralPlate, right_expand_as
+from storch.util import to_accumulation_dtype
 
 
 class SampleWithoutReplacement(IterDecoding):
@@ -16,8 +19,6 @@ class SampleWithoutReplacement(IterDecoding):
     REINFORCE without replacement https://openreview.net/forum?id=r1lgTGL5DE
     """
 
-    EPS = 1e-8
-
     def __init__(self, plate_name: str, k: int, biased_iw: bool = False, eos=None):
         super().__init__(plate_name, k, eos)
         if k < 2:
@@ -184,18 +185,17 @@ class SampleWithoutReplacement(IterDecoding):
 
     def compute_iw(self, plate: AncestralPlate, biased: bool):
         # Compute importance weights. The kth sample has 0 weight, and is only used to compute the importance weights
-        q = (
-            1
-            - (
-                -(
-                    plate.log_probs
-                    - plate.perturb_log_probs._tensor[..., self.k - 1].unsqueeze(-1)
-                ).exp()
-            ).exp()
-        ).detach()
-        iw = plate.log_probs.exp() / (q + self.EPS)
+        log_probs = to_accumulation_dtype(plate.log_probs)
+        kappa = to_accumulation_dtype(
+            plate.perturb_log_probs._tensor[..., self.k - 1].unsqueeze(-1)
+        )
+        # The inclusion probability is q = P(g > kappa) = 1 - exp(-exp(log_probs - kappa)) for a Gumbel g with
+        # location log_probs. Divide by it in log-space, so that small inclusion probabilities do not underflow.
+        log_q = gumbel_log_survival(kappa - log_probs).detach()
+        log_iw = log_probs - log_q
         # Set the weight of the kth sample (kappa) to 0.
-        iw[..., self.k - 1] = 0.0
+        log_iw[..., self.k - 1] = -float("inf")
+        iw = log_iw.exp()
         if biased:
             WS = storch.sum(iw, plate).detach()
             return iw / WS
@@ -223,24 +223,40 @@ class SampleWithoutReplacement(IterDecoding):
 def log1mexp(a: torch.Tensor) -> torch.Tensor:
     """See appendix A of http://jmlr.org/papers/v21/19-985.html.
     Numerically stable implementation of log(1-exp(a))"""
-    c = -0.693
+    c = -math.log(2)
     a1 = -a.abs()
-    return torch.where(a1 > c, torch.log(-a1.expm1()), torch.log1p(-a1.exp()))
+    # Clamp the input of the unused branch, as log1p(-1) would give NaN gradients
+    return torch.where(
+        a1 > c, torch.log(-a1.expm1()), torch.log1p(-a1.clamp(max=c).exp())
+    )
+
+
+def gumbel_log_survival(x: torch.Tensor) -> torch.Tensor:
+    """
+    Numerically stable implementation of log P(g > x) = log(1 - exp(-exp(-x))) for a standard Gumbel variable g.
+    For large x, it uses the series expansion in y = exp(-x), see
+    https://www.wolframalpha.com/input/?i=log%281+-+exp%28-y%29%29. The cut-off is chosen such that the error of
+    the expansion, O(y^6), is below the precision of the dtype of `x`.
+    """
+    y = torch.exp(-x)
+    # The first omitted term of the expansion is y^6 / 181440
+    cut_off = -(math.log(torch.finfo(x.dtype).eps) + math.log(181440)) / 6
+    # Clamp y in the unused branch to avoid overflow
+    y_small = y.clamp(max=1.0)
+    return torch.where(
+        x >= cut_off,
+        -x - y_small / 2 + y_small ** 2 / 24 - y_small ** 4 / 2880,
+        log1mexp(y),
+    )
 
 
 @storch.deterministic
 def cond_gumbel_sample(all_joint_log_probs, perturbed_log_probs) -> torch.Tensor:
-    # Sample plates x k? x |D_yv| Gumbel variables
-    gumbel_d = Gumbel(loc=all_joint_log_probs, scale=1.0)
-    G_yv = gumbel_d.rsample()
-
-    # Condition the Gumbel samples on the maximum of previous samples
-    # plates x k
-    Z = G_yv.max(dim=-1)[0]
-    T = perturbed_log_probs
-    vi = T - G_yv + log1mexp(G_yv - Z.unsqueeze(-1))
-    # plates (x k) x |D_yv|
-    return T - vi.relu() - torch.nn.Softplus()(-vi.abs())
+    """
+    Samples Gumbel variables with locations `all_joint_log_probs` conditioned on their maximum being equal to
+    `perturbed_log_probs`. See Appendix B.3 of https://arxiv.org/abs/1903.06059
+    """
+    return gumbel.cond_gumbel_sample(all_joint_log_probs, perturbed_log_probs)
 
 
 class SumAndSample(SampleWithoutReplacement):
@@ -1,6 +1,11 @@
 from typing import Optional
 
-from storch.sampling.swor import log1mexp, SampleWithoutReplacement
+from storch.sampling.swor import (
+    log1mexp,
+    gumbel_log_survival,
+    SampleWithoutReplacement,
+)
+from storch.util import to_accumulation_dtype
 import storch
 import torch
 
@@ -30,7 +35,8 @@ class UnorderedSet(SampleWithoutReplacement):
         # Computes p(s) * R(S^k, s), or the probability of the sample times the leave-one-out ratio.
         # For details, see https://openreview.net/pdf?id=rklEj2EFvB
         # Code based on https://github.com/wouterkool/estimating-gradients-without-replacement/blob/master/bernoulli/gumbel.py
-        log_probs = plate.log_probs.detach()
+        # Compute the weighting in float32 if the log probabilities have reduced precision
+        log_probs = to_accumulation_dtype(plate.log_probs.detach())
         # print("--------------------")
 
         # Compute integration points for the trapezoid rule: v should range from 0 to 1, where both v=0 and v=1 give a value of 0.
@@ -52,14 +58,9 @@ class UnorderedSet(SampleWithoutReplacement):
             + torch.log(-log_v)[log_probs.plate_dims * (None,) + (slice(None),)]
         )
 
-        # Gumbel log survival: log P(g > g_bound) = log(1 - exp(-exp(-g_bound))) for standard gumbel g
-        # If g_bound >= 10, use the series expansion for stability with error O((e^-10)^6) (=8.7E-27)
-        # See https://www.wolframalpha.com/input/?i=log%281+-+exp%28-y%29%29
-        y = torch.exp(g_bound)
+        # log(1 - exp(-exp(g_bound))) is the Gumbel log survival log P(g > -g_bound) for standard gumbel g
         # plates_w_k x N
-        terms = torch.where(
-            g_bound >= 10, -g_bound - y / 2 + y ** 2 / 24 - y ** 4 / 2880, log1mexp(y)
-        )
+        terms = gumbel_log_survival(-g_bound)
         # print("terms", terms._tensor[0])
 
         # Compute integrands (without subtracting the special value s)
@@ -1,2 +1,3 @@
-# from .blackbox import BlackboxTensor
-# from .mdp import MDP
\ No newline at end of file
+from .blackbox import BlackboxTensor, blackbox_cost
+
+# from .mdp import MDP
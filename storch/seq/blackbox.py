@@ -1,9 +1,160 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import wraps
+from typing import Any, Callable, Optional
+
+import storch
+import torch
 from storch import Tensor
 
 
 class BlackboxTensor(Tensor):
-    def __init__(self, tensor, parents, plates):
-        super().__init__(tensor, parents, plates)
-        self.tensor = tensor
-        self.parents = parents
-        self.batch_links = plates
+    """
+    A :class:`storch.Tensor` computed by a black-box function, for example a simulator or a reward model. There is no
+    differentiable path from its parents to a black-box tensor.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, tensor, parents, plates, name: Optional[str] = None):
+        super().__init__(tensor, parents, plates, name)
+
+
+def _chunk(a: Any, unwrapped: Any, dim: int, start: int, length: int, copy: bool):
+    """
+    Selects the elements `start` up to `start + length` along `dim` of the unwrapped storch tensors in `unwrapped`.
+    Other arguments are passed unchanged.
+    """
+    if isinstance(a, storch.Tensor):
+        chunk = unwrapped.detach().narrow(dim, start, length)
+        if copy:
+            # Make sure only the chunk is sent to the worker, not the full storage
+            chunk = chunk.clone()
+        return chunk
+    if isinstance(a, Mapping):
+        return {
+            k: _chunk(v, unwrapped[k], dim, start, length, copy) for k, v in a.items()
+        }
+    if isinstance(a, (list, tuple)):
+        chunked = [
+            _chunk(_a, _u, dim, start, length, copy) for _a, _u in zip(a, unwrapped)
+        ]
+        return tuple(chunked) if isinstance(a, tuple) else chunked
+    return unwrapped
+
+
+def _evaluate(fn: Callable, args: tuple, kwargs: dict) -> torch.Tensor:
+    with torch.no_grad():
+        return torch.as_tensor(fn(*args, **kwargs))
+
+
+def _handle_blackbox(
+    fn: Callable,
+    fn_args: tuple,
+    fn_kwargs: dict,
+    plate: Optional[str],
+    chunk_size: int,
+    executor: Optional[Executor],
+    name: Optional[str],
+):
+    flatten_plates = plate is None
+    new_args, new_kwargs, parents, plates = storch.wrappers._prepare_args(
+        fn_args, fn_kwargs, expand_plates=True, flatten_plates=flatten_plates
+    )
+    if not parents:
+        output = fn(*fn_args, **fn_kwargs)
+        if name:
+            # Register the cost, even though its gradient cannot be estimated
+            output = BlackboxTensor(torch.as_tensor(output), [], [], name)
+            return storch.add_cost(output, name)
+        return output
+
+    multi_dim_plates = [p for p in plates if p.n > 1]
+    plate_dims = tuple(p.n for p in multi_dim_plates)
+    if flatten_plates:
+        dim = 0
+        n = 1
+        for plate_n in plate_dims:
+            n *= plate_n
+    else:
+        plate_names = [p.name for p in multi_dim_plates]
+        if plate not in plate_names:
+            raise ValueError(
+                "Cannot chunk the black-box evaluation along missing plate " + plate
+            )
+        dim = plate_names.index(plate)
+        n = plate_dims[dim]
+
+    copy = isinstance(executor, ProcessPoolExecutor)
+    chunks = []
+    for start in range(0, n, chunk_size):
+        length = min(chunk_size, n - start)
+        chunks.append(
+            (
+                _chunk(fn_args, new_args, dim, start, length, copy),
+                _chunk(fn_kwargs, new_kwargs, dim, start, length, copy),
+            )
+        )
+    if executor is None:
+        results = [_evaluate(fn, args, kwargs) for args, kwargs in chunks]
+    else:
+        futures = [
+            executor.submit(_evaluate, fn, args, kwargs) for args, kwargs in chunks
+        ]
+        results = [future.result() for future in futures]
+    if flatten_plates:
+        # Allow functions that return a scalar for a single sample
+        results = [r.reshape(1) if r.ndim == 0 else r for r in results]
+    output = torch.cat(results, dim).to(parents[0]._tensor.device)
+    if flatten_plates:
+        output = output.reshape(plate_dims + output.shape[1:])
+
+    output = BlackboxTensor(output, parents, plates, name or fn.__name__)
+    if name:
+        return storch.add_cost(output, name)
+    return output
+
+
+def blackbox_cost(
+    fn: Optional[Callable] = None,
+    *,
+    plate: Optional[str] = None,
+    chunk_size: int = 1,
+    executor: Optional[Executor] = None,
+    name: Optional[str] = None,
+):
+    """
+    Wraps a non-differentiable and expensive function, such as a simulator or a reward model, so that it is evaluated in
+    chunks on a process or thread pool. Like :func:`storch.deterministic`, the wrapper unwraps and aligns the input
+    :class:`storch.Tensor` objects. The results are reassembled into a :class:`BlackboxTensor` with the plates of
+    the inputs. The gradients of the result are estimated using the methods of the stochastic inputs, for example
+    :class:`storch.method.ScoreFunction`.
+
+    When used with a :class:`concurrent.futures.ProcessPoolExecutor`, `fn` should be picklable, ie defined at the
+    top level of a module.
+
+    Args:
+        fn: The function to wrap. If None, this returns a decorator with the given options.
+        plate: The name of the plate to split the inputs along. `fn` receives the inputs with all plate dimensions,
+            where the dimension of `plate` is of size `chunk_size`, and should return a tensor with the same plate
+            dimensions. If None (default), all plates are flattened into the first dimension and `fn` receives
+            `chunk_size` samples at a time. It may then return a scalar if `chunk_size` is 1.
+        chunk_size: The amount of elements to evaluate in each call of `fn`.
+        executor: The executor to evaluate the chunks with. If None, the chunks are evaluated sequentially.
+        name: If given, the result is registered as a cost node with this name using :func:`storch.add_cost`.
+
+    Returns:
+        Callable: The wrapped function `fn`.
+    """
+    if fn is None:
+        return lambda _f: blackbox_cost(
+            _f, plate=plate, chunk_size=chunk_size, executor=executor, name=name
+        )
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        return _handle_blackbox(fn, args, kwargs, plate, chunk_size, executor, name)
+
+    return wrapper
@@ -2,6 +2,7 @@ from __future__ import annotations
 import torch
 import storch
 from torch.distributions import Distribution
+import copy
 from collections import deque
 from typing import List, Iterable, Any, Callable, Iterator
 import builtins
@@ -54,6 +55,13 @@ class Plate:
         # Neither of the weights are Tensors, so the weights must be equal as self.n==other.n
         return True
 
+    def __getstate__(self):
+        # The weight is stored without its autograd history, as it cannot be sent to other processes
+        state = self.__dict__.copy()
+        if isinstance(self.weight, torch.Tensor):
+            state["weight"] = self.weight.detach()
+        return state
+
     def __str__(self):
         return self.name + ", " + str(self.n)
 
@@ -122,6 +130,82 @@ class Plate:
         return tensor
 
 
+_validate_plates = False
+
+
+def set_validate_plates(validate: bool):
+    """
+    Sets whether to validate that the shapes of newly created :class:`Tensor` objects are consistent with their plates.
+    Validation is disabled by default as it is relatively expensive. It is useful for debugging and testing.
+
+    Args:
+        validate (bool): Whether to enable validation.
+    """
+    global _validate_plates
+    _validate_plates = validate
+
+
+# Slots of storch tensors that are not serialized, with factories for their values after deserialization.
+# These are the edges of the stochastic computation graph, and the objects used to estimate gradients.
+_transient_slots = {
+    "_parents": list,
+    "_children": list,
+    "_cleaned": lambda: False,
+    "distribution": lambda: None,
+    "method": lambda: None,
+    "param_grads": dict,
+}
+
+
+def _slots(cls: type) -> Iterator[str]:
+    for c in cls.__mro__:
+        yield from c.__dict__.get("__slots__", ())
+
+
+def _validate_plate_shape(tensor: torch.Tensor, plates: [Plate]) -> int:
+    plate_names = set()
+    batch_dims = 0
+    # Check whether this tensor does not violate the constraints imposed by the given batch_links
+    for plate in plates:
+        if plate.name in plate_names:
+            raise ValueError(
+                "Plates contain two instances of same plate "
+                + plate.name
+                + ". This can be caused by different samples with the same name using a different amount of samples n or different weighting of the samples. Make sure that these samples use the same number of samples."
+            )
+        plate_names.add(plate.name)
+        # plate length is 1. Ignore this dimension, as singleton dimensions should not exist.
+        if plate.n == 1:
+            continue
+        if len(tensor.shape) <= batch_dims:
+            raise ValueError(
+                "Got an input tensor with too few dimensions. We expected "
+                + str(len(plates))
+                + " plate dimensions. Instead, we found only "
+                + str(len(tensor.shape))
+                + " dimensions. Violated at dimension "
+                + str(batch_dims)
+            )
+        elif not tensor.shape[batch_dims] == plate.n:
+            raise ValueError(
+                "Storch Tensors should take into account their surrounding plates. Violated at dimension "
+                + str(batch_dims)
+                + " and plate "
+                + plate.name
+                + " with size "
+                + str(plate.n)
+                + ". "
+                "Instead, it was "
+                + str(tensor.shape[batch_dims])
+                + ". Batch links: "
+                + str(plates)
+                + " Tensor shape: "
+                + str(tensor.shape)
+            )
+        batch_dims += 1
+    return batch_dims
+
+
 class Tensor:
     """
     A :class:`storch.Tensor` is a wrapper around a :class:`torch.Tensor` that acts like a normal :class:`torch.Tensor`
@@ -150,6 +234,18 @@ class Tensor:
         name (Optional[str]): The name of this Tensor.
     """
 
+    __slots__ = (
+        "_name",
+        "_tensor",
+        "_parents",
+        "_children",
+        "_cleaned",
+        "plates",
+        "plate_dims",
+        "event_shape",
+        "event_dims",
+    )
+
     def __init__(
         self,
         tensor: torch.Tensor,
@@ -161,51 +257,21 @@ class Tensor:
             raise TypeError(
                 "storch.Tensors should be constructed with torch.Tensors, not other storch.Tensors."
             )
-        plate_names = set()
-        batch_dims = 0
-        # Check whether this tensor does not violate the constraints imposed by the given batch_links
-        for plate in plates:
-            if plate.name in plate_names:
-                raise ValueError(
-                    "Plates contain two instances of same plate "
-                    + plate.name
-                    + ". This can be caused by different samples with the same name using a different amount of samples n or different weighting of the samples. Make sure that these samples use the same number of samples."
-                )
-            plate_names.add(plate.name)
-            # plate length is 1. Ignore this dimension, as singleton dimensions should not exist.
-            if plate.n == 1:
-                continue
-            if len(tensor.shape) <= batch_dims:
-                raise ValueError(
-                    "Got an input tensor with too few dimensions. We expected "
-                    + str(len(plates))
-                    + " plate dimensions. Instead, we found only "
-                    + str(len(tensor.shape))
-                    + " dimensions. Violated at dimension "
-                    + str(batch_dims)
-                )
-            elif not tensor.shape[batch_dims] == plate.n:
-                raise ValueError(
-                    "Storch Tensors should take into account their surrounding plates. Violated at dimension "
-                    + str(batch_dims)
-                    + " and plate "
-                    + plate.name
-                    + " with size "
-                    + str(plate.n)
-                    + ". "
-                    "Instead, it was "
-                    + str(tensor.shape[batch_dims])
-                    + ". Batch links: "
-                    + str(plates)
-                    + " Tensor shape: "
-                    + str(tensor.shape)
-                )
-            batch_dims += 1
-
         self._name = name
         self._tensor = tensor
         self._parents = []
+        self._children = []
         self._cleaned = False
+        self.plates = plates
+        if _validate_plates and not storch.wrappers._inference_mode:
+            self.plate_dims = _validate_plate_shape(tensor, plates)
+        else:
+            self.plate_dims = sum(1 for plate in plates if plate.n > 1)
+        self.event_shape = tensor.shape[self.plate_dims :]
+        self.event_dims = len(self.event_shape)
+        if storch.wrappers._inference_mode:
+            # Skip the links in the stochastic computation graph
+            return
         for p in parents:
             # TODO: Should I re-add this?
             # if p.is_cost:
@@ -213,11 +279,6 @@ class Tensor:
             differentiable_link = has_backwards_path(self, p)
             self._parents.append((p, differentiable_link))
             p._children.append((self, differentiable_link))
-        self._children = []
-        self.plate_dims = batch_dims
-        self.event_shape = tensor.shape[batch_dims:]
-        self.event_dims = len(self.event_shape)
-        self.plates = plates
 
     def __torch_function__(self, func, types, args=(), kwargs=None):
         """
@@ -431,7 +492,7 @@ class Tensor:
 
     @property
     def plate_shape(self) -> torch.Size:
-        return self._tensor.shape[: self.plate_dims]
+        return self.shape[: self.plate_dims]
 
     def size(self, *args) -> torch.Size:
         return self._tensor.size(*args)
@@ -473,7 +534,7 @@ class Tensor:
         return self._tensor.register_hook(hook)
 
     def event_dim_indices(self):
-        return range(self.plate_dims, self._tensor.dim())
+        return range(self.plate_dims, self.dim())
 
     def get_plate(self, plate_name: str) -> Plate:
         for plate in self.plates:
@@ -523,14 +584,40 @@ class Tensor:
         return self.eq(other)
 
     def __getstate__(self):
-        raise NotImplementedError(
-            "Pickle is currently not implemented for storch tensors."
-        )
+        """
+        Returns the state used for pickling. This contains the underlying tensor (detached from the autograd graph),
+        the name and the plates, but not the edges of the stochastic computation graph.
+        """
+        state = {
+            slot: getattr(self, slot)
+            for slot in _slots(type(self))
+            if slot not in _transient_slots
+        }
+        state["_tensor"] = self._tensor.detach()
+        return state
 
     def __setstate__(self, state):
-        raise NotImplementedError(
-            "Pickle is currently not implemented for storch tensors."
-        )
+        for slot in _slots(type(self)):
+            if slot in _transient_slots:
+                setattr(self, slot, _transient_slots[slot]())
+            else:
+                setattr(self, slot, state[slot])
+
+    def share_memory_(self) -> Tensor:
+        """
+        Moves the underlying tensor and the weights of the plates to shared memory, so that sending this tensor to other
+        processes using :mod:`torch.multiprocessing` does not copy it. See :meth:`torch.Tensor.share_memory_`.
+
+        Returns:
+            storch.Tensor: This tensor.
+        """
+        self._tensor.detach().share_memory_()
+        for plate in self.plates:
+            if isinstance(plate.weight, Tensor):
+                plate.weight.share_memory_()
+            elif isinstance(plate.weight, torch.Tensor):
+                plate.weight.detach().share_memory_()
+        return self
 
     def __and__(self, other):
         if isinstance(other, bool):
@@ -587,9 +674,11 @@ class Tensor:
         )
 
     def __deepcopy__(self, memodict={}):
-        raise NotImplementedError(
-            "There is currently no deep copying implementation for storch Tensors."
-        )
+        # Copies the serialized state, so the copy is not part of the stochastic computation graph
+        copied = type(self).__new__(type(self))
+        memodict[id(self)] = copied
+        copied.__setstate__(copy.deepcopy(self.__getstate__(), memodict))
+        return copied
 
     def __iter__(self):
         # TODO: This recognizes storch.Tensor as Iterable, even though it's not implemented.
@@ -706,6 +795,8 @@ class Tensor:
 
 
 class CostTensor(Tensor):
+    __slots__ = ()
+
     def __init__(self, tensor: torch.Tensor, parents, plate_links: [Plate], name: str):
         super().__init__(tensor, parents, plate_links, name)
 
@@ -720,6 +811,8 @@ class IndependentTensor(Tensor):
     of the input tensor is taken to be independent and added as a batch dimension to the storch system.
     """
 
+    __slots__ = ("n",)
+
     def __init__(
         self,
         tensor: torch.Tensor,
@@ -760,6 +853,14 @@ class StochasticTensor(Tensor):
         
     """
 
+    __slots__ = (
+        "distribution",
+        "_requires_grad",
+        "n",
+        "method",
+        "param_grads",
+    )
+
     # TODO: Copy original tensor to make sure it cannot change using inplace
     def __init__(
         self,
@@ -778,7 +879,6 @@ class StochasticTensor(Tensor):
         self.n = n
         self.method = method
         self.param_grads = {}
-        self._grad = None
 
     @property
     def stochastic(self):
@@ -798,5 +898,194 @@ class StochasticTensor(Tensor):
         self.method = method
 
 
+class IndexedOneHotTensor(StochasticTensor):
+    """
+    A :class:`StochasticTensor` of one-hot samples, for example from
+    :class:`~torch.distributions.OneHotCategorical`, that is stored as the indices of the ones. The dense one-hot
+    tensor is only created (and then cached) when an operation requires it. This reduces the memory of the samples
+    by a factor of the size of the domain.
+
+    Multiplying the samples with a matrix, using ``@``, :func:`torch.matmul` or :func:`torch.nn.functional.linear`
+    (for example in :class:`torch.nn.Linear`), is computed as an embedding lookup of the rows of the matrix. The
+    log-probability of the samples under :class:`~torch.distributions.OneHotCategorical` is computed from the indices
+    as well. These are used by :class:`storch.sampling.MonteCarlo` with ``one_hot_indices=True``.
+
+    Args:
+        indices (torch.Tensor): The index of the one of each sample. Its shape is the shape of the one-hot samples
+            without the last dimension.
+        domain_size (int): The size of the last dimension of the one-hot samples.
+        dtype (torch.dtype): The dtype of the one-hot samples.
+    """
+
+    __slots__ = ("_indices", "domain_size", "_dense", "_dtype")
+
+    def __init__(
+        self,
+        indices: torch.Tensor,
+        parents: [Tensor],
+        plates: [Plate],
+        name: str,
+        n: int,
+        distribution: Distribution,
+        requires_grad: bool,
+        domain_size: int,
+        dtype: torch.dtype = torch.float,
+        method: Optional[storch.method.Method] = None,
+    ):
+        self._indices = indices
+        self.domain_size = domain_size
+        # Validate the plates on an expanded placeholder that does not allocate memory
+        shape = indices.shape + (domain_size,)
+        placeholder = torch.empty((), dtype=dtype, device=indices.device).expand(shape)
+        super().__init__(
+            placeholder,
+            parents,
+            plates,
+            name,
+            n,
+            distribution,
+            requires_grad,
+            method,
+        )
+        self._dense = None
+
+    @property
+    def _tensor(self) -> torch.Tensor:
+        if self._dense is None:
+            self._dense = torch.nn.functional.one_hot(
+                self._indices, self.domain_size
+            ).to(self.dtype)
+        return self._dense
+
+    @_tensor.setter
+    def _tensor(self, tensor: Optional[torch.Tensor]):
+        # Assigning a tensor replaces the one-hot samples, so the indices can no longer be used afterwards
+        self._dense = tensor
+        if tensor is not None:
+            self._dtype = tensor.dtype
+
+    @property
+    def is_compressed(self) -> bool:
+        """
+        True if the dense one-hot tensor has not been created. Operations on compressed tensors use the indices.
+        """
+        return self._dense is None
+
+    @property
+    def indices(self) -> Tensor:
+        """
+        Returns the indices of the ones as a :class:`storch.Tensor`, for example to look up embeddings.
+        """
+        indices = Tensor(self._indices, [self], self.plates, self.name)
+        if storch.wrappers._tracer is not None:
+            storch.wrappers._tracer.register_indices(self, indices)
+        return indices
+
+    @property
+    def shape(self) -> torch.Size:
+        return self._indices.shape + (self.domain_size,)
+
+    def size(self, *args) -> torch.Size:
+        return self.shape.__getitem__(*args) if args else self.shape
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def device(self):
+        return self._indices.device
+
+    @property
+    def layout(self):
+        return self._indices.layout
+
+    def is_cuda(self):
+        return self._indices.is_cuda
+
+    def dim(self):
+        return self._indices.dim() + 1
+
+    def ndimension(self):
+        return self.dim()
+
+    @property
+    def ndim(self):
+        return self.dim()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _is_domain_dim(self, dim: int) -> bool:
+        return dim == -1 or dim == self.dim() - 1
+
+    def _matmul(self, other: Any) -> Optional[Tensor]:
+        # Use an embedding lookup if the matrix is shared by all samples
+        if (
+            self.is_compressed
+            and isinstance(other, torch.Tensor)
+            and other.dim() == 2
+            and other.shape[0] == self.domain_size
+        ):
+            return torch.nn.functional.embedding(self.indices, other)
+        return None
+
+    def __matmul__(self, other):
+        result = self._matmul(other)
+        if result is None:
+            return super().__matmul__(other)
+        return result
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        if kwargs is None:
+            kwargs = {}
+        if args and isinstance(args[0], IndexedOneHotTensor):
+            tensor = args[0]
+            if func is torch.matmul and len(args) == 2 and not kwargs:
+                result = tensor._matmul(args[1])
+                if result is not None:
+                    return result
+            elif func is torch.nn.functional.linear:
+                weight = args[1] if len(args) > 1 else kwargs.get("weight")
+                bias = args[2] if len(args) > 2 else kwargs.get("bias")
+                if isinstance(weight, torch.Tensor) and (
+                    bias is None or isinstance(bias, torch.Tensor)
+                ):
+                    result = tensor._matmul(weight.t())
+                    if result is not None:
+                        return result if bias is None else result + bias
+        return super().__torch_function__(func, types, args, kwargs)
+
+    def argmax(self, dim: Optional[int] = None, keepdim: bool = False):
+        if dim is None or not self._is_domain_dim(dim) or not self.is_compressed:
+            return storch.wrappers._self_deterministic(torch.Tensor.argmax, self)(
+                dim, keepdim
+            )
+        indices = self.indices
+        return indices.unsqueeze(-1) if keepdim else indices
+
+    def max(self, dim: Optional[int] = None, keepdim: bool = False):
+        if dim is None or not self._is_domain_dim(dim) or not self.is_compressed:
+            if dim is None:
+                return storch.wrappers._self_deterministic(torch.Tensor.max, self)()
+            return storch.wrappers._self_deterministic(torch.Tensor.max, self)(
+                dim, keepdim
+            )
+        indices = self.argmax(dim, keepdim)
+        values = torch.ones_like(indices, dtype=self.dtype)
+        return torch.return_types.max((values, indices))
+
+    def __getstate__(self):
+        state = {
+            slot: getattr(self, slot)
+            for slot in _slots(type(self))
+            if slot not in _transient_slots and slot not in ("_tensor", "_dense")
+        }
+        # Compressed samples are serialized as the indices only
+        dense = None if self.is_compressed else self._dense.detach()
+        state["_tensor"] = state["_dense"] = dense
+        return state
+
+
 is_tensor = lambda a: isinstance(a, torch.Tensor) or isinstance(a, Tensor)
 from storch.util import has_backwards_path
@@ -0,0 +1,419 @@
+"""
+Tracing of storch models into plans that run on plain :class:`torch.Tensor` objects.
+
+:func:`trace` runs a storch model once and records every top-level deterministic operation and every Monte Carlo
+sample, together with the plate alignment (transposes, unsqueezes, expands and reshapes) that was resolved for its
+inputs. The resulting :class:`TracedPlan` replays these operations without creating any :class:`storch.Tensor`, so it
+has the exact same sample layout as the storch model while being compatible with ``torch.compile`` and
+``torch.jit.trace``.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import torch
+from torch.distributions import Distribution
+
+import storch
+
+
+class _Ref:
+    """
+    Reference to a value in the environment of a plan, with the layout operations to apply to it.
+    """
+
+    __slots__ = ("slot", "steps")
+
+    def __init__(self, slot: int, steps: Tuple = ()):
+        self.slot = slot
+        self.steps = steps
+
+    def resolve(self, env: List[torch.Tensor]) -> torch.Tensor:
+        value = env[self.slot]
+        for name, *args in self.steps:
+            value = getattr(value, name)(*args)
+        return value
+
+
+class _Out:
+    """
+    Binds an output of an operation to a slot in the environment, optionally unflattening the plate dimensions.
+    """
+
+    __slots__ = ("slot", "plate_dims")
+
+    def __init__(self, slot: int, plate_dims: Optional[Tuple[int, ...]] = None):
+        self.slot = slot
+        self.plate_dims = plate_dims
+
+
+class _Distr:
+    """
+    Rebuilds a distribution from its recorded attributes, replacing the storch parameters by their traced values.
+    """
+
+    __slots__ = ("cls", "attributes")
+
+    def __init__(self, cls: type, attributes: Dict[str, Any]):
+        self.cls = cls
+        self.attributes = attributes
+
+
+def _resolve(template: Any, env: List[torch.Tensor]) -> Any:
+    if isinstance(template, _Ref):
+        return template.resolve(env)
+    if isinstance(template, _Distr):
+        distr = template.cls.__new__(template.cls)
+        distr.__dict__.update(_resolve(template.attributes, env))
+        return distr
+    if isinstance(template, tuple):
+        return tuple(_resolve(t, env) for t in template)
+    if isinstance(template, list):
+        return [_resolve(t, env) for t in template]
+    if isinstance(template, dict):
+        return {k: _resolve(t, env) for k, t in template.items()}
+    return template
+
+
+def _bind(template: Any, value: Any, env: List[torch.Tensor]):
+    if isinstance(template, _Out):
+        if template.plate_dims is not None:
+            value = value.reshape(template.plate_dims + value.shape[1:])
+        env[template.slot] = value
+    elif isinstance(template, (tuple, list)):
+        for t, v in zip(template, value):
+            _bind(t, v, env)
+
+
+def _collect_slots(template: Any, slots: set):
+    if isinstance(template, _Ref):
+        slots.add(template.slot)
+    elif isinstance(template, _Distr):
+        _collect_slots(template.attributes, slots)
+    elif isinstance(template, (tuple, list)):
+        for t in template:
+            _collect_slots(t, slots)
+    elif isinstance(template, dict):
+        for t in template.values():
+            _collect_slots(t, slots)
+
+
+def _identity(tensor: torch.Tensor) -> torch.Tensor:
+    return tensor
+
+
+def _stack(*tensors: torch.Tensor) -> torch.Tensor:
+    return torch.stack(tensors, 0)
+
+
+def _one_hot(indices: torch.Tensor, domain_size: int, dtype: torch.dtype):
+    return torch.nn.functional.one_hot(indices, domain_size).to(dtype)
+
+
+class _SampleOp:
+    """
+    Replays :meth:`storch.sampling.MonteCarlo.sample` on a distribution with plain tensor parameters.
+    """
+
+    def __init__(
+        self,
+        mc_sample: Callable,
+        plates: List[storch.Plate],
+        n_samples: int,
+        squeeze: bool,
+    ):
+        self.mc_sample = mc_sample
+        self.plates = plates
+        self.n_samples = n_samples
+        self.squeeze = squeeze
+
+    def __call__(self, distr: Distribution) -> torch.Tensor:
+        tensor = self.mc_sample(distr, [], self.plates, self.n_samples)
+        if self.squeeze:
+            tensor = tensor.squeeze(0)
+        return tensor
+
+
+class _Tracer:
+    def __init__(self):
+        self.n_slots = 0
+        self.input_slots: List[int] = []
+        self.ops: List[Tuple[Callable, Any, Any, Any]] = []
+        self._slots: Dict[int, int] = {}
+        # Keep traced objects alive so that their ids are not reused during tracing
+        self._alive = []
+        self._frames: List[Dict[int, Tuple[torch.Tensor, _Ref]]] = []
+        # The slots of the indices of one-hot samples stored as indices
+        self._index_slots: Dict[int, int] = {}
+
+    def new_slot(self, tensor: storch.Tensor) -> int:
+        slot = self.n_slots
+        self.n_slots += 1
+        self._slots[id(tensor)] = slot
+        self._alive.append(tensor)
+        return slot
+
+    def alias(self, tensor: storch.Tensor, source: storch.Tensor):
+        """
+        Registers a tensor that wraps the same underlying tensor as `source`.
+        """
+        self._slots[id(tensor)] = self.slot(source)
+        self._alive.append(tensor)
+
+    def register_indices(
+        self, tensor: storch.IndexedOneHotTensor, indices: storch.Tensor
+    ):
+        """
+        Registers the tensor returned by :attr:`storch.IndexedOneHotTensor.indices`.
+        """
+        self._slots[id(indices)] = self._index_slots[id(tensor)]
+        self._alive.append(indices)
+
+    def ref(self, tensor: storch.Tensor, steps: List[Tuple] = ()) -> _Ref:
+        return _Ref(self.slot(tensor), tuple(steps))
+
+    def slot(self, tensor: storch.Tensor) -> int:
+        slot = self._slots.get(id(tensor))
+        if slot is None:
+            raise ValueError(
+                "Tensor "
+                + str(tensor.name)
+                + " was not created by a traceable operation. Only deterministic operations, "
+                "Monte Carlo sampling and independent plates created within the traced function are supported."
+            )
+        return slot
+
+    def push_frame(self):
+        self._frames.append({})
+
+    def pop_frame(self) -> Dict[int, Tuple[torch.Tensor, _Ref]]:
+        return self._frames.pop()
+
+    def register_unwrapped(
+        self, tensor: storch.Tensor, unwrapped: torch.Tensor, steps: List[Tuple]
+    ):
+        """
+        Called by the deterministic wrapper after aligning a :class:`storch.Tensor` for use in a torch function.
+        """
+        if not self._frames:
+            # Nested operations are replayed as part of the outer function
+            return
+        self._frames[-1][id(unwrapped)] = (
+            unwrapped,
+            _Ref(self.slot(tensor), tuple(steps)),
+        )
+
+    def template(
+        self, a: Any, unwrapped: Optional[Dict[int, Tuple[torch.Tensor, _Ref]]] = None
+    ) -> Any:
+        if isinstance(a, storch.Tensor):
+            return _Ref(self.slot(a))
+        if isinstance(a, torch.Tensor):
+            if unwrapped and id(a) in unwrapped:
+                return unwrapped[id(a)][1]
+            # Tensors that do not depend on storch tensors are recorded as constants
+            return a
+        if isinstance(a, Distribution):
+            return _Distr(type(a), self.template(a.__dict__))
+        if isinstance(a, Mapping):
+            return {k: self.template(v, unwrapped) for k, v in a.items()}
+        if isinstance(a, (tuple, list)):
+            l = [self.template(_a, unwrapped) for _a in a]
+            return tuple(l) if isinstance(a, tuple) else l
+        return a
+
+    def _out_template(self, o: Any, plate_dims: Optional[Tuple[int, ...]]) -> Any:
+        if isinstance(o, storch.Tensor):
+            if id(o) in self._slots:
+                # Passed through the function unchanged
+                return None
+            return _Out(self.new_slot(o), plate_dims)
+        if isinstance(o, (tuple, list)):
+            return [self._out_template(_o, plate_dims) for _o in o]
+        return None
+
+    def record(
+        self,
+        fn: Callable,
+        args: Any,
+        kwargs: Dict[str, Any],
+        outputs: Any,
+        unwrapped: Optional[Dict[int, Tuple[torch.Tensor, _Ref]]] = None,
+        plate_dims: Optional[Tuple[int, ...]] = None,
+    ):
+        """
+        Records a call of `fn` on the (unwrapped) `args` and `kwargs` that created the storch tensors in `outputs`.
+        """
+        self.ops.append(
+            (
+                fn,
+                self.template(args, unwrapped),
+                self.template(kwargs, unwrapped),
+                self._out_template(outputs, plate_dims),
+            )
+        )
+
+    def distribution_template(
+        self, distr: Distribution, plates: List[storch.Plate]
+    ) -> _Distr:
+        """
+        Records the distribution's attributes, aligning its storch parameters to the given plates.
+        """
+        multi_dim_plates = [plate for plate in plates if plate.n > 1]
+        attributes = {}
+        for k, v in distr.__dict__.items():
+            if isinstance(v, storch.Tensor):
+                self.push_frame()
+                try:
+                    unwrapped = storch.wrappers._unsqueeze_and_unwrap(
+                        v, multi_dim_plates, True, False, False, False, 0
+                    )
+                finally:
+                    frame = self.pop_frame()
+                attributes[k] = frame[id(unwrapped)][1]
+            elif isinstance(v, Distribution):
+                attributes[k] = self.distribution_template(v, plates)
+            else:
+                attributes[k] = v
+        return _Distr(type(distr), attributes)
+
+    def record_sample(
+        self,
+        sampling_method: storch.sampling.SamplingMethod,
+        distr_template: _Distr,
+        plates: List[storch.Plate],
+        n_samples: int,
+        squeeze: bool,
+        s_tensor: storch.StochasticTensor,
+    ):
+        if isinstance(s_tensor, storch.IndexedOneHotTensor):
+            op = _SampleOp(sampling_method.sample_indices, plates, n_samples, squeeze)
+            index_slot = self.n_slots
+            self.n_slots += 1
+            self._index_slots[id(s_tensor)] = index_slot
+            self.ops.append((op, [distr_template], {}, _Out(index_slot)))
+            # The one-hot samples are only created if an operation uses them
+            self.ops.append(
+                (
+                    _one_hot,
+                    (_Ref(index_slot), s_tensor.domain_size, s_tensor.dtype),
+                    {},
+                    _Out(self.new_slot(s_tensor)),
+                )
+            )
+            return
+        op = _SampleOp(sampling_method.mc_sample, plates, n_samples, squeeze)
+        self.ops.append((op, [distr_template], {}, _Out(self.new_slot(s_tensor))))
+
+    def plan(self, outputs: Any) -> TracedPlan:
+        return TracedPlan(
+            self.input_slots, self.ops, self.template(outputs), self.n_slots
+        )
+
+
+class TracedPlan:
+    """
+    A storch model traced by :func:`trace`. Calling the plan with plain tensors replays the recorded operations and
+    returns plain tensors in the same layout as the traced model.
+
+    The plan is specialized to the plate sizes and branches taken during tracing. Parameters of modules are
+    referenced, not copied, so the plan uses their current values.
+    """
+
+    def __init__(
+        self,
+        input_slots: List[int],
+        ops: List[Tuple[Callable, Any, Any, Any]],
+        outputs: Any,
+        n_slots: int,
+    ):
+        keep = set(input_slots)
+        _collect_slots(outputs, keep)
+        # Skip the creation of one-hot samples that are only used through their indices
+        used = set(keep)
+        _collect_slots([(args, kwargs) for _, args, kwargs, _ in ops], used)
+        ops = [op for op in ops if op[0] is not _one_hot or op[3].slot in used]
+
+        self.input_slots = input_slots
+        self.ops = ops
+        self.outputs = outputs
+        self.n_slots = n_slots
+
+        # Free intermediate values after their last use
+        last_use = {}
+        for i, (_, args, kwargs, _) in enumerate(ops):
+            used = set()
+            _collect_slots((args, kwargs), used)
+            for slot in used:
+                last_use[slot] = i
+        self._free: List[List[int]] = [[] for _ in ops]
+        for slot, i in last_use.items():
+            if slot not in keep:
+                self._free[i].append(slot)
+
+    def __call__(self, *inputs: torch.Tensor) -> Any:
+        if len(inputs) != len(self.input_slots):
+            raise ValueError(
+                "Expected "
+                + str(len(self.input_slots))
+                + " input tensors, got "
+                + str(len(inputs))
+            )
+        env: List[Optional[torch.Tensor]] = [None] * self.n_slots
+        for slot, tensor in zip(self.input_slots, inputs):
+            env[slot] = tensor
+        for (fn, args, kwargs, out), free in zip(self.ops, self._free):
+            outputs = fn(*_resolve(args, env), **_resolve(kwargs, env))
+            _bind(out, outputs, env)
+            for slot in free:
+                env[slot] = None
+        return _resolve(self.outputs, env)
+
+    def compile(self, **kwargs) -> Callable:
+        """
+        Compiles the plan using ``torch.compile``. The keyword arguments are passed to ``torch.compile``.
+        """
+        if not hasattr(torch, "compile"):
+            raise RuntimeError("Compiling traced plans requires torch.compile.")
+        return torch.compile(self, **kwargs)
+
+
+def trace(fn: Callable, *args, **kwargs) -> TracedPlan:
+    """
+    Runs the storch model `fn` once and records it as a :class:`TracedPlan` that runs on plain tensors.
+
+    The positional :class:`torch.Tensor` arguments are the inputs of the plan. They are wrapped in a
+    :class:`storch.Tensor` without plates before calling `fn`, so that all computations depending on them are recorded.
+    Other arguments are treated as constants. After tracing, the stochastic computation graph is reset using
+    :func:`storch.reset`.
+
+    Sampling without replacement and enumeration are not supported, as their samples depend on the sampled values.
+
+    Args:
+        fn: The storch model. Should return (a structure of) tensors.
+        args: Example inputs of the model.
+        kwargs: Constant keyword arguments of the model.
+
+    Returns:
+        TracedPlan: The plan. Call it with the same number of positional tensors as `args` contains.
+    """
+    if storch.wrappers._tracer is not None:
+        raise RuntimeError("Cannot trace within a traced function.")
+    tracer = _Tracer()
+    wrapped_args = []
+    for i, a in enumerate(args):
+        if isinstance(a, torch.Tensor):
+            a = storch.Tensor(a, [], [], "input_" + str(i))
+            tracer.input_slots.append(tracer.new_slot(a))
+        wrapped_args.append(a)
+
+    storch.wrappers._tracer = tracer
+    try:
+        outputs = fn(*wrapped_args, **kwargs)
+        plan = tracer.plan(outputs)
+    finally:
+        storch.wrappers._tracer = None
+        storch.reset()
+    return plan
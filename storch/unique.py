@@ -1,20 +1,34 @@
-from typing import Optional
+import math
+from collections import OrderedDict, namedtuple
+from typing import Callable, Optional
 
 import storch
 import torch
+from storch.storch import _handle_inputs
+from storch.typing import _plates
 
 """
-This module removes all plates from the tensor, and computes functions over the unique elements. Using clever bookkeeping,
+This module removes plates from the tensor, and computes functions over the unique elements. Using clever bookkeeping,
 we can retrieve the associated plates to retrieve the original plates.
 This is useful for (sequences of) discrete output distributions that sample with replacement. We can greatly reduce
 the computation of the deterministic functions (such as a deterministic reward) by only computing the function over
 the unique elements.
-
-Note: this code is highly experimental.
 """
 
 
 class UniquePlate(storch.Plate):
+    """
+    Plate over the unique elements of a tensor, replacing the plates that were compressed by :func:`unique`.
+
+    Args:
+        name: The name of the plate.
+        amt_unique: The amount of unique elements.
+        shrunken_plates: The plates that were compressed, in order.
+        inv_indexing: Tensor of size equal to the product of the sizes of `shrunken_plates`. For each combination of
+            indices of the shrunken plates (in row-major order), it contains the index of the corresponding unique
+            element.
+    """
+
     def __init__(
         self,
         name: str,
@@ -26,8 +40,24 @@ class UniquePlate(storch.Plate):
         self.inv_indexing = inv_indexing
         self.shrunken_plates = shrunken_plates
         self.weight = None
+        weights = [plate.weight for plate in shrunken_plates]
+        if all(
+            isinstance(w, torch.Tensor)
+            and not isinstance(w, storch.Tensor)
+            and w.ndim == 0
+            for w in weights
+        ):
+            # If the shrunken plates have fixed weights, the unique elements can be reduced directly by weighting
+            # them with the amount of times they occur
+            counts = torch.bincount(inv_indexing, minlength=amt_unique)
+            weight = counts.to(weights[0].dtype if weights else torch.float)
+            for w in weights:
+                weight = weight * w.to(weight.device)
+            self.weight = weight
 
     def reduce(self, unique_tensor: storch.Tensor, detach_weights=True):
+        if self.weight is not None:
+            return super().reduce(unique_tensor, detach_weights)
         non_unique = self.undo_unique(unique_tensor)
         return storch.reduce_plates(
             non_unique, plates=self.shrunken_plates, detach_weights=detach_weights
@@ -50,56 +80,122 @@ class UniquePlate(storch.Plate):
                 return True
         return False
 
-    def undo_unique(self, unique_tensor: storch.Tensor) -> torch.Tensor:
+    def undo_unique(self, unique_tensor: storch.Tensor) -> storch.Tensor:
         """
-        Convert the unique tensor back to the non-unique format, then add the old plates back in
-        # TODO: Make sure self.shrunken_plates is added
-        # TODO: What if unique_tensor contains new plates after the unique?
-        :param unique_tensor:
-        :return:
+        Converts the unique tensor back to the non-unique format by replacing this plate with the shrunken plates.
+        Plates that were added to the tensor after calling :func:`unique` are kept.
         """
-        plate_idx = unique_tensor.get_plate_dim_index(self.name)
-        with storch.ignore_wrapping():
-            dim_swapped = unique_tensor.transpose(
-                plate_idx, unique_tensor.plate_dims - 1
-            )
-            fl_selected = torch.index_select(
-                dim_swapped, dim=0, index=self.inv_indexing
-            )
-            selected = fl_selected.reshape(
-                tuple(map(lambda p: p.n, self.shrunken_plates)) + fl_selected.shape[1:]
-            )
-            return storch.Tensor(
-                selected,
-                [unique_tensor],
-                self.shrunken_plates + unique_tensor.plates,
-                "undo_unique_" + unique_tensor.name,
-            )
-
-
-def unique(tensor: storch.Tensor, event_dim: Optional[int] = 0) -> storch.Tensor:
-    with storch.ignore_wrapping():
-        fl_tensor = torch.flatten(tensor, tensor.plate_dims)
-        uniq, inverse_indexing = torch.unique(
-            fl_tensor, return_inverse=True, dim=event_dim
+        # Find the dimension of this plate
+        plate_idx = 0
+        for plate in unique_tensor.plates:
+            if plate is self or plate.name == self.name:
+                break
+            if plate.n > 1:
+                plate_idx += 1
+        tensor = unique_tensor._tensor
+        if self.n == 1:
+            tensor = tensor.unsqueeze(plate_idx)
+        # Gather all non-unique elements at once, then split the dimension into the shrunken plates
+        selected = torch.index_select(tensor, plate_idx, self.inv_indexing)
+        shrunken_shape = tuple(plate.n for plate in self.shrunken_plates if plate.n > 1)
+        selected = selected.reshape(
+            selected.shape[:plate_idx]
+            + shrunken_shape
+            + selected.shape[plate_idx + 1 :]
         )
-    inverse_indexing = storch.Tensor(
-        inverse_indexing, [tensor], tensor.plates, "inv_index_" + tensor.name
+        plates = []
+        for plate in unique_tensor.plates:
+            if plate is self or plate.name == self.name:
+                plates.extend(self.shrunken_plates)
+            else:
+                plates.append(plate)
+        return storch.Tensor(
+            selected,
+            [unique_tensor],
+            plates,
+            "undo_unique_" + (unique_tensor.name or ""),
+        )
+
+
+def _composed_index(plates: [storch.Plate]) -> ([storch.Plate], torch.Tensor):
+    """
+    For plates that are compressed together, returns the plates that remain after replacing unique plates with the
+    plates they shrunk, and for each combination of indices of these plates the index into the flattened
+    combinations of the input plates.
+    """
+    expanded_plates = []
+    indices = []
+    for plate in plates:
+        if isinstance(plate, UniquePlate):
+            expanded_plates.extend(plate.shrunken_plates)
+            indices.append(plate.inv_indexing)
+        else:
+            expanded_plates.append(plate)
+            indices.append(torch.arange(plate.n))
+    index = torch.zeros((), dtype=torch.long)
+    for plate, plate_index in zip(plates, indices):
+        index = index.unsqueeze(-1) * plate.n + plate_index.to(index.device)
+    return expanded_plates, index.reshape(-1)
+
+
+def unique(tensor: storch.Tensor, plates: Optional[_plates] = None) -> storch.Tensor:
+    """
+    Computes the unique elements of the tensor over the given plates. The plates are replaced by a single
+    :class:`UniquePlate`, which is the first plate of the result. An element consists of all dimensions that are not in
+    the given plates, including the dimensions of other plates. Deterministic functions can then be computed on the
+    unique elements only. Use :func:`undo_unique` to retrieve the result for the original plates.
+
+    When calling unique on a tensor with a :class:`UniquePlate`, the index is composed, so that a single
+    :func:`undo_unique` call retrieves the original plates.
+
+    Args:
+        tensor: The tensor to find the unique elements of.
+        plates: The plates to compress. If None, all plates are compressed.
+
+    Returns:
+        storch.Tensor: The unique elements.
+    """
+    tensor, plates = _handle_inputs(tensor, plates)
+    plate_names = set(plate.name for plate in plates)
+    tensor_plates = tensor.multi_dim_plates()
+    compressed = [plate for plate in tensor_plates if plate.name in plate_names]
+    if not compressed:
+        return tensor
+    compressed_idx = [
+        i for i, plate in enumerate(tensor_plates) if plate.name in plate_names
+    ]
+    kept_idx = [
+        i for i, plate in enumerate(tensor_plates) if plate.name not in plate_names
+    ]
+    # Move the compressed plates to the front and flatten them
+    t = tensor._tensor.permute(
+        compressed_idx + kept_idx + list(range(tensor.plate_dims, tensor._tensor.ndim))
     )
+    t = t.reshape((-1,) + t.shape[len(compressed) :])
+    uniq, inverse_indexing = torch.unique(t, return_inverse=True, dim=0)
+    shrunken_plates, index = _composed_index(compressed)
+    name = tensor.name or ""
     uq_plate = UniquePlate(
-        "uq_plate_" + tensor.name,
+        "uq_plate_" + name,
         uniq.shape[0],
-        tensor.multi_dim_plates(),
-        inverse_indexing,
+        shrunken_plates,
+        inverse_indexing[index.to(inverse_indexing.device)],
     )
-    return storch.Tensor(uniq, [tensor], [uq_plate], "unique_" + tensor.name)
+    new_plates = [uq_plate] + [
+        plate for plate in tensor.plates if plate.name not in plate_names
+    ]
+    return storch.Tensor(uniq, [tensor], new_plates, "unique_" + name)
 
 
 def undo_unique(tensor: storch.Tensor) -> storch.Tensor:
+    """
+    Converts a tensor computed on unique elements back to the plates that were compressed by :func:`unique`.
+    """
     while is_unique(tensor):
         for plate in tensor.plates:
             if isinstance(plate, UniquePlate):
                 tensor = plate.undo_unique(tensor)
+                break
     return tensor
 
 
@@ -108,3 +204,114 @@ def is_unique(tensor: storch.Tensor) -> bool:
         if isinstance(plate, UniquePlate):
             return True
     return False
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class MemoizedCost:
+    """
+    Memoizes a deterministic cost function of samples, such as a reward that is a function of a discrete sample.
+    The cost function is only evaluated on the unique samples that are not in the cache. The cache is kept across
+    iterations and holds the results of at most `maxsize` samples, evicting the least recently used ones.
+
+    The wrapped function receives a tensor of shape `(m, *event_shape)` of `m` unique samples and should return a
+    tensor with first dimension `m`. It is evaluated without gradients, so the cost should not depend on any
+    parameters.
+
+    Args:
+        fn: The cost function to memoize.
+        maxsize: The maximum amount of samples to cache the results of.
+    """
+
+    def __init__(self, fn: Callable[[torch.Tensor], torch.Tensor], maxsize: int = 1024):
+        self.fn = fn
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __call__(self, samples: storch.Tensor) -> storch.Tensor:
+        if not isinstance(samples, storch.Tensor):
+            # The first dimension of a torch.Tensor is interpreted as the batch of samples
+            uniq, inverse_indexing = torch.unique(samples, return_inverse=True, dim=0)
+            return self._lookup(uniq)[inverse_indexing]
+        unique_samples = unique(samples)
+        costs = storch.Tensor(
+            self._lookup(unique_samples._tensor),
+            [unique_samples],
+            unique_samples.plates,
+            "memoized_" + (samples.name or ""),
+        )
+        return undo_unique(costs)
+
+    def _lookup(self, uniq: torch.Tensor) -> torch.Tensor:
+        """
+        Returns the costs of the unique samples, evaluating the cost function on those not in the cache.
+        """
+        # Copy the samples to the host once, and reinterpret their rows as bytes. This also supports dtypes that
+        # numpy does not, such as bfloat16.
+        data = uniq.detach().cpu().contiguous()
+        data = data.reshape(len(data), math.prod(data.shape[1:]))
+        data = data.view(torch.uint8).numpy()
+        row_key = (str(uniq.dtype), tuple(uniq.shape[1:]))
+        keys = [row_key + (row.tobytes(),) for row in data]
+        missing = []
+        for i, key in enumerate(keys):
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                missing.append(i)
+                self.misses += 1
+        missing_costs = {}
+        if missing:
+            with torch.no_grad():
+                costs = self.fn(uniq[missing])
+            for i, cost in zip(missing, costs):
+                # Copy the row, so that the cache does not keep the storage of the whole batch alive
+                self._cache[keys[i]] = cost.detach().clone()
+                missing_costs[i] = cost
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        # Use the computed costs directly, in case they were evicted from the cache already
+        return torch.stack(
+            [
+                missing_costs[i] if i in missing_costs else self._cache[key]
+                for i, key in enumerate(keys)
+            ]
+        )
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Returns:
+            float: The fraction of unique samples of which the cost was found in the cache.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Returns:
+            CacheInfo: The hits, misses, maximum size and current size of the cache, like :func:`functools.lru_cache`.
+        """
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._cache))
+
+    def cache_clear(self):
+        """
+        Clears the cache and the statistics.
+        """
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def memoize_cost(fn: Optional[Callable] = None, *, maxsize: int = 1024):
+    """
+    Wraps the cost function in a :class:`MemoizedCost`. Can be used as a decorator, optionally with the `maxsize`
+    argument.
+    """
+    if fn is None:
+        return lambda _f: MemoizedCost(_f, maxsize)
+    return MemoizedCost(fn, maxsize)
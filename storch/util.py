@@ -1,19 +1,19 @@
 from typing import Dict, Optional, List, Tuple, Union
 from collections import deque
 
-from pyro.distributions import (
-    RelaxedOneHotCategoricalStraightThrough,
-    RelaxedBernoulliStraightThrough,
+from storch.tensor import (
+    Tensor,
+    CostTensor,
+    StochasticTensor,
+    IndexedOneHotTensor,
+    Plate,
+    is_tensor,
 )
-
-from storch.tensor import Tensor, CostTensor, StochasticTensor, Plate, is_tensor
 from torch.distributions import (
     Distribution,
-    RelaxedOneHotCategorical,
     Categorical,
     OneHotCategorical,
     Bernoulli,
-    RelaxedBernoulli,
 )
 import torch
 
@@ -115,6 +115,9 @@ def has_backwards_path(output: Tensor, input: Tensor, depth_first=False):
             if has_backwards_path(param, input, depth_first):
                 return True
         return False
+    if isinstance(input, IndexedOneHotTensor) and input.is_compressed:
+        # The indices of one-hot samples are not differentiable
+        return False
     input = input._tensor
     if not input.requires_grad:
         return False
@@ -193,29 +196,49 @@ def reduce_mean(tensor: torch.Tensor, keep_dims: [int]):
     return tensor.mean(sum_out_dims)
 
 
+def accumulation_dtype(dtype: torch.dtype) -> torch.dtype:
+    """
+    Returns the dtype to accumulate log probabilities and importance weights of tensors with dtype `dtype` in.
+    Reduced precision floating point types (float16 and bfloat16) are accumulated in float32, so that samples and
+    activations can use mixed precision without underflowing the log probabilities of long sequences.
+    """
+    if dtype in (torch.float16, torch.bfloat16):
+        return torch.float32
+    return dtype
+
+
+def to_accumulation_dtype(
+    tensor: Union[torch.Tensor, Tensor]
+) -> Union[torch.Tensor, Tensor]:
+    """
+    Casts the tensor to :func:`accumulation_dtype`. Returns the tensor itself if it already has this dtype.
+    """
+    dtype = accumulation_dtype(tensor.dtype)
+    if dtype == tensor.dtype:
+        return tensor
+    return tensor.to(dtype)
+
+
 def rsample_gumbel(
     distr: Distribution,
     n: int,
     temperature: torch.Tensor,
     straight_through: bool = False,
 ) -> torch.Tensor:
+    """
+    Takes n reparameterized samples from the Gumbel-softmax relaxation of a Categorical, OneHotCategorical or Bernoulli
+    distribution. The samples are computed directly from the logits of the distribution.
+    """
+    from storch.sampling.gumbel import gumbel_softmax, gumbel_sigmoid
+
     if isinstance(distr, (Categorical, OneHotCategorical)):
-        if straight_through:
-            gumbel_distr = RelaxedOneHotCategoricalStraightThrough(
-                temperature, probs=distr.probs
-            )
-        else:
-            gumbel_distr = RelaxedOneHotCategorical(temperature, probs=distr.probs)
+        sampler = gumbel_softmax
     elif isinstance(distr, Bernoulli):
-        if straight_through:
-            gumbel_distr = RelaxedBernoulliStraightThrough(
-                temperature, probs=distr.probs
-            )
-        else:
-            gumbel_distr = RelaxedBernoulli(temperature, probs=distr.probs)
+        sampler = gumbel_sigmoid
     else:
         raise ValueError("Using Gumbel Softmax with non-discrete distribution")
-    return gumbel_distr.rsample((n,))
+    logits = distr.logits
+    return sampler(logits.expand((n,) + logits.shape), temperature, straight_through)
 
 
 def split(
@@ -248,10 +271,10 @@ def split(
                 new_plates.remove(_plate)
                 new_plates[plates_index] = _plate
                 break
-    empty_indices = [None] * (index - 1)
+    empty_indices = [slice(None)] * index
     sliced_tensors = []
     for _slice in slices:
-        indices = empty_indices + [_slice]
+        indices = tuple(empty_indices + [_slice])
         new_tensor = tensor._tensor[indices]
         if create_plates:
             n = _slice.stop - _slice.start
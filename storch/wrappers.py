@@ -15,6 +15,9 @@ _stochastic_parents = []
 _context_name = None
 _plate_links = []
 _ignore_wrap = False
+# storch.trace._Tracer that records the operations while tracing a model
+_tracer = None
+_inference_mode = False
 
 # TODO: This is_iterable thing is a bit annoying: We really only want to unwrap them if they contain storch
 #  Tensors, and then only for some types. Should rethink, maybe. Is unwrapping even necessary if the base torch methods
@@ -64,7 +67,10 @@ def _unsqueeze_and_unwrap(
     event_dims: int,
 ):
     if isinstance(a, storch.Tensor):
+        tracer = storch.wrappers._tracer
         if not align_tensors:
+            if tracer is not None:
+                tracer.register_unwrapped(a, a._tensor, [])
             return a._tensor
 
         for plate in multi_dim_plates:
@@ -72,11 +78,16 @@ def _unsqueeze_and_unwrap(
             a = plate.on_unwrap_tensor(a)
 
         tensor = a._tensor
+        # Layout operations applied to the tensor. Only recorded when tracing
+        steps = [] if tracer is not None else None
         # Automatically **RIGHT** broadcast. Ensure each tensor has an equal amount of event dims by inserting dimensions to the right
         # TODO: What do we think about this design?
         # TODO: The storch.tensor._getitem_level == 0 check prevents right-broadcasting for __getitem__ and __setitem__... Seems hacky
         if l_broadcast and a.event_dims < event_dims:
-            tensor = tensor[(...,) + (None,) * (event_dims - a.event_dims)]
+            index = (...,) + (None,) * (event_dims - a.event_dims)
+            tensor = tensor[index]
+            if steps is not None:
+                steps.append(("__getitem__", index))
         # It can be possible that the ordering of the plates does not align with the ordering of the inputs.
         # This part corrects this.
         amt_recognized = 0
@@ -88,6 +99,8 @@ def _unsqueeze_and_unwrap(
                     # The plate is also in the tensor, but not in the ordering expected. So switch that ordering
                     j = links.index(plate)
                     tensor = tensor.transpose(j, amt_recognized)
+                    if steps is not None:
+                        steps.append(("transpose", j, amt_recognized))
                     links[amt_recognized], links[j] = links[j], links[amt_recognized]
                 amt_recognized += 1
 
@@ -96,6 +109,8 @@ def _unsqueeze_and_unwrap(
         for i, plate in enumerate(multi_dim_plates):
             if plate not in a.plates:
                 tensor = tensor.unsqueeze(i)
+                if steps is not None:
+                    steps.append(("unsqueeze", i))
                 plate_dims.append(plate.n)
             else:
                 # Make sure to use a's plate size here. It's actually possible they are different in ancestral plates!
@@ -103,12 +118,20 @@ def _unsqueeze_and_unwrap(
 
         # Optionally expand the singleton dimensions to the plate size
         if expand_plates:
-            tensor = tensor.expand(tuple(plate_dims) + tensor.shape[len(plate_dims) :])
+            shape = tuple(plate_dims) + tensor.shape[len(plate_dims) :]
+            tensor = tensor.expand(shape)
+            if steps is not None:
+                steps.append(("expand", shape))
         # Optionally flatten the plate dimensions to a single batch dimension
         if flatten_plates:
             assert expand_plates
-            tensor = tensor.reshape((-1,) + tensor.shape[len(plate_dims) :])
+            shape = (-1,) + tensor.shape[len(plate_dims) :]
+            tensor = tensor.reshape(shape)
+            if steps is not None:
+                steps.append(("reshape", shape))
 
+        if tracer is not None:
+            tracer.register_unwrapped(a, tensor, steps)
         return tensor
     elif isinstance(a, Mapping):
         d = {}
@@ -304,9 +327,19 @@ def _handle_deterministic(
         # # We are already in a deterministic context, no need to wrap or unwrap as only the outer dependencies matter
         # return fn(*args, **kwargs)
 
-    new_fn_args, new_fn_kwargs, parents, plates = _prepare_args(
-        fn_args, fn_kwargs, flatten_plates=flatten_plates, **wrapper_kwargs
-    )
+    # When tracing, only top-level operations are recorded. Nested operations are replayed as part of fn.
+    tracer = storch.wrappers._tracer
+    if storch.wrappers._context_deterministic > 0 or storch.wrappers._ignore_wrap:
+        tracer = None
+    if tracer is not None:
+        tracer.push_frame()
+    try:
+        new_fn_args, new_fn_kwargs, parents, plates = _prepare_args(
+            fn_args, fn_kwargs, flatten_plates=flatten_plates, **wrapper_kwargs
+        )
+    finally:
+        if tracer is not None:
+            unwrapped = tracer.pop_frame()
     if not parents:
         return fn(*fn_args, **fn_kwargs)
     args = new_fn_args
@@ -326,10 +359,15 @@ def _handle_deterministic(
             reduce_plates = [reduce_plates]
         plates = [p for p in plates if p.name not in reduce_plates]
 
-    outputs = _prepare_outputs_det(
+    wrapped_outputs = _prepare_outputs_det(
         outputs, parents, plates, fn.__name__, 1, unflatten_plates=flatten_plates
     )[0]
-    return outputs
+    if tracer is not None:
+        plate_dims = None
+        if flatten_plates:
+            plate_dims = tuple([plate.n for plate in plates if plate.n > 1])
+        tracer.record(fn, args, kwargs, wrapped_outputs, unwrapped, plate_dims)
+    return wrapped_outputs
 
 
 def _deterministic(
@@ -485,6 +523,25 @@ def _unpack_wrapper(fn):
 
 @contextmanager
 def ignore_wrapping():
+    prev_ignore_wrap = storch.wrappers._ignore_wrap
     storch.wrappers._ignore_wrap = True
-    yield
-    storch.wrappers._ignore_wrap = False
+    try:
+        yield
+    finally:
+        storch.wrappers._ignore_wrap = prev_ignore_wrap
+
+
+@contextmanager
+def inference_mode():
+    """
+    Context manager for fast evaluation passes. Within this context, gradients are disabled and
+    :class:`~storch.Tensor` objects only keep track of their plates: No links in the stochastic computation graph
+    are created, and plate shapes are not validated. Gradient estimation is not possible within this context.
+    """
+    prev_inference_mode = storch.wrappers._inference_mode
+    storch.wrappers._inference_mode = True
+    try:
+        with torch.no_grad():
+            yield
+    finally:
+        storch.wrappers._inference_mode = prev_inference_mode
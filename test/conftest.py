@@ -0,0 +1,40 @@
+import pytest
+import torch
+import storch
+from torch.distributions import Bernoulli
+
+# Validate the shapes of all created storch tensors against their plates
+storch.set_validate_plates(True)
+
+
+@pytest.fixture
+def no_validate_args():
+    """
+    Disables the argument validation of distributions. OneHotCategorical does not pass validate_args to the
+    Categorical it creates internally, which cannot validate storch tensors.
+    """
+    validate_args = torch.distributions.Distribution._validate_args
+    torch.distributions.Distribution.set_default_validate_args(False)
+    yield
+    torch.distributions.Distribution.set_default_validate_args(validate_args)
+
+
+@pytest.fixture
+def bernoulli_grad():
+    """
+    Returns a function that estimates the gradient of a quadratic cost of Bernoulli samples with respect to their
+    logits using the given method. It returns the estimate and the exact gradient.
+    """
+
+    def estimate(method):
+        torch.manual_seed(0)
+        logits = torch.tensor([0.3, -1.0, 2.0], requires_grad=True)
+        target = torch.tensor([0.45, 0.1, 0.8])
+        b = method(Bernoulli(logits=logits, validate_args=False))
+        storch.add_cost(((b - target) ** 2).sum(-1), "cost")
+        storch.backward()
+        probs = logits.sigmoid().detach()
+        exact = probs * (1 - probs) * ((1 - target) ** 2 - target**2)
+        return logits.grad, exact
+
+    return estimate
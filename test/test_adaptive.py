@@ -0,0 +1,68 @@
+import itertools
+
+import pytest
+import storch
+import torch
+from torch.distributions import Bernoulli
+
+
+def _model(method, logits):
+    b = method(Bernoulli(logits=logits, validate_args=False))
+    storch.add_cost(((b - 0.5) ** 2 + b).sum(-1), "cost")
+
+
+def _score_function_variance(logits):
+    # Variance of f(b) (b - p), summed over the dimensions, by enumerating all samples
+    probs = logits.sigmoid()
+    mean = torch.zeros_like(probs)
+    second_moment = torch.zeros_like(probs)
+    for b in itertools.product([0.0, 1.0], repeat=len(probs)):
+        b = torch.tensor(b)
+        p = torch.where(b > 0.5, probs, 1 - probs).prod()
+        estimate = ((b - 0.5) ** 2 + b).sum() * (b - probs)
+        mean += p * estimate
+        second_moment += p * estimate**2
+    return (second_moment - mean**2).sum()
+
+
+def test_adaptive_selects_lowest_variance():
+    torch.manual_seed(0)
+    logits = torch.tensor([0.5, -1.0, 2.0], requires_grad=True)
+    score = storch.method.ScoreFunction("b")
+    expect = storch.method.Expect("b")
+    method = storch.method.Adaptive("b", [score, expect], n_repeats=4000, interval=2)
+    assert method.benchmark_due
+    assert method.benchmark(_model, method, logits) is expect
+    assert method.method is expect
+    # The variance is that of the estimator on the fixed inputs
+    assert method.variances[1] < 1e-8
+    expected = _score_function_variance(logits.detach())
+    assert torch.allclose(method.variances[0], expected, rtol=0.1)
+    assert method.efficiencies[0] > method.efficiencies[1]
+    assert not method.capture_grads
+
+    assert not method.benchmark_due
+    for i in range(2):
+        _model(method, logits)
+        storch.backward()
+    assert method.benchmark_due
+
+
+def test_adaptive_gradient():
+    # The gradients of the selected candidate are used for training
+    logits = torch.tensor([0.3, -1.0, 2.0], requires_grad=True)
+    method = storch.method.Adaptive(
+        "b", [storch.method.Expect("b"), storch.method.LocalExpectation("b")]
+    )
+    method.benchmark(_model, method, logits)
+    probs = logits.sigmoid().detach()
+    exact = probs * (1 - probs)
+    logits.grad = None
+    _model(method, logits)
+    storch.backward()
+    assert torch.allclose(logits.grad, exact)
+
+
+def test_adaptive_plate_name():
+    with pytest.raises(ValueError):
+        storch.method.Adaptive("b", [storch.method.ScoreFunction("z")])
@@ -0,0 +1,66 @@
+import math
+
+import storch
+import torch
+from torch.distributions import OneHotCategorical, Bernoulli
+
+
+def _step(methods):
+    logits = torch.zeros(3, requires_grad=True)
+    cost = 0.0
+    for method in methods:
+        z = method(OneHotCategorical(logits=logits, validate_args=False))
+        cost = cost + (z * torch.arange(3.0)).sum(-1)
+    storch.add_cost(cost, "cost")
+    storch.backward()
+
+
+def test_exponential():
+    method = storch.method.GumbelSoftmax(
+        "z", annealing="exponential", annealing_rate=0.1
+    )
+    for _ in range(3):
+        _step([method])
+    assert method.iterations == 3
+    assert torch.allclose(method.temperature, torch.tensor(math.exp(-0.3)))
+
+
+def test_batched_schedules():
+    linear = storch.method.GumbelSoftmax(
+        "z1", annealing="linear", annealing_rate=0.1, annealing_interval=2
+    )
+    exponential = storch.method.GumbelSoftmax(
+        "z2", annealing="exponential", annealing_rate=0.1, min_temperature=0.85
+    )
+    # The temperature is constant by default
+    constant = storch.method.GumbelSoftmax("z3")
+    for _ in range(3):
+        _step([linear, exponential, constant])
+    # Linear annealing only happened after the second iteration
+    assert torch.allclose(linear.temperature, torch.tensor(0.8))
+    assert torch.allclose(exponential.temperature, torch.tensor(0.85))
+    assert constant.temperature == 1.0
+
+
+def test_method_updated_once_per_backward():
+    method = storch.method.GumbelSoftmax(
+        "z", annealing="exponential", annealing_rate=0.1
+    )
+    logits = torch.zeros(2, requires_grad=True)
+    z1 = method(Bernoulli(logits=logits, validate_args=False))
+    # Sample again with the same method, using a different plate
+    method.plate_name = method.sampling_method.plate_name = "z_2"
+    z2 = method(Bernoulli(logits=logits, validate_args=False))
+    storch.add_cost((z1 + z2).sum(-1), "cost")
+    storch.backward()
+    assert method.iterations == 1
+    assert torch.allclose(method.temperature, torch.tensor(math.exp(-0.1)))
+
+
+def test_custom_schedule():
+    method = storch.method.GumbelSoftmax(
+        "z", annealing=lambda iteration: 1.0 / (1.0 + iteration)
+    )
+    for _ in range(4):
+        _step([method])
+    assert torch.allclose(method.temperature, torch.tensor(0.2))
@@ -0,0 +1,45 @@
+import storch
+import torch
+from torch.distributions import Bernoulli, Categorical, OneHotCategorical
+
+
+def test_arm_bernoulli(bernoulli_grad):
+    grad, exact = bernoulli_grad(storch.method.ARM("b", n_samples=50000))
+    assert torch.allclose(grad, exact, atol=5e-3)
+
+
+def test_disarm_bernoulli(bernoulli_grad):
+    method = storch.method.DisARM("b", n_samples=50000)
+    grad, exact = bernoulli_grad(method)
+    assert torch.allclose(grad, exact, atol=5e-3)
+
+
+def test_disarm_categorical():
+    values = torch.tensor([1.0, 3.0, -2.0, 0.5])
+    logits = torch.tensor([0.3, -1.0, 2.0, 0.1], requires_grad=True)
+    (logits.softmax(-1) * values).sum().backward()
+    exact = logits.grad
+    for distr_type in [Categorical, OneHotCategorical]:
+        torch.manual_seed(0)
+        logits.grad = None
+        z = storch.method.DisARM("z", n_samples=50000)(
+            distr_type(logits=logits, validate_args=False)
+        )
+        assert z.n == 100000
+        if distr_type is Categorical:
+            cost = storch.deterministic(lambda z: values[z])(z)
+        else:
+            cost = (z * values).sum(-1)
+        storch.add_cost(cost, "cost")
+        storch.backward()
+        assert torch.allclose(logits.grad, exact, atol=2e-2)
+
+
+def test_pairs_are_antithetic():
+    probs = torch.tensor([0.2, 0.5, 0.9])
+    sampling = storch.method.arm.ARMSampling("b", 1000)
+    b = sampling.mc_sample(Bernoulli(probs=probs, validate_args=False), [], [], 1000)
+    b, b_tilde = b[:1000], b[1000:]
+    # For p < 1/2 the pair is never both 1, for p > 1/2 never both 0
+    assert (b[:, 0] * b_tilde[:, 0]).sum() == 0
+    assert ((1 - b[:, 2]) * (1 - b_tilde[:, 2])).sum() == 0
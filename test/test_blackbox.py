@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import storch
+import torch
+from torch.distributions import Bernoulli
+
+torch.manual_seed(0)
+
+
+def reward(b):
+    # A non-differentiable cost function that is evaluated per sample
+    return float((b.sum() - 2).abs())
+
+
+def batched_reward(b, target):
+    return (b - target).abs().sum(-1)
+
+
+def _sample(n_samples=4):
+    p = torch.tensor([[0.2, 0.5, 0.7], [0.9, 0.1, 0.4]], requires_grad=True)
+    data = storch.denote_independent(p, 0, "data")
+    method = storch.method.ScoreFunction("b", n_samples=n_samples)
+    return p, method(Bernoulli(probs=data, validate_args=False))
+
+
+def test_blackbox_threads():
+    p, b = _sample()
+    with ThreadPoolExecutor(2) as executor:
+        cost = storch.blackbox_cost(reward, executor=executor, name="reward")(b)
+    assert isinstance(cost, storch.CostTensor)
+    assert cost.plates == b.plates
+    expected = (b._tensor.sum(-1) - 2).abs()
+    assert torch.equal(cost._tensor, expected)
+    storch.backward()
+    assert p.grad is not None
+
+
+def test_blackbox_plate_chunks():
+    p, b = _sample(5)
+    target = torch.tensor([1.0, 0.0, 1.0])
+    cost = storch.blackbox_cost(batched_reward, plate="b", chunk_size=2)(b, target)
+    assert isinstance(cost, storch.seq.BlackboxTensor)
+    assert cost.plates == b.plates
+    assert torch.equal(cost._tensor, batched_reward(b._tensor, target))
+    assert not cost._tensor.requires_grad
+    storch.reset()
+
+
+def test_blackbox_processes():
+    p, b = _sample()
+    with ProcessPoolExecutor(2) as executor:
+        cost = storch.blackbox_cost(
+            batched_reward, chunk_size=3, executor=executor, name="reward"
+        )(b, torch.ones(3))
+    assert torch.equal(cost._tensor, batched_reward(b._tensor, torch.ones(3)))
+    storch.reset()
+
+
+def test_blackbox_without_samples():
+    b = torch.tensor([1.0, 0.0, 1.0])
+    cost = storch.blackbox_cost(reward, name="reward")(b)
+    assert isinstance(cost, storch.CostTensor)
+    assert cost._tensor.item() == 0.0
+    assert any(c is cost for c in storch.inference._cost_tensors)
+    storch.reset()
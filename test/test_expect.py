@@ -3,6 +3,7 @@ import torch
 from torch.distributions import Bernoulli, OneHotCategorical
 
 expect = storch.method.Expect("x")
+expect.capture_grads = True
 probs = torch.tensor([0.01, 0.01, 0.01, 0.01, 0.01, 0.95], requires_grad=True)
 indices = torch.tensor([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
 b = OneHotCategorical(probs=probs)
@@ -15,6 +16,7 @@ storch.backward()
 expect_grad = z.grad["probs"].clone()
 
 method = storch.method.UnorderedSetEstimator("x", k=6)
+method.capture_grads = True
 # method = storch.REBAR()
 grads = []
 for i in range(100):
@@ -27,7 +29,7 @@ for i in range(100):
     grad = z.grad["probs"].clone()
     grads.append(grad)
 grad_samples = storch.gather_samples(grads, "variance")
-mean = storch.reduce_plates(grad_samples, plate_names=["variance"])
+mean = storch.reduce_plates(grad_samples, plates=["variance"])
 print("mean grad", mean)
 print("expected grad", expect_grad)
 print("specific_diffs", (mean - expect_grad) ** 2)
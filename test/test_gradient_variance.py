@@ -0,0 +1,32 @@
+import storch
+import torch
+from torch.distributions import Normal
+
+torch.manual_seed(0)
+
+
+def model(x):
+    z = method(Normal(x, 1.0, validate_args=False))
+    storch.add_cost((z**2).sum(-1), "cost")
+
+
+method = storch.method.Reparameterization("z")
+
+
+def test_gradient_samples():
+    x = torch.tensor([0.5, -1.0], requires_grad=True)
+    samples = storch.gradient_samples(model, method, 4000, x)
+    grad = samples["loc"]
+    assert grad.plates[0].name == "variance"
+    assert grad.shape == (4000, 2)
+    # The reparameterized gradient of E[z^2] with respect to the mean is 2x
+    mean = storch.reduce_plates(grad, "variance")._tensor
+    assert torch.allclose(mean, 2 * x.detach(), atol=0.15)
+    assert not method.capture_grads
+
+
+def test_estimate_gradient_variance():
+    x = torch.tensor([0.5, -1.0], requires_grad=True)
+    variance = storch.estimate_gradient_variance(model, method, 4000, x)["loc"]
+    # 2z has variance 4 in each of the two dimensions
+    assert abs(variance.item() - 8.0) < 0.8
@@ -0,0 +1,80 @@
+import subprocess
+import sys
+
+import torch
+
+from storch.sampling import gumbel
+
+torch.manual_seed(0)
+
+logits = torch.randn(5, 3, 4)
+
+
+def test_cond_gumbel_sample():
+    max_value = torch.randn(5, 3, 1)
+    sample = gumbel.cond_gumbel_sample(logits, max_value)
+    assert sample.shape == logits.shape
+    assert torch.allclose(sample.max(-1, keepdim=True)[0], max_value, atol=1e-4)
+
+
+def test_truncated_gumbel():
+    upper = torch.randn(5, 3, 1)
+    sample = gumbel.truncated_gumbel(logits, upper)
+    assert (sample <= upper + 1e-5).all()
+
+
+def test_gumbel_given_argmax():
+    index = torch.randint(4, (2, 5, 3))
+    sample = gumbel.gumbel_given_argmax(logits, index)
+    assert sample.shape == (2, 5, 3, 4)
+    assert (sample.argmax(-1) == index).all()
+
+
+def test_logistic_given_sample():
+    hard_sample = torch.randint(2, (2, 5, 3, 4)).float()
+    sample = gumbel.logistic_given_sample(logits, hard_sample)
+    assert sample.shape == hard_sample.shape
+    assert ((sample > 0).float() == hard_sample).all()
+
+
+def test_gumbel_top_k():
+    values, indices = gumbel.gumbel_top_k(logits, 2)
+    assert values.shape == indices.shape == (5, 3, 2)
+    assert (values[..., 0] >= values[..., 1]).all()
+    assert gumbel.gumbel_top_k(logits, 10)[1].shape == (5, 3, 4)
+
+
+def test_gumbel_softmax():
+    sample = gumbel.gumbel_softmax(logits.expand(10000, 5, 3, 4), 0.1)
+    assert torch.allclose(sample.sum(-1), torch.ones(10000, 5, 3))
+    # The argmax of the relaxed sample is distributed according to the softmax of the logits
+    freq = torch.nn.functional.one_hot(sample.argmax(-1), 4).float().mean(0)
+    assert torch.allclose(freq, logits.softmax(-1), atol=0.03)
+
+    hard_logits = logits.clone().requires_grad_()
+    hard = gumbel.gumbel_softmax(hard_logits, 0.5, straight_through=True)
+    assert ((hard == 0) | (hard == 1)).all()
+    (hard * torch.arange(4.0)).sum().backward()
+    assert hard_logits.grad.abs().sum() > 0
+
+
+def test_gumbel_sigmoid():
+    sample = gumbel.gumbel_sigmoid(logits.expand(10000, 5, 3, 4), 0.1)
+    freq = (sample > 0.5).float().mean(0)
+    assert torch.allclose(freq, logits.sigmoid(), atol=0.03)
+    hard = gumbel.gumbel_sigmoid(logits, torch.tensor(0.5), straight_through=True)
+    assert ((hard == 0) | (hard == 1)).all()
+
+
+def test_sample_gumbel_finite():
+    # Zero uniform noise would give infinite perturbed log-probabilities
+    sample = gumbel.sample_gumbel(torch.zeros(1000000))
+    assert torch.isfinite(sample).all()
+
+
+def test_import_without_warnings():
+    # The samplers are only compiled when they are first used
+    subprocess.run(
+        [sys.executable, "-W", "error::FutureWarning", "-c", "import storch"],
+        check=True,
+    )
@@ -0,0 +1,81 @@
+import pickle
+from multiprocessing.reduction import ForkingPickler
+
+import pytest
+import storch
+import torch
+import torch.multiprocessing
+from torch.distributions import OneHotCategorical
+
+# Categorical validation does not support storch tensors
+pytestmark = pytest.mark.usefixtures("no_validate_args")
+
+
+def _sample(logits, one_hot_indices, n_samples=8):
+    sampling = storch.sampling.MonteCarlo("z", n_samples, one_hot_indices)
+    method = storch.method.ScoreFunction(
+        "z", sampling_method=sampling, baseline_factory="batch_average"
+    )
+    return method(OneHotCategorical(logits=logits))
+
+
+def _gradients(one_hot_indices):
+    torch.manual_seed(0)
+    linear = torch.nn.Linear(10, 4)
+    logits = torch.randn(3, 10, requires_grad=True)
+    z = _sample(logits, one_hot_indices)
+    h = linear(z)
+    e = z @ torch.arange(20.0).reshape(10, 2)
+    cost = (h**2).sum(-1).sum(-1) + e.sum(-1).sum(-1)
+    storch.add_cost(cost, "cost")
+    storch.backward()
+    return z, logits.grad, linear.weight.grad
+
+
+def test_indexed_gradient():
+    z, logits_grad, weight_grad = _gradients(True)
+    _, dense_logits_grad, dense_weight_grad = _gradients(False)
+    assert isinstance(z, storch.IndexedOneHotTensor)
+    # The one-hot samples are never created
+    assert z.is_compressed
+    assert torch.allclose(logits_grad, dense_logits_grad, atol=1e-6)
+    assert torch.allclose(weight_grad, dense_weight_grad, atol=1e-6)
+
+
+def test_indexed_dense():
+    torch.manual_seed(0)
+    z = _sample(torch.randn(3, 10), True)
+    assert z.shape == (8, 3, 10)
+    assert z.plate_shape == (8,)
+    assert z.dtype == torch.float
+    assert z.argmax(-1)._tensor.equal(z._indices)
+    assert z.is_compressed
+
+    dense = z._tensor
+    assert not z.is_compressed
+    assert dense.sum(-1).eq(1).all()
+    assert dense.argmax(-1).equal(z._indices)
+
+
+def test_indexed_pickle():
+    torch.manual_seed(0)
+    z = _sample(torch.randn(3, 10), True)
+    z_copy = pickle.loads(pickle.dumps(z))
+    assert z_copy.is_compressed
+    assert z_copy._tensor.equal(z._tensor)
+
+
+def test_indexed_mc_sample():
+    sampling = storch.sampling.MonteCarlo("z", one_hot_indices=True)
+    with pytest.raises(ValueError):
+        sampling.set_mc_sample(lambda distr, parents, plates, amt_samples: None)
+
+
+def test_indexed_pickle_dense():
+    z = _sample(torch.randn(3, 10), True)
+    z._tensor = z._tensor * torch.ones(10, requires_grad=True)
+    # Sending tensors that require grad to other processes fails
+    z_copy = pickle.loads(ForkingPickler.dumps(z))
+    assert not z_copy.is_compressed
+    assert not z_copy._tensor.requires_grad
+    assert z_copy._tensor.equal(z._tensor)
@@ -0,0 +1,57 @@
+import itertools
+
+import storch
+import torch
+from torch.distributions import Bernoulli, Categorical, OneHotCategorical
+
+
+def test_additive_cost_is_exact():
+    # For costs that are a sum over the dimensions, the local expectations are exact
+    logits = torch.tensor([0.3, -1.0, 2.0], requires_grad=True)
+    weights = torch.tensor([1.0, -2.0, 0.5])
+    method = storch.method.LocalExpectation("z")
+    z = method(Bernoulli(logits=logits, validate_args=False))
+    assert z.n == 6
+    cost = storch.add_cost((z * weights).sum(-1), "cost")
+    storch.backward()
+    probs = logits.sigmoid().detach()
+    assert torch.allclose(logits.grad, probs * (1 - probs) * weights)
+
+
+def test_categorical_unbiased():
+    torch.manual_seed(0)
+    logits = torch.randn(2, 3, requires_grad=True)
+    values = torch.randn(3, 3)
+
+    def f(z):
+        # Non-additive cost over the two dimensions
+        return values[z[..., 0], z[..., 1]]
+
+    # Exact gradient through full enumeration
+    probs = logits.softmax(-1)
+    exact_cost = 0.0
+    for i, j in itertools.product(range(3), repeat=2):
+        exact_cost = exact_cost + probs[0, i] * probs[1, j] * values[i, j]
+    (exact,) = torch.autograd.grad(exact_cost, [logits])
+
+    method = storch.method.LocalExpectation("z", n_samples=2000, budget=20000)
+    z = method(Categorical(logits=logits, validate_args=False))
+    assert z.n == 2000 * 2 * 3
+    storch.add_cost(storch.deterministic(f)(z), "cost")
+    cost = storch.backward()
+    assert torch.allclose(logits.grad, exact, atol=2e-2)
+    assert torch.allclose(cost, exact_cost, atol=2e-2)
+
+
+def test_one_hot_variations():
+    probs = torch.tensor([[0.2, 0.8], [0.5, 0.5]])
+    sampling_method = storch.sampling.LocalEnumerate("z")
+    z, plate = sampling_method(
+        OneHotCategorical(probs=probs, validate_args=False), [], [], False
+    )
+    assert z.shape == (4, 2, 2)
+    # The variations differ from the sample in at most one dimension
+    assert torch.equal(z._tensor[0, 1], z._tensor[1, 1])
+    assert torch.equal(z._tensor[2, 0], z._tensor[3, 0])
+    assert torch.equal(z._tensor[:2, 0], torch.eye(2))
+    storch.reset()
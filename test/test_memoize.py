@@ -0,0 +1,64 @@
+import storch
+import torch
+from torch.distributions import Bernoulli
+
+torch.manual_seed(0)
+
+
+def test_memoize_cost():
+    evaluated = []
+
+    @storch.memoize_cost(maxsize=16)
+    def cost(b):
+        evaluated.append(b.shape[0])
+        return (b * torch.tensor([1.0, 2.0, 4.0])).sum(-1)
+
+    p = torch.tensor([0.1, 0.9, 0.5], requires_grad=True)
+    method = storch.method.ScoreFunction("b", n_samples=20)
+    b = method(Bernoulli(probs=p, validate_args=False))
+    c = cost(b)
+    assert c.plates == b.plates
+    assert torch.equal(c._tensor, (b._tensor * torch.tensor([1.0, 2.0, 4.0])).sum(-1))
+    # The cost is only evaluated on the unique samples
+    n_unique = torch.unique(b._tensor, dim=0).shape[0]
+    assert evaluated == [n_unique]
+    assert cost.misses == n_unique and cost.hits == 0
+    storch.add_cost(c, "cost")
+    storch.backward()
+
+    # The second evaluation on the same samples is fully cached
+    c2 = cost(b)
+    assert torch.equal(c2._tensor, c._tensor)
+    assert len(evaluated) == 1
+    assert cost.hit_rate == 0.5
+    info = cost.cache_info()
+    assert info.currsize == n_unique and info.maxsize == 16
+    cost.cache_clear()
+    assert cost.cache_info().currsize == 0 and cost.hits == 0
+
+
+def test_memoize_cost_eviction():
+    cost = storch.memoize_cost(lambda x: x.sum(-1), maxsize=2)
+    x = torch.tensor([[0.0, 1.0], [1.0, 1.0], [2.0, 1.0]])
+    assert torch.equal(cost(x), torch.tensor([1.0, 2.0, 3.0]))
+    assert cost.cache_info().currsize == 2
+    # The least recently used sample was evicted
+    cost(x[:1])
+    assert cost.misses == 4
+
+
+def test_memoize_cost_bfloat16():
+    cost = storch.memoize_cost(lambda x: x.sum(-1), maxsize=4)
+    x = torch.tensor([[0.0, 1.0], [1.0, 1.0]], dtype=torch.bfloat16)
+    x.requires_grad_()
+    assert torch.equal(cost(x), torch.tensor([1.0, 2.0], dtype=torch.bfloat16))
+    cost(x)
+    assert cost.hits == 2 and cost.misses == 2
+
+
+def test_memoize_cost_copies_rows():
+    cost = storch.memoize_cost(lambda x: x * 2.0, maxsize=4)
+    cost(torch.tensor([[0.0, 1.0], [1.0, 1.0]]))
+    for cached in cost._cache.values():
+        # Each entry owns its storage, instead of viewing the batch of costs
+        assert cached.untyped_storage().nbytes() == cached.nbytes
@@ -0,0 +1,90 @@
+import pytest
+import storch
+import torch
+from torch.distributions import Normal, Bernoulli
+
+torch.manual_seed(0)
+
+
+def test_per_plate_grad_reparameterization():
+    x = torch.tensor([0.5, -1.0], requires_grad=True)
+    method = storch.method.Reparameterization("z", n_samples=5)
+    z = method(Normal(x, 1.0, validate_args=False))
+    storch.add_cost((z**2).sum(-1), "cost")
+    grads = storch.per_plate_grad("z")
+    grad = grads["z"]["loc"]
+    assert grad.shape == (5, 2)
+    # The gradient of z^2 with respect to the mean is 2z
+    assert torch.allclose(grad, 2 * z._tensor.detach())
+
+    (x_grad,) = storch.per_plate_grad("z", [x])
+    assert torch.allclose(x_grad, grad)
+
+    # The full gradient is the weighted sum of the per-sample gradients
+    storch.backward()
+    assert torch.allclose(x.grad, grad.mean(0))
+
+
+def test_per_plate_grad_score_function():
+    p = torch.tensor([0.3, 0.6, 0.8], requires_grad=True)
+    method = storch.method.ScoreFunction("b", n_samples=4, baseline_factory=None)
+    b = method(Bernoulli(probs=p, validate_args=False))
+    storch.add_cost(b.sum(-1), "cost")
+    (p_grad,) = storch.per_plate_grad("b", [p])
+    assert p_grad.shape == (4, 3)
+    b_t = b._tensor.detach()
+    cost = b_t.sum(-1, keepdim=True)
+    score = b_t / p.detach() - (1 - b_t) / (1 - p.detach())
+    assert torch.allclose(p_grad, cost * score)
+
+    storch.backward()
+    assert torch.allclose(p.grad, p_grad.mean(0))
+
+
+class _ScalarBackward(torch.autograd.Function):
+    # The backward pass calls .item(), which cannot be vectorized
+    @staticmethod
+    def forward(ctx, x):
+        return x.clone()
+
+    @staticmethod
+    def backward(ctx, grad):
+        return grad * float(torch.ones(()).item())
+
+
+class _FailingBackward(torch.autograd.Function):
+    calls = 0
+
+    @staticmethod
+    def forward(ctx, x):
+        return x.clone()
+
+    @staticmethod
+    def backward(ctx, grad):
+        _FailingBackward.calls += 1
+        raise RuntimeError("bug in the cost function")
+
+
+def _sample_cost(fn):
+    x = torch.tensor([0.5, -1.0], requires_grad=True)
+    method = storch.method.Reparameterization("z", n_samples=5)
+    z = method(Normal(x, 1.0, validate_args=False))
+    cost = storch.deterministic(fn)(z)
+    storch.add_cost((cost**2).sum(-1), "cost")
+    return z
+
+
+def test_per_plate_grad_fallback():
+    z = _sample_cost(_ScalarBackward.apply)
+    grad = storch.per_plate_grad("z")["z"]["loc"]
+    assert torch.allclose(grad, 2 * z._tensor.detach())
+    storch.reset()
+
+
+def test_per_plate_grad_raises():
+    _sample_cost(_FailingBackward.apply)
+    with pytest.raises(RuntimeError, match="bug in the cost function"):
+        storch.per_plate_grad("z")
+    # The error is not hidden by rerunning the backward pass per element
+    assert _FailingBackward.calls == 1
+    storch.reset()
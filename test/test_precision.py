@@ -0,0 +1,58 @@
+import pytest
+import storch
+import torch
+from torch.distributions import OneHotCategorical
+
+from storch.sampling.swor import gumbel_log_survival, log1mexp
+from storch.util import to_accumulation_dtype
+
+
+def test_to_accumulation_dtype():
+    x = torch.zeros(2, dtype=torch.bfloat16)
+    assert to_accumulation_dtype(x).dtype == torch.float32
+    y = torch.zeros(2, dtype=torch.float64)
+    assert to_accumulation_dtype(y) is y
+
+
+def test_gumbel_log_survival():
+    x = torch.linspace(-5.0, 100.0, 1000, dtype=torch.float64)
+    expected = torch.log(-torch.expm1(-torch.exp(-x)))
+    # In the far tail, exp(-x) underflows in float32
+    result = gumbel_log_survival(x.float())
+    assert torch.isfinite(result).all()
+    assert torch.allclose(result.double(), expected, rtol=1e-5)
+
+
+def test_log1mexp_grad():
+    a = torch.tensor([-1e-3, -0.5, -1.0, -30.0], requires_grad=True)
+    log1mexp(a).sum().backward()
+    assert torch.isfinite(a.grad).all()
+
+
+def _sample_weights(method, dtype):
+    torch.manual_seed(1)
+    logits = (3 * torch.randn(2, 8)).to(dtype).requires_grad_()
+    z = method(OneHotCategorical(logits=logits, validate_args=False))
+    cost = (z * torch.arange(8.0).to(dtype)).sum(-1).sum(-1)
+    weight = z.get_plate("z").weight
+    storch.add_cost(cost, "c")
+    storch.backward()
+    return z, weight._tensor, logits.grad
+
+
+@pytest.mark.parametrize("dtype", [torch.float16, torch.bfloat16])
+@pytest.mark.parametrize(
+    "method",
+    [
+        lambda: storch.method.UnorderedSetEstimator("z", k=5),
+        lambda: storch.method.ScoreFunctionWOR("z", k=5),
+    ],
+)
+def test_reduced_precision(method, dtype):
+    z, weight, grad = _sample_weights(method(), dtype)
+    _, weight_32, grad_32 = _sample_weights(method(), torch.float32)
+    # The samples keep the reduced precision, while the weights are accumulated in float32
+    assert z.dtype == dtype
+    assert weight.dtype == torch.float32
+    assert torch.isfinite(grad).all()
+    assert torch.allclose(weight, weight_32, atol=1e-2)
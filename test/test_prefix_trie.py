@@ -0,0 +1,56 @@
+import pytest
+import storch
+import torch
+from torch.distributions import OneHotCategorical
+
+torch.manual_seed(0)
+# Categorical validation does not support storch tensors
+pytestmark = pytest.mark.usefixtures("no_validate_args")
+
+
+def _sample_sequences():
+    method = storch.method.ScoreFunctionWOR("z", 3, biased=True, use_baseline=False)
+    logits = torch.randn(4, requires_grad=True)
+    data = storch.denote_independent(torch.randn(2, 4), 0, "data")
+    z1 = method.sample(OneHotCategorical(logits=logits + data))
+    z2 = method.sample(OneHotCategorical(logits=z1 * 2.0 + data))
+    method.sample(OneHotCategorical(logits=z2 + z1))
+    return method.sampling_method, data
+
+
+def test_prefix_trie_sequences():
+    sampling_method, _ = _sample_sequences()
+    trie = sampling_method.get_prefix_trie()
+    assert trie.depth == 3
+    seq = sampling_method.seq
+    # data x z x length x |D|
+    sampled = torch.stack([z._tensor for z in seq], 2)
+    sequences = trie.sequences()
+    assert sequences.plates == [trie.plate(2)]
+    assert torch.equal(storch.undo_unique(sequences)._tensor, sampled)
+    for t in range(trie.depth):
+        # Prefixes are not shared over the data plate
+        n_prefixes = sum(
+            torch.unique(sampled[i, :, : t + 1], dim=0).shape[0] for i in range(2)
+        )
+        assert trie.n_nodes(t) == n_prefixes
+        tokens = storch.undo_unique(trie.tokens(t))
+        assert torch.equal(tokens._tensor, seq[t]._tensor)
+    storch.reset()
+
+
+def test_prefix_trie_recurrent_decoder():
+    sampling_method, data = _sample_sequences()
+    trie = sampling_method.get_prefix_trie()
+    # A recurrent decoder that counts the tokens in the prefix, starting from the data
+    h = trie.select(0, data)
+    for t in range(trie.depth):
+        if t > 0:
+            h = trie.gather_parents(t, h)
+        h = h + trie.tokens(t)
+    result = storch.undo_unique(h)
+    seq = sampling_method.seq
+    expected = data._tensor.unsqueeze(1) + sum(z._tensor for z in seq)
+    assert [p.name for p in result.multi_dim_plates()] == ["data", "z"]
+    assert torch.allclose(result._tensor, expected)
+    storch.reset()
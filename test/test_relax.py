@@ -0,0 +1,99 @@
+import storch
+import torch
+from torch.distributions import Bernoulli, OneHotCategorical
+
+from storch.method.relax import batched_c_phi
+
+
+class CountingBaseline(storch.method.relax.Baseline):
+    def __init__(self, in_dim):
+        super().__init__(in_dim)
+        self.calls = 0
+
+    def forward(self, x):
+        self.calls += 1
+        return super().forward(x)
+
+
+def test_batched_c_phi():
+    c_phi = CountingBaseline(4)
+    plate = storch.Plate("z", 3, [])
+    relaxed = storch.Tensor(torch.rand(3, 4), [], [plate], "relaxed")
+    cond = storch.Tensor(torch.rand(4), [], [], "cond")
+    out_relaxed, out_cond = batched_c_phi(c_phi, relaxed, cond)
+    assert c_phi.calls == 1
+    assert out_relaxed.plates == [plate] and out_cond.plates == [plate]
+    assert torch.allclose(out_relaxed._tensor, c_phi(relaxed)._tensor)
+    assert torch.allclose(out_cond._tensor, c_phi(cond)._tensor.expand(3))
+
+
+def _check_relax(method, bernoulli_grad):
+    grad, exact = bernoulli_grad(method)
+    # The control variate keeps the estimator unbiased
+    assert torch.allclose(grad, exact, atol=0.02)
+    # The variance objective trains the temperature and the control variate scale
+    for parameter in [method.temperature, method.eta]:
+        assert parameter.grad is not None
+        assert torch.isfinite(parameter.grad).all() and parameter.grad != 0.0
+
+
+def test_relax_unbiased(bernoulli_grad):
+    method = storch.method.RELAX("b", in_dim=3, n_samples=5000)
+    _check_relax(method, bernoulli_grad)
+    # The surrogate network is trained as well
+    assert all(p.grad is not None for p in method.c_phi.parameters())
+
+
+def test_rebar_unbiased(bernoulli_grad):
+    _check_relax(storch.method.REBAR("b", n_samples=5000), bernoulli_grad)
+
+
+def test_learn_eta():
+    # For REBAR on a linear function, the control variate is exact for eta = 1 and the temperature going to 0.
+    # Starting from a bad eta, minimizing the variance should move it towards 1.
+    torch.manual_seed(0)
+    logits = torch.tensor([0.3, -1.0, 2.0], requires_grad=True)
+    method = storch.method.REBAR("b")
+    with torch.no_grad():
+        method.eta.fill_(0.0)
+    optim = torch.optim.SGD([method.eta], lr=0.05)
+    for i in range(200):
+        optim.zero_grad()
+        b = method(Bernoulli(logits=logits, validate_args=False))
+        storch.add_cost(b.sum(-1), "cost")
+        storch.backward()
+        optim.step()
+    assert 0.5 < method.eta.item() < 1.5
+
+
+def test_rebar_plate():
+    method = storch.method.REBAR("z", n_samples=4)
+    logits = torch.randn(2, 3, requires_grad=True)
+    z = method(OneHotCategorical(logits=logits, validate_args=False))
+    plate = z.get_plate("z")
+    assert isinstance(plate, storch.method.relax.REBARPlate)
+    assert z.shape == (12, 2, 3)
+    hard, relaxed, cond = plate.split(z)
+    assert hard.shape == (4, 2, 3)
+    # The views share the storage of the samples
+    assert hard._tensor.data_ptr() == z._tensor.data_ptr()
+    assert torch.equal(
+        hard._tensor,
+        relaxed._tensor.argmax(-1, keepdim=True).eq(torch.arange(3)).float(),
+    )
+    assert torch.equal(hard._tensor.argmax(-1), cond._tensor.argmax(-1))
+    # Only the hard samples are weighted
+    assert torch.allclose(plate.weight.sum(), torch.tensor(1.0))
+    assert (plate.weight[4:] == 0).all()
+    storch.reset()
+
+
+def test_rebar_plate_dtype():
+    # The weights of the plate follow the device and dtype of the samples
+    method = storch.method.REBAR("z")
+    logits = torch.randn(3, dtype=torch.float64, requires_grad=True)
+    b = method(Bernoulli(logits=logits, validate_args=False))
+    plate = b.get_plate("z")
+    assert plate.weight.dtype == b._tensor.dtype == torch.float64
+    assert plate.weight.device == b._tensor.device
+    storch.reset()
@@ -0,0 +1,37 @@
+import storch
+import torch
+from torch.distributions import Bernoulli
+
+torch.manual_seed(0)
+
+
+def _score_grad(p, b, cost):
+    score = b / p - (1 - b) / (1 - p)
+    return (cost.unsqueeze(-1) * score).mean(0)
+
+
+def test_retain_samples():
+    torch.manual_seed(0)
+    p = torch.tensor([0.3, 0.6, 0.8], requires_grad=True)
+    method = storch.method.ScoreFunction("b", n_samples=4, baseline_factory=None)
+    b = method(Bernoulli(probs=p, validate_args=False))
+    cost = b.sum(-1)
+    n_children = len(b._children)
+
+    storch.add_cost(cost, "first")
+    storch.backward(retain_samples=True)
+    b_t = b._tensor.detach()
+    # The score terms of some elements cancel, so their gradient is zero up to rounding errors
+    assert torch.allclose(p.grad, _score_grad(p.detach(), b_t, b_t.sum(-1)), atol=1e-6)
+    assert not storch.inference._cost_tensors
+    # Only the nodes created before the backward call remain, and the cost node is removed
+    assert len(b._children) == n_children
+    assert not cost._children
+
+    # Evaluate a second objective on the same samples
+    p.grad = None
+    storch.add_cost((b**2).sum(-1) * 2.0, "second")
+    storch.backward()
+    assert torch.allclose(
+        p.grad, _score_grad(p.detach(), b_t, 2.0 * b_t.sum(-1)), atol=1e-6
+    )
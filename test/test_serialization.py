@@ -0,0 +1,65 @@
+import copy
+import io
+import pickle
+
+import storch
+import torch
+from torch.distributions import Normal, Categorical
+
+torch.manual_seed(0)
+
+
+def test_pickle_stochastic_tensor():
+    loc = torch.randn(3, requires_grad=True)
+    z = storch.method.Reparameterization("z", n_samples=4)(
+        Normal(loc, 1.0, validate_args=False)
+    )
+    y = z * 2
+    loaded = pickle.loads(pickle.dumps(y))
+    assert isinstance(loaded, storch.Tensor)
+    assert not loaded._tensor.requires_grad
+    assert torch.equal(loaded._tensor, y._tensor.detach())
+    assert loaded.plates == y.plates
+    assert not loaded._parents and not loaded._children
+
+    loaded_z = pickle.loads(pickle.dumps(z))
+    assert isinstance(loaded_z, storch.StochasticTensor)
+    assert loaded_z.name == "z" and loaded_z.n == 4
+    assert loaded_z.method is None and loaded_z.distribution is None
+    # The plates can be used as usual
+    reduced = storch.reduce_plates(loaded_z * 2)
+    assert torch.allclose(reduced._tensor, z._tensor.detach().mean(0) * 2)
+    storch.reset()
+
+
+def test_save_weighted_plates():
+    logits = torch.randn(4, requires_grad=True)
+    method = storch.method.Expect("c")
+    c = method(Categorical(logits=logits, validate_args=False))
+    buffer = io.BytesIO()
+    torch.save(c, buffer)
+    buffer.seek(0)
+    loaded = torch.load(buffer, weights_only=False)
+    assert loaded.plates == [
+        storch.Plate(p.name, p.n, [], p.weight.detach()) for p in c.plates
+    ]
+    assert not loaded.plates[0].weight.requires_grad
+    storch.reset()
+
+
+def test_deepcopy():
+    x = storch.denote_independent(torch.randn(5, 2, requires_grad=True), 0, "data")
+    y = x**2
+    copied = copy.deepcopy(y)
+    assert copied is not y
+    assert copied.plates[0] is not y.plates[0]
+    assert copied.plates == y.plates
+    assert torch.equal(copied._tensor, y._tensor.detach())
+    assert copied._tensor.data_ptr() != y._tensor.data_ptr()
+    assert not copied._parents
+
+
+def test_share_memory():
+    x = storch.denote_independent(torch.randn(5, 2), 0, "data")
+    assert x.share_memory_() is x
+    assert x._tensor.is_shared()
@@ -0,0 +1,72 @@
+import pytest
+import storch
+import torch
+from torch.distributions import Categorical, Normal, Bernoulli
+
+torch.manual_seed(0)
+
+
+def test_stratified_categorical():
+    probs = torch.tensor([0.25, 0.25, 0.5], requires_grad=True)
+    method = storch.method.ScoreFunction(
+        "c", sampling_method=storch.sampling.Stratified("c", 4)
+    )
+    c = method(Categorical(probs=probs, validate_args=False))
+    assert c.shape == (4,)
+    # Every stratum maps to a single event
+    assert torch.equal(torch.bincount(c._tensor, minlength=3), torch.tensor([1, 1, 2]))
+    assert not c._tensor.requires_grad
+    storch.add_cost(c.float(), "cost")
+    storch.backward()
+    assert probs.grad is not None
+
+
+def test_stratified_bernoulli_marginal():
+    p = torch.tensor([0.3, 0.7])
+    sampling_method = storch.sampling.Stratified("b", 10000)
+    b = sampling_method.mc_sample(Bernoulli(probs=p), [], [], 10000)
+    assert b.shape == (10000, 2)
+    assert torch.allclose(b.mean(0), p, atol=1e-3)
+
+
+def test_antithetic_reparameterization():
+    loc = torch.tensor([1.0, -2.0], requires_grad=True)
+    method = storch.method.Reparameterization(
+        "z", sampling_method=storch.sampling.Antithetic("z", 6)
+    )
+    z = method(Normal(loc, 1.0, validate_args=False))
+    # The antithetic pairs are mirrored around the mean
+    assert torch.allclose(z._tensor[:3] + z._tensor[3:], 2 * loc.detach().expand(3, 2))
+    storch.add_cost(z.sum(-1), "cost")
+    storch.backward()
+    assert torch.allclose(loc.grad, torch.ones(2))
+
+
+def test_quasi_monte_carlo():
+    loc = torch.zeros(3, requires_grad=True)
+    method = storch.method.Reparameterization(
+        "z", sampling_method=storch.sampling.QuasiMonteCarlo("z", 256)
+    )
+    z = method(Normal(loc, 1.0, validate_args=False))
+    assert z.shape == (256, 3)
+    assert torch.allclose(z._tensor.mean(0), loc.detach(), atol=0.05)
+    assert z._tensor.requires_grad
+    storch.reset()
+
+
+def test_override_sampling_fails():
+    with pytest.raises(ValueError):
+        storch.method.GumbelSoftmax(
+            "c", sampling_method=storch.sampling.Stratified("c", 4)
+        )
+
+
+def test_reparameterize_discrete_fails():
+    method = storch.method.Reparameterization(
+        "c", sampling_method=storch.sampling.Stratified("c", 4)
+    )
+    with pytest.raises(ValueError):
+        method(Categorical(probs=torch.tensor([0.5, 0.5]), validate_args=False))
+    # Wrapping is not disabled by the failed sample
+    assert not storch.wrappers._ignore_wrap
+    storch.reset()
@@ -115,3 +115,15 @@ def test_set_item_2(b, mask_b, value, expected):
     b = to_storch(b)
     b[mask_b] = value
     assert (b._tensor == expected).all()
+
+
+def test_inference_mode():
+    x = storch.denote_independent(torch.randn(5, 3, requires_grad=True), 0, "data")
+    with storch.inference_mode():
+        y = x * 2
+        assert y.plates == x.plates
+        assert y.plate_dims == 1
+        assert not y._parents and not x._children
+        assert not y.requires_grad
+    z = x * 2
+    assert z._parents[0][0] is x
@@ -0,0 +1,65 @@
+import pytest
+import storch
+import torch
+from torch.distributions import Normal, OneHotCategorical
+
+torch.manual_seed(0)
+
+linear = torch.nn.Linear(3, 2)
+method = storch.method.Reparameterization("z", n_samples=4)
+
+
+def model(x):
+    x = storch.denote_independent(x, 0, "data")
+    z = method(Normal(linear(x), 1.0, validate_args=False))
+    cost = (z**2).sum(-1)
+    return storch.add_cost(cost, "cost"), z
+
+
+def test_trace():
+    x = torch.randn(5, 3)
+    plan = storch.trace(model, x)
+
+    torch.manual_seed(1)
+    cost, z = plan(x)
+    assert not isinstance(cost, storch.Tensor)
+
+    torch.manual_seed(1)
+    expected_cost, expected_z = model(storch.Tensor(x, [], [], "x"))
+    storch.reset()
+
+    assert cost.shape == (4, 5)
+    assert torch.allclose(cost, expected_cost._tensor)
+    assert torch.allclose(z, expected_z._tensor)
+
+
+def indexed_model(logits, dense):
+    sampling = storch.sampling.MonteCarlo("z", 4, one_hot_indices=True)
+    method = storch.method.ScoreFunction("z", sampling_method=sampling)
+    z = method(OneHotCategorical(logits=logits))
+    cost = linear(z).sum(-1).sum(-1)
+    if dense:
+        cost = cost + (z * torch.arange(3.0)).sum(-1).sum(-1)
+    return storch.add_cost(cost, "cost"), z.argmax(-1)
+
+
+@pytest.mark.usefixtures("no_validate_args")
+@pytest.mark.parametrize("dense", [False, True])
+def test_trace_indexed_one_hot(dense):
+    logits = torch.randn(5, 3)
+    plan = storch.trace(indexed_model, logits, dense=dense)
+    # The one-hot samples are only created if they are used
+    ops = [getattr(fn, "__name__", None) for fn, *_ in plan.ops]
+    assert ("_one_hot" in ops) == dense
+
+    torch.manual_seed(1)
+    cost, indices = plan(logits)
+
+    torch.manual_seed(1)
+    expected_cost, expected_indices = indexed_model(
+        storch.Tensor(logits, [], [], "logits"), dense
+    )
+    storch.reset()
+
+    assert torch.allclose(cost, expected_cost._tensor)
+    assert torch.equal(indices, expected_indices._tensor)
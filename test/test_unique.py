@@ -0,0 +1,65 @@
+import storch
+import torch
+from torch.distributions import Bernoulli
+
+torch.manual_seed(0)
+
+
+def _sample():
+    p = torch.tensor([[0.1, 0.9, 0.5], [0.5, 0.5, 0.5]], requires_grad=True)
+    data = storch.denote_independent(p, 0, "data")
+    method = storch.method.ScoreFunction("b", n_samples=8)
+    return method(Bernoulli(probs=data, validate_args=False))
+
+
+def test_unique_undo():
+    b = _sample()
+    u = storch.unique(b)
+    assert u.plates[0].name == "uq_plate_b"
+    assert u.shape[1:] == (3,)
+    assert torch.equal(u._tensor, torch.unique(b._tensor.reshape(-1, 3), dim=0))
+    cost = u.sum(-1)
+    undone = storch.undo_unique(cost)
+    assert [p.name for p in undone.multi_dim_plates()] == ["b", "data"]
+    assert torch.equal(undone._tensor, b._tensor.sum(-1))
+    # Reducing the unique tensor weights the unique elements by their counts
+    assert torch.allclose(
+        storch.reduce_plates(cost)._tensor, storch.reduce_plates(b.sum(-1))._tensor
+    )
+    storch.reset()
+
+
+def test_unique_subset_of_plates():
+    b = _sample()
+    u = storch.unique(b, "b")
+    # The data plate is part of the unique elements
+    assert [p.name for p in u.multi_dim_plates()][1:] == ["data"]
+    assert u.shape[1:] == (2, 3)
+    undone = storch.undo_unique(u * 2)
+    assert undone.multi_dim_plates()[:1] == [b.plates[0]]
+    assert torch.equal(undone._tensor, b._tensor * 2)
+    storch.reset()
+
+
+def test_nested_unique():
+    b = _sample()
+    u = storch.unique(b, "b")
+    nested = storch.unique(u)
+    plate = nested.plates[0]
+    # The index is composed, so the nested unique refers to the original plates
+    assert [p.name for p in plate.shrunken_plates] == ["b", "data"]
+    undone = storch.undo_unique(nested)
+    assert len(undone._parents) == 1 and undone._parents[0][0] is nested
+    assert torch.equal(undone._tensor, b._tensor)
+    storch.reset()
+
+
+def test_unique_new_plates():
+    b = _sample()
+    u = storch.unique(b)
+    x = storch.denote_independent(torch.arange(4.0), 0, "x")
+    y = u.sum(-1) * x
+    undone = storch.undo_unique(y)
+    assert [p.name for p in undone.multi_dim_plates()] == ["b", "data", "x"]
+    assert torch.equal(undone._tensor, b._tensor.sum(-1)[..., None] * torch.arange(4.0))
+    storch.reset()